@@ -0,0 +1,253 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+from cfr import ABBREVIATIONS
+from game_matrix import action_tree, pure_strategies, bet_amounts, payoff_matrices_from_amounts
+from solver import solve_game
+from street import f, f_batch
+from utils import generate_villain_strategies, parse_strategies_to_input_format
+
+# Benchmarks of the hot paths in tools/, e.g.
+#
+#   python bench.py --preset full --output bench.json --baseline bench_baseline.json
+#
+# Every case is run `repeat` times for the wall time (the minimum is reported), and once more
+# under tracemalloc for the peak memory (NumPy allocations included), so the tracing overhead
+# does not distort the timings. Results go to a JSON file together with the machine they ran on.
+# With --baseline, every case is compared against the stored result of the same case and the
+# run fails (exit code 1) if it got slower or uses more memory by more than --threshold.
+#
+# Cases:
+#   street              street.f (1 spot) / street.f_batch (a batch of spots), throughput in spots/s
+#   villain_strategies  utils.generate_villain_strategies, in generated lines/s
+#   parse_strategies    utils.parse_strategies_to_input_format on those lines, in lines/s
+#   game                initial_game.py at scale: payoff matrices for n ranges per player and a
+#                       fixed number of rm+ iterations, in matrix cells x iterations/s
+#
+# Cases larger than --max-items (spots, lines or matrix cells) are skipped.
+
+PRESETS = {
+    "quick": {"ranges": [2, 3], "max_actions": [2, 3, 4], "spots": [1, 1_000, 100_000]},
+    "full": {"ranges": [2, 3, 4, 5, 6], "max_actions": [2, 3, 4], "spots": [1, 100, 10_000, 1_000_000]},
+}
+CASES = ["street", "villain_strategies", "parse_strategies", "game"]
+GAME_ITERATIONS = 200
+
+
+def villain_branch_actions(max_actions):
+    """Villain's plans after Hero checks and after Hero bets, abbreviated as in utils.py."""
+    branches = {"ch": [], "be": []}
+    for name, _ in pure_strategies(action_tree(max_actions), "villain"):
+        check_plan, bet_plan = name.split("/", 1)
+        for key, plan in (("ch", check_plan), ("be", bet_plan)):
+            plan = "-".join(ABBREVIATIONS[action] for action in plan.split("-"))
+            if plan not in branches[key]:
+                branches[key].append(plan)
+    return branches
+
+
+def random_villain_ranges(num_ranges, max_actions, rng):
+    """Random mixed strategies in the input format of generate_villain_strategies."""
+    branches = villain_branch_actions(max_actions)
+    return [
+        {key: dict(zip(actions, rng.dirichlet(np.ones(len(actions))))) for key, actions in branches.items()}
+        for _ in range(num_ranges)
+    ]
+
+
+def _street_case(spots, rng):
+    priors = rng.dirichlet(np.ones(4), size=spots)
+    responses = rng.dirichlet(np.ones(3), size=(spots, 4))
+    reraise_call = rng.random((spots, 4))
+    sizes = rng.uniform(0, 600, spots)
+    equities = np.array([0.3, 0.4, 0.5, 0.6])
+
+    def pot_model(pot, distribution):
+        return pot * np.sum(distribution * equities, axis=-1)
+
+    if spots == 1:
+        return lambda: f(pot_model, 300, sizes[0], 300, 500, priors[0], *responses[0].T, reraise_call[0])
+    return lambda: f_batch(pot_model, 300, sizes, 300, 500, priors, *np.moveaxis(responses, -1, 0), reraise_call)
+
+
+def _game_case(num_ranges, max_actions, rng):
+    pot = 500
+    amounts = bet_amounts(pot, 0.5, 0.5, 1.0, 1.0, 0.5)
+    equities = rng.uniform(0.2, 0.8, (num_ranges, num_ranges))
+    ranges = np.ones(num_ranges)
+
+    def run():
+        game = payoff_matrices_from_amounts(pot, amounts, ranges, ranges, equities, max_actions=max_actions)
+        return solve_game(game["hero_matrix"], game["villain_matrix"], iterations=GAME_ITERATIONS,
+                          convergence_threshold=0, method="rm+", check_every=GAME_ITERATIONS)
+
+    return run
+
+
+def benchmark_cases(cases, ranges, max_actions, spots, max_items, seed=0):
+    """
+    Yields (case id, parameters, work items, unit, callable) for the grid; the callable
+    runs the benchmarked code once. Cases above `max_items` are yielded with callable None.
+    """
+    rng = np.random.default_rng(seed)
+    if "street" in cases:
+        for num_spots in spots:
+            run = _street_case(num_spots, rng) if num_spots <= max_items else None
+            yield f"street[spots={num_spots}]", {"spots": num_spots}, num_spots, "spots/s", run
+
+    for num_ranges in ranges:
+        for actions in max_actions:
+            params = {"ranges": num_ranges, "max_actions": actions}
+            suffix = f"[ranges={num_ranges},max_actions={actions}]"
+            branches = villain_branch_actions(actions)
+            num_lines = (len(branches["ch"]) * len(branches["be"])) ** num_ranges
+            small = num_lines <= max_items
+            villain_ranges = random_villain_ranges(num_ranges, actions, rng)
+
+            if "villain_strategies" in cases:
+                run = (lambda v=villain_ranges: generate_villain_strategies(v)) if small else None
+                yield "villain_strategies" + suffix, params, num_lines, "lines/s", run
+            if "parse_strategies" in cases:
+                lines = generate_villain_strategies(villain_ranges) if small else None
+                run = (lambda lines=lines: parse_strategies_to_input_format(lines)) if small else None
+                yield "parse_strategies" + suffix, params, num_lines, "lines/s", run
+            if "game" in cases:
+                tree = action_tree(actions)
+                cells = (len(pure_strategies(tree, "hero")) * len(pure_strategies(tree, "villain"))) ** num_ranges
+                run = _game_case(num_ranges, actions, rng) if cells <= max_items else None
+                yield "game" + suffix, params, cells * GAME_ITERATIONS, "cells*iterations/s", run
+
+
+def measure(run, repeat=3):
+    """Minimum wall time over `repeat` runs and peak traced memory of one more run."""
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        seconds.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(seconds), peak
+
+
+def machine_info():
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+    }
+
+
+def run_benchmarks(cases=CASES, preset="quick", repeat=3, max_items=5_000_000, seed=0, progress=True):
+    """Runs the grid of `preset` and returns the results dict written by main."""
+    grid = PRESETS[preset]
+    results = {}
+    for case_id, params, items, unit, run in benchmark_cases(cases, grid["ranges"], grid["max_actions"],
+                                                             grid["spots"], max_items, seed):
+        if run is None:
+            results[case_id] = {"params": params, "items": items, "skipped": True}
+            if progress:
+                print(f"{case_id:50} skipped ({items:,} items > --max-items)", file=sys.stderr)
+            continue
+        seconds, peak = measure(run, repeat)
+        results[case_id] = {
+            "params": params,
+            "items": items,
+            "seconds": seconds,
+            "peak_mib": peak / 2 ** 20,
+            "throughput": items / max(seconds, 1e-12),
+            "unit": unit,
+        }
+        if progress:
+            print(f"{case_id:50} {seconds * 1000:10.2f} ms {peak / 2 ** 20:9.1f} MiB "
+                  f"{items / max(seconds, 1e-12):14,.0f} {unit}", file=sys.stderr)
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "machine": machine_info(),
+        "preset": preset,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold=0.25, min_seconds=1e-3, min_mib=1.0):
+    """
+    Compares two results dicts case by case.
+
+    A case regresses if its wall time or peak memory grew by more than `threshold` (relative),
+    ignoring differences below `min_seconds` / `min_mib`, which are noise.
+
+    Returns:
+        A list of dicts with "case", "metric", "baseline", "current" and "ratio" for every
+        regression (empty if there is none).
+    """
+    regressions = []
+    for case_id, result in current["results"].items():
+        reference = baseline["results"].get(case_id)
+        if reference is None or result.get("skipped") or reference.get("skipped"):
+            continue
+        for metric, floor in (("seconds", min_seconds), ("peak_mib", min_mib)):
+            old, new = reference[metric], result[metric]
+            if new > old * (1 + threshold) and new - old > floor:
+                regressions.append({"case": case_id, "metric": metric, "baseline": old, "current": new,
+                                    "ratio": new / max(old, 1e-12)})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the tools/ hot paths.")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="quick")
+    parser.add_argument("--cases", default=",".join(CASES), help=f"comma-separated subset of {','.join(CASES)}")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case (the minimum is reported)")
+    parser.add_argument("--max-items", type=float, default=5e6, help="skip cases with more spots/lines/cells")
+    parser.add_argument("--output", default="bench_results.json", help="JSON file for the results")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative slowdown / memory growth")
+    parser.add_argument("--update-baseline", action="store_true", help="also write the results to --baseline")
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args(argv)
+
+    cases = [case.strip() for case in args.cases.split(",") if case.strip()]
+    unknown = set(cases) - set(CASES)
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(sorted(unknown))}")
+
+    current = run_benchmarks(cases, args.preset, args.repeat, int(args.max_items), progress=not args.quiet)
+    with open(args.output, "w") as file:
+        json.dump(current, file, indent=2)
+
+    status = 0
+    if args.baseline and os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(current, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression['case']} {regression['metric']}: {regression['baseline']:.4g} -> "
+                  f"{regression['current']:.4g} ({regression['ratio']:.2f}x)")
+        if regressions:
+            status = 1
+        else:
+            print(f"No regressions against {args.baseline} (threshold {args.threshold:.0%})")
+    elif args.baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(current, file, indent=2)
+        print(f"Baseline written to {args.baseline}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,263 @@
+import numpy as np
+
+from cfr import ABBREVIATIONS, _terminal_hero_payoff, solve_tree_from_amounts
+from game_matrix import HERO, VILLAIN, action_tree, bet_amounts, pure_strategies
+from profiling import count, stage
+
+# Exact best responses to per-range mixed strategies, and their exploitability, for batches of
+# mixes at once and without the combined-strategy matrices.
+#
+#   engine = BestResponseEngine(pot, amounts, hero_ranges, villain_ranges, equities, max_actions=4)
+#   report = engine.best_response(VILLAIN, parse_strategies_to_input_format(lines))
+#   report["exploitability"], engine.strategies[HERO][report["strategy"][0, i]]   # Hero's best reply in range i
+#
+# A mix is given per range of the mixed player either in sequence form, the format of
+# utils.parse_strategies_to_input_format for Villain ({"ch": {"ch": 0.3, "be-fo": 0.2, ...}, "be": {...}})
+# and {"check-fold": 0.1, ...} for Hero (cfr.py's "hero_strategy"), or as probabilities of the
+# player's per-range pure strategies (game_matrix.pure_strategies order); a batch is a list of them or
+# an array of shape (batch, n_ranges, n_plans).
+#
+# The betting tree is compiled once into matrices over its terminal nodes: which sequence plans
+# of each player reach every terminal, which pure strategies of each player are consistent with it,
+# and the terminal's payoff A * equity + B. A best response is then the backward pass over the tree
+# in matrix form: the mixed player's reach of every terminal (one product), the responder's
+# counterfactual terminal values per range (one product with the equities) and the value of every
+# pure strategy per range, maximized (one more product). The responder's ranges answer separately,
+# so the combined best response is the per-range argmax and n_actions ** n_ranges never appears.
+#
+# Exploitability is how much the responder gains over the game value, i.e. what the mix gives
+# away against a perfect exploiter. The game value comes from cfr.solve_tree_from_amounts once per
+# engine (accurate to `value_tolerance`), unless it is passed in.
+
+
+def _terminals(tree):
+    """(path, terminal node, own decisions of Hero, own decisions of Villain) of every terminal."""
+    terminals = []
+
+    def walk(node, path, own):
+        if "outcome" in node:
+            terminals.append((path, node, own[HERO], own[VILLAIN]))
+            return
+        for action, child in node["actions"].items():
+            step = {**own, node["player"]: own[node["player"]] + ((path, action),)}
+            walk(child, path + (action,), step)
+
+    walk(tree, (), {HERO: (), VILLAIN: ()})
+    return terminals
+
+
+def _sequence_name(player, sequence):
+    # Hero: "check-fold" (game_matrix names); Villain: "ch:be-fo" (utils branch key and plan)
+    if player == HERO:
+        return "-".join(action for _, action in sequence)
+    branch = ABBREVIATIONS[sequence[0][0][0]]
+    return branch + ":" + "-".join(ABBREVIATIONS[action] for _, action in sequence)
+
+
+def _combined_codes(strategy, num_strategies):
+    # Combined strategy indices, range 0 fastest; past int64 (about 17 ranges at 12 strategies) as Python ints
+    num_ranges = strategy.shape[-1]
+    if num_strategies ** num_ranges <= np.iinfo(np.int64).max:
+        return strategy @ num_strategies ** np.arange(num_ranges, dtype=np.int64)
+    return strategy.astype(object) @ np.array([num_strategies ** k for k in range(num_ranges)], dtype=object)
+
+
+class BestResponseEngine:
+    """
+    Best responses to batches of per-range mixes in one street game (see the module comment).
+
+    Args:
+        pot, amounts, hero_ranges, villain_ranges, equities, max_actions:
+            As in game_matrix.payoff_matrices_from_amounts (linear utility).
+        game_value: Hero's equilibrium value, if known (otherwise solved for on first use).
+        value_tolerance: Exploitability threshold of the CFR+ solve for the game value.
+    """
+
+    def __init__(self, pot, amounts, hero_ranges, villain_ranges, equities, max_actions=4, game_value=None,
+                 value_tolerance=None):
+        self.pot = float(pot)
+        self.amounts = amounts
+        self.max_actions = max_actions
+        self.range_probs = {
+            HERO: np.asarray(hero_ranges, dtype=float) / np.sum(hero_ranges),
+            VILLAIN: np.asarray(villain_ranges, dtype=float) / np.sum(villain_ranges),
+        }
+        self.equities = np.asarray(equities, dtype=float).reshape(len(self.range_probs[HERO]),
+                                                                  len(self.range_probs[VILLAIN]))
+        self._game_value = game_value
+        self.value_tolerance = 1e-5 * self.pot if value_tolerance is None else value_tolerance
+
+        tree = action_tree(max_actions)
+        terminals = _terminals(tree)
+        payoffs = np.array([_terminal_hero_payoff(self.pot, amounts, node) for _, node, _, _ in terminals])
+        self.A, self.B = payoffs[:, 0], payoffs[:, 1]
+
+        self.sequences, self.strategies, self._reach, self._consistent = {}, {}, {}, {}
+        for player, index in ((HERO, 2), (VILLAIN, 3)):
+            own = [terminal[index] for terminal in terminals]
+            # Maximal own sequences: the plans of the sequence form
+            maximal = [s for s in dict.fromkeys(own) if not any(o[:len(s)] == s and len(o) > len(s) for o in own)]
+            if player == HERO:  # in game_matrix order, where they are Hero's pure strategies
+                names = [name for name, _ in pure_strategies(tree, HERO)]
+                maximal.sort(key=lambda s: names.index(_sequence_name(HERO, s)))
+            self.sequences[player] = [_sequence_name(player, s) for s in maximal]
+            # reach[q, t] = 1 if plan q passes through terminal t's own decisions
+            self._reach[player] = np.array([[s[:len(o)] == o for o in own] for s in maximal], dtype=float)
+
+            strategies = pure_strategies(tree, player)
+            self.strategies[player] = [name for name, _ in strategies]
+            # consistent[p, t] = 1 if pure strategy p takes every own decision on the way to terminal t
+            self._consistent[player] = np.array(
+                [[all(plan[path] == action for path, action in o) for o in own] for _, plan in strategies], dtype=float)
+
+    # Inputs
+
+    def mix_array(self, player, mixes, pure=False):
+        """
+        Batch of `player`'s mixes as an array of shape (batch, n_ranges, n_plans), normalized per
+        range and branch, over `sequences[player]` (or `strategies[player]` with `pure`).
+        """
+        plans = self.strategies[player] if pure else self.sequences[player]
+        if not isinstance(mixes, np.ndarray):
+            if isinstance(mixes[0], dict):  # a single mix
+                mixes = [mixes]
+            array = np.zeros((len(mixes), len(self.range_probs[player]), len(plans)))
+            for b, mix in enumerate(mixes):
+                for i, range_mix in enumerate(mix):
+                    # Villain's sequence plans are given per branch, {"ch": {...}, "be": {...}}
+                    items = range_mix.items() if player == HERO or pure else \
+                        ((f"{branch}:{plan}", prob) for branch, plans_ in range_mix.items() for plan, prob in plans_.items())
+                    for name, prob in items:
+                        array[b, i, plans.index(name)] = prob
+            mixes = array
+        mixes = np.asarray(mixes, dtype=float)
+        if mixes.ndim == 2:
+            mixes = mixes[None]
+        # Renormalize every range (every branch for Villain's sequence plans), e.g. after rounding
+        groups = [name.split(":")[0] if ":" in name else "" for name in plans]
+        normalized = np.empty_like(mixes)
+        for group in dict.fromkeys(groups):
+            columns = np.array([g == group for g in groups])
+            total = mixes[..., columns].sum(axis=-1, keepdims=True)
+            normalized[..., columns] = np.divide(mixes[..., columns], total, out=np.zeros_like(mixes[..., columns]),
+                                                 where=total > 0)
+        return normalized
+
+    # Best responses
+
+    def game_value(self):
+        """Hero's equilibrium value (solved with CFR+ on first use)."""
+        if self._game_value is None:
+            with stage("best_response.game_value"):
+                result = solve_tree_from_amounts(self.pot, self.amounts, self.range_probs[HERO], self.range_probs[VILLAIN],
+                                                 self.equities, self.max_actions, iterations=100000,
+                                                 convergence_threshold=self.value_tolerance)
+            self._game_value = result["hero_utility"]
+        return self._game_value
+
+    def best_response(self, player, mixes, pure=False, exploitability=True):
+        """
+        The opponent's best response to every mix of `player` (see mix_array for `mixes`).
+
+        Returns:
+            A dict with arrays over the batch:
+            "strategy": the responder's best pure strategy per range (indices into
+                        strategies[responder]), shape (batch, n_responder_ranges),
+            "code": the same as a combined strategy index (range 0 fastest, as in game_matrix),
+                    an object array of Python ints if the indices do not fit in int64,
+            "range_values": the responder's best value per range (not weighted by the range probabilities),
+            "value": the responder's best-response value, and "mix_value" the mixed player's value
+                     against it (pot minus that),
+            "exploitability": value minus the responder's equilibrium value (if `exploitability`).
+        """
+        responder = VILLAIN if player == HERO else HERO
+        with stage("best_response.batch"):
+            mixes = self.mix_array(player, mixes, pure)
+            count("best_response.mixes", len(mixes))
+            # Mixed player's reach of every terminal, weighted by its range probabilities: (batch, ranges, terminals)
+            reach = mixes @ (self._consistent[player] if pure else self._reach[player])
+            weights = self.range_probs[player][:, None] * reach
+            # Responder's counterfactual value at every terminal, per responder range
+            if responder == HERO:
+                values = self.A * np.einsum("ij,bjt->bit", self.equities, weights) + self.B * weights.sum(axis=1)[:, None]
+            else:
+                values = (self.pot - self.B) * weights.sum(axis=1)[:, None] \
+                    - self.A * np.einsum("ij,bit->bjt", self.equities, weights)
+            strategy_values = values @ self._consistent[responder].T  # (batch, responder ranges, pure strategies)
+            strategy = strategy_values.argmax(axis=-1)
+            range_values = np.take_along_axis(strategy_values, strategy[..., None], axis=-1)[..., 0]
+            value = range_values @ self.range_probs[responder]
+
+        num_strategies = len(self.strategies[responder])
+        report = {
+            "strategy": strategy,
+            "code": _combined_codes(strategy, num_strategies),
+            "range_values": range_values,
+            "value": value,
+            "mix_value": self.pot - value,
+        }
+        if exploitability:
+            equilibrium = self.game_value() if responder == HERO else self.pot - self.game_value()
+            report["exploitability"] = value - equilibrium
+        return report
+
+    def strategy_labels(self, player, strategy):
+        """Labels of one best response (a row of "strategy"), e.g. ['H1:bet-3bet', 'H2:check-call']."""
+        prefix = "H" if player == HERO else "V"
+        return [f"{prefix}{i + 1}:{self.strategies[player][s]}" for i, s in enumerate(strategy)]
+
+
+def best_response(pot, hero_bet, hero_raise, hero_3bet, villain_bet, villain_raise, hero_ranges, villain_ranges,
+                  equities, player, mixes, max_actions=4, pure=False, exploitability=True):
+    """
+    BestResponseEngine(...).best_response(player, mixes) with bet/raise sizes given as fractions
+    of the current pot (see game_matrix.bet_amounts). For many calls on one game, keep the engine.
+    """
+    amounts = bet_amounts(pot, hero_bet, hero_raise, hero_3bet, villain_bet, villain_raise)
+    engine = BestResponseEngine(pot, amounts, hero_ranges, villain_ranges, equities, max_actions)
+    return engine.best_response(player, mixes, pure, exploitability)
+
+
+if __name__ == "__main__":
+    import time
+
+    from bench import random_villain_ranges
+    from game_matrix import payoff_matrices_from_amounts
+    from utils import generate_villain_strategies, parse_strategies_to_input_format
+
+    rng = np.random.default_rng(0)
+    pot, num_ranges = 500, 3
+    amounts = bet_amounts(pot, 0.5, 0.5, 1.0, 1.0, 0.5)
+    equities = rng.uniform(0.2, 0.8, (num_ranges, num_ranges))
+    ranges = rng.uniform(0.5, 1.5, num_ranges)
+    engine = BestResponseEngine(pot, amounts, ranges, ranges, equities, max_actions=4)
+    print(f"game value {engine.game_value():.3f}")
+
+    # A population mix in the utils format, as it comes out of the strategy files
+    mix = parse_strategies_to_input_format(generate_villain_strategies(random_villain_ranges(num_ranges, 4, rng)))
+    report = engine.best_response(VILLAIN, mix)
+    print(f"villain mix: exploitability {report['exploitability'][0]:.3f}, "
+          f"best response {engine.strategy_labels(HERO, report['strategy'][0])}")
+
+    # Cross-check against the full matrices for mixes over Villain's pure strategies
+    game = payoff_matrices_from_amounts(pot, amounts, ranges, ranges, equities, max_actions=4)
+    pure_mixes = rng.dirichlet(np.ones(len(engine.strategies[VILLAIN])), size=(5, num_ranges))
+    report = engine.best_response(VILLAIN, pure_mixes, pure=True)
+    for b in range(len(pure_mixes)):
+        col_strategy = np.ones(1)
+        for i in range(num_ranges):  # range 0 varies fastest
+            col_strategy = np.outer(pure_mixes[b, i], col_strategy).ravel()
+        row_payoffs = game["hero_matrix"] @ col_strategy
+        assert np.isclose(row_payoffs.max(), report["value"][b]) and np.isclose(row_payoffs[report["code"][b]], report["value"][b])
+    print("matches the full-matrix best responses")
+
+    # Population-exploit report scale: many candidate mixes per call, for both players
+    for player, size in ((VILLAIN, 10000), (HERO, 10000)):
+        batch = rng.dirichlet(np.ones(len(engine.sequences[player]) if player == HERO else 3), size=(size, num_ranges))
+        if player == VILLAIN:  # one Dirichlet per branch
+            batch = np.concatenate([batch[..., :3], rng.dirichlet(np.ones(4), size=(size, num_ranges))], axis=-1)
+        start = time.perf_counter()
+        report = engine.best_response(player, batch)
+        elapsed = time.perf_counter() - start
+        print(f"{size} {player} mixes in {elapsed * 1000:.1f} ms ({size / elapsed:,.0f} mixes/s), "
+              f"mean exploitability {report['exploitability'].mean():.2f}")
@@ -0,0 +1,287 @@
+import numpy as np
+
+from game_matrix import HERO, VILLAIN, SHOWDOWN, HERO_FOLDS, action_tree, bet_amounts
+from solver import regret_matching
+
+# CFR+ on the betting tree of game_matrix.action_tree, instead of the normal form.
+#
+# Every decision node is an information set per range of the acting player (both players see the
+# betting, but only their own range), so regrets and average strategies are (n_ranges, n_actions)
+# arrays per node. A traversal touches every node once and all ranges at once, and terminal nodes
+# only need the (hero ranges x villain ranges) equity matrix, so the cost per iteration grows
+# linearly in the tree size and in the number of ranges instead of actions ** ranges.
+#
+# Payoffs follow getActionPayoffs with linear utility, so hero + villain = pot at every terminal
+# (constant-sum) and CFR+ converges to a Nash equilibrium.
+
+# Action abbreviations of the villain strategy format in utils.py
+ABBREVIATIONS = {"check": "ch", "bet": "be", "fold": "fo", "call": "ca", "raise": "ra", "3bet": "3b"}
+
+
+def _terminal_hero_payoff(pot, amounts, terminal):
+    # hero = A * equity + B, as in game_matrix.terminal_coefficients
+    invested = 0.0 if terminal["amount"] is None else amounts[terminal["amount"]]
+    if terminal["outcome"] == SHOWDOWN:
+        return pot + 2 * invested, -invested
+    if terminal["outcome"] == HERO_FOLDS:
+        return 0.0, -invested
+    return 0.0, pot + invested
+
+
+def _decision_nodes(tree):
+    """Maps the path of every decision node to the node, in pre-order."""
+    nodes = {}
+
+    def walk(node, path):
+        if "outcome" in node:
+            return
+        nodes[path] = node
+        for action, child in node["actions"].items():
+            walk(child, path + (action,))
+
+    walk(tree, ())
+    return nodes
+
+
+class _Game:
+    def __init__(self, pot, amounts, hero_range_probs, villain_range_probs, equities, tree):
+        self.pot = pot
+        self.hero_range_probs = hero_range_probs
+        self.villain_range_probs = villain_range_probs
+        self.equities = equities
+        self.tree = tree
+        self.nodes = _decision_nodes(tree)
+        self.payoffs = {}
+
+        def collect(node, path):
+            if "outcome" in node:
+                self.payoffs[path] = _terminal_hero_payoff(pot, amounts, node)
+                return
+            for action, child in node["actions"].items():
+                collect(child, path + (action,))
+
+        collect(tree, ())
+
+    def num_ranges(self, player):
+        return len(self.hero_range_probs) if player == HERO else len(self.villain_range_probs)
+
+    def terminal_values(self, path, reach_hero, reach_villain, player):
+        """Counterfactual value of `player` at a terminal node, per range of `player`."""
+        a, b = self.payoffs[path]
+        if player == HERO:
+            weights = self.villain_range_probs * reach_villain
+            return a * (self.equities @ weights) + b * weights.sum()
+        weights = self.hero_range_probs * reach_hero
+        return (self.pot - b) * weights.sum() - a * (weights @ self.equities)
+
+
+def _traverse(game, node, path, reach_hero, reach_villain, player, strategies, regrets=None,
+              strategy_sums=None, weight=0.0, best_response=False):
+    """
+    Returns the counterfactual values of `player` at `node`, per range of `player`.
+
+    With `regrets`, the regrets and average-strategy sums of `player` are updated (CFR+);
+    with `best_response`, `player` plays a best response instead of `strategies[path]`.
+    """
+    if "outcome" in node:
+        return game.terminal_values(path, reach_hero, reach_villain, player)
+
+    actions = list(node["actions"])
+    sigma = strategies[path]
+    acting = node["player"]
+    values = []
+    for k, action in enumerate(actions):
+        # Both reaches are tracked, but terminal values only use the opponent's, so the values
+        # are counterfactual, and the own reach weights the average strategy
+        child_reach_hero, child_reach_villain = reach_hero, reach_villain
+        if acting == HERO:
+            child_reach_hero = reach_hero * sigma[:, k]
+        else:
+            child_reach_villain = reach_villain * sigma[:, k]
+        values.append(_traverse(game, node["actions"][action], path + (action,), child_reach_hero,
+                                child_reach_villain, player, strategies, regrets, strategy_sums, weight,
+                                best_response))
+    values = np.stack(values, axis=-1)
+
+    if acting != player:
+        return values.sum(axis=-1)
+    if best_response:
+        return values.max(axis=-1)
+    node_values = (sigma * values).sum(axis=-1)
+    if regrets is not None:
+        own_reach = reach_hero if player == HERO else reach_villain
+        regrets[path] = np.maximum(regrets[path] + values - node_values[:, None], 0)
+        strategy_sums[path] += weight * own_reach[:, None] * sigma
+    return node_values
+
+
+def _evaluate(game, strategies):
+    """Returns (hero_utility, villain_utility, hero_exploitability, villain_exploitability)."""
+    ones_hero = np.ones(game.num_ranges(HERO))
+    ones_villain = np.ones(game.num_ranges(VILLAIN))
+    hero_utility = game.hero_range_probs @ _traverse(game, game.tree, (), ones_hero, ones_villain, HERO, strategies)
+    villain_utility = game.pot - hero_utility
+    hero_best = game.hero_range_probs @ _traverse(
+        game, game.tree, (), ones_hero, ones_villain, HERO, strategies, best_response=True)
+    villain_best = game.villain_range_probs @ _traverse(
+        game, game.tree, (), ones_hero, ones_villain, VILLAIN, strategies, best_response=True)
+    return hero_utility, villain_utility, hero_best - hero_utility, villain_best - villain_utility
+
+
+def _sequence_plans(tree, strategies, player, range_index, start_path, abbreviate):
+    """
+    Realization probabilities of the maximal own action sequences of `player` below
+    `start_path` for one range, e.g. {"be-fo": 0.2, ...}.
+    """
+    plans, internal = {}, set()
+
+    def walk(node, path, sequence, prob):
+        if "outcome" in node:
+            if sequence:
+                plans[sequence] = float(prob)
+            return
+        if node["player"] == player:
+            internal.add(sequence)
+            sigma = strategies[path][range_index]
+            for k, action in enumerate(node["actions"]):
+                walk(node["actions"][action], path + (action,), sequence + (action,), prob * sigma[k])
+        else:
+            for action, child in node["actions"].items():
+                walk(child, path + (action,), sequence, prob)
+
+    node = tree
+    for action in start_path:
+        node = node["actions"][action]
+    walk(node, start_path, (), 1.0)
+
+    def name(sequence):
+        return "-".join(ABBREVIATIONS[action] if abbreviate else action for action in sequence)
+
+    return {name(sequence): prob for sequence, prob in plans.items() if sequence not in internal}
+
+
+def solve_tree_from_amounts(pot, amounts, hero_ranges, villain_ranges, equities, max_actions=4,
+                            iterations=10000, convergence_threshold=0.001, check_every=10):
+    """
+    Solves the range-vs-range street game with CFR+ on the betting tree.
+
+    Args:
+        pot: Initial pot.
+        amounts: Dict of total amounts invested on the street, keyed like game_matrix.bet_amounts.
+        hero_ranges, villain_ranges: Relative range frequencies (normalized here).
+        equities: Hero equity of each hero range vs each villain range, shape
+                  (n_hero_ranges, n_villain_ranges).
+        max_actions: 2, 3 or 4.
+        iterations: Maximum number of CFR+ iterations.
+        convergence_threshold: Stop once both exploitabilities are below this value.
+        check_every: Evaluate exploitability every this many iterations.
+
+    Returns:
+        A dict with
+        "hero_strategy": per hero range, the probabilities of the pure strategies named as
+                         in game_matrix (e.g. {"check-fold": 0.1, ...}),
+        "villain_strategy": per villain range, {"ch": {...}, "be": {...}} in the format of
+                            utils.parse_strategies_to_input_format,
+        "hero_behavioural" / "villain_behavioural": the average strategy at every decision
+                            node, {path: array of shape (n_ranges, n_actions)},
+        "hero_utility", "villain_utility", "hero_exploitability", "villain_exploitability"
+        and "converged_at_iteration" (None if not converged).
+    """
+    hero_range_probs = np.asarray(hero_ranges, dtype=float)
+    hero_range_probs = hero_range_probs / hero_range_probs.sum()
+    villain_range_probs = np.asarray(villain_ranges, dtype=float)
+    villain_range_probs = villain_range_probs / villain_range_probs.sum()
+    equities = np.asarray(equities, dtype=float).reshape(len(hero_range_probs), len(villain_range_probs))
+
+    tree = action_tree(max_actions)
+    game = _Game(pot, amounts, hero_range_probs, villain_range_probs, equities, tree)
+
+    regrets, strategy_sums = {}, {}
+    for path, node in game.nodes.items():
+        shape = (game.num_ranges(node["player"]), len(node["actions"]))
+        regrets[path] = np.zeros(shape)
+        strategy_sums[path] = np.zeros(shape)
+
+    def average_strategies():
+        return {path: regret_matching(strategy_sums[path]) for path in game.nodes}
+
+    ones_hero = np.ones(len(hero_range_probs))
+    ones_villain = np.ones(len(villain_range_probs))
+    converged_at_iteration = None
+    for i in range(iterations):
+        # Alternating updates with linear averaging (CFR+)
+        for player in (HERO, VILLAIN):
+            current = {path: regret_matching(regrets[path]) for path in game.nodes}
+            _traverse(game, tree, (), ones_hero, ones_villain, player, current, regrets, strategy_sums, weight=i + 1)
+
+        if (i + 1) % check_every and i != iterations - 1:
+            continue
+        _, _, hero_exploitability, villain_exploitability = _evaluate(game, average_strategies())
+        if hero_exploitability < convergence_threshold and villain_exploitability < convergence_threshold:
+            converged_at_iteration = i
+            break
+
+    strategies = average_strategies()
+    hero_utility, villain_utility, hero_exploitability, villain_exploitability = _evaluate(game, strategies)
+    return {
+        "hero_strategy": [
+            _sequence_plans(tree, strategies, HERO, h, (), abbreviate=False) for h in range(len(hero_range_probs))
+        ],
+        "villain_strategy": [
+            {ABBREVIATIONS[action]: _sequence_plans(tree, strategies, VILLAIN, v, (action,), abbreviate=True)
+             for action in tree["actions"]}
+            for v in range(len(villain_range_probs))
+        ],
+        "hero_behavioural": {path: s for path, s in strategies.items() if game.nodes[path]["player"] == HERO},
+        "villain_behavioural": {path: s for path, s in strategies.items() if game.nodes[path]["player"] == VILLAIN},
+        "hero_utility": hero_utility,
+        "villain_utility": villain_utility,
+        "hero_exploitability": hero_exploitability,
+        "villain_exploitability": villain_exploitability,
+        "converged_at_iteration": converged_at_iteration,
+    }
+
+
+def solve_tree(pot, hero_bet, hero_raise, hero_3bet, villain_bet, villain_raise, hero_ranges, villain_ranges,
+               equities, max_actions=4, iterations=10000, convergence_threshold=0.001, check_every=10):
+    """
+    Same as solve_tree_from_amounts, with bet/raise sizes given as fractions of the
+    current pot (see game_matrix.bet_amounts). The returned dict additionally holds "amounts".
+    """
+    amounts = bet_amounts(pot, hero_bet, hero_raise, hero_3bet, villain_bet, villain_raise)
+    result = solve_tree_from_amounts(pot, amounts, hero_ranges, villain_ranges, equities, max_actions,
+                                     iterations, convergence_threshold, check_every)
+    result["amounts"] = amounts
+    return result
+
+
+if __name__ == "__main__":
+    import time
+
+    from game_matrix import build_payoff_matrices
+    from solver import solve_game_lp
+
+    # Cross-check against the normal form on a game that is still small enough to enumerate
+    sizes = dict(pot=10, hero_bet=0.5, hero_raise=0.5, hero_3bet=0.5, villain_bet=0.5, villain_raise=0.5)
+    equities = [[0.5, 0.3, 0.2], [0.7, 0.5, 0.3], [0.8, 0.7, 0.5]]
+    result = solve_tree(**sizes, hero_ranges=[1, 1, 1], villain_ranges=[1, 1, 1], equities=equities)
+    game = build_payoff_matrices(**sizes, hero_ranges=[1, 1, 1], villain_ranges=[1, 1, 1], equities=equities)
+    lp = solve_game_lp(game["hero_matrix"] - 5, game["villain_matrix"] - 5)
+    print(f"CFR+ value {result['hero_utility']:.4f} (converged at {result['converged_at_iteration']}), "
+          f"normal-form LP value {lp['hero_utility'] + 5:.4f}")
+    for v, strategy in enumerate(result["villain_strategy"]):
+        print(f"V{v+1}", {branch: {k: round(p, 3) for k, p in plans.items()} for branch, plans in strategy.items()})
+    for h, strategy in enumerate(result["hero_strategy"]):
+        print(f"H{h+1}", {k: round(p, 3) for k, p in strategy.items()})
+
+    # Many ranges, far beyond what the normal form (6 ** 20 x 12 ** 20) could hold
+    rng = np.random.default_rng(0)
+    num_ranges = 20
+    strength_hero, strength_villain = rng.random(num_ranges), rng.random(num_ranges)
+    equities = 1 / (1 + np.exp(-5 * (strength_hero[:, None] - strength_villain[None, :])))
+    start = time.perf_counter()
+    result = solve_tree(**sizes, hero_ranges=np.ones(num_ranges), villain_ranges=np.ones(num_ranges),
+                        equities=equities, iterations=2000, convergence_threshold=0.005)
+    elapsed = time.perf_counter() - start
+    print(f"{num_ranges} ranges: value {result['hero_utility']:.4f}, exploitability "
+          f"{result['hero_exploitability']:.4f}/{result['villain_exploitability']:.4f} in {elapsed:.2f} s")
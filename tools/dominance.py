@@ -0,0 +1,184 @@
+import numpy as np
+
+# Iterated elimination of dominated pure strategies, as a pre-pass before handing the payoff
+# matrices to a solver.
+#
+# Rows are compared on the hero matrix and columns on the villain matrix, restricted to the
+# strategies that are still alive, until nothing changes. Strict elimination keeps every
+# equilibrium; weak elimination may lose some, but always keeps at least one. Identical
+# strategies (e.g. plans that only differ at a node the opponent never lets us reach) count
+# as weakly dominated by the first of them.
+#
+# Candidate pairs are narrowed down column by column on a dense mask and then verified on the
+# remaining columns pair by pair, in blocks of about `block_cells` pairs.
+
+
+def _verify(matrix, rows, dominators, strictly_better, weak, atol, columns):
+    """Which of the pairs (rows[k], dominators[k]) are dominations, checking columns chunk by chunk."""
+    alive = np.arange(len(rows))
+    chunk_start, chunk_size = 0, 16
+    while len(alive) and chunk_start < len(columns):
+        chunk = columns[chunk_start:chunk_start + chunk_size]
+        # difference[k, c] = matrix[dominator, c] - matrix[row, c]
+        difference = matrix[np.ix_(dominators[alive], chunk)] - matrix[np.ix_(rows[alive], chunk)]
+        if weak:
+            holds = (difference >= -atol).all(axis=-1)
+            strictly_better[alive] |= (difference > atol).any(axis=-1)
+        else:
+            holds = (difference > atol).all(axis=-1)
+        alive = alive[holds]
+        chunk_start += chunk_size
+        chunk_size *= 4
+    dominates = np.zeros(len(rows), dtype=bool)
+    dominates[alive] = strictly_better[alive] if weak else True
+    return dominates
+
+
+def _dominated(matrix, weak, atol, block_cells, sparse_density=1 / 16):
+    """Boolean mask of the rows of `matrix` dominated by another row."""
+    num_rows, num_cols = matrix.shape
+    dominated = np.zeros(num_rows, dtype=bool)
+    # Most pairs fail on a few columns, so columns are checked on a dense (rows x dominators) mask
+    # first, and once few candidate pairs are left, only those are checked. Neighbouring columns
+    # (combined strategies that differ in one range) are very similar, so they are visited in a
+    # fixed random order, which rules out far more pairs per column
+    column_order = np.random.default_rng(0).permutation(num_cols)
+    row_sums = matrix.sum(axis=1)
+    block = max(1, min(num_rows, block_cells // num_rows))
+    for start in range(0, num_rows, block):
+        stop = min(start + block, num_rows)
+        candidate_values = matrix[start:stop]
+        candidates = np.ones((stop - start, num_rows), dtype=bool)
+        candidates[np.arange(stop - start), np.arange(start, stop)] = False
+        # Duplicates are weakly dominated by the first of them
+        strictly_better = np.arange(num_rows)[None, :] < np.arange(start, stop)[:, None] if weak else None
+
+        checked = 0
+        while checked < num_cols and candidates.mean() > sparse_density:
+            for column in column_order[checked:checked + 8]:
+                # Row s beats candidate row r in this column
+                dominator_values = matrix[None, :, column]
+                if weak:
+                    candidates &= dominator_values >= candidate_values[:, column, None] - atol
+                    strictly_better |= dominator_values > candidate_values[:, column, None] + atol
+                else:
+                    candidates &= dominator_values > candidate_values[:, column, None] + atol
+            checked += 8
+
+        rows, dominators = np.nonzero(candidates)
+        pair_strictly_better = strictly_better[rows, dominators] if weak else None
+        rows += start
+        # A row needs a single dominator, so first verify the candidate with the largest row sum
+        # of every row, and the other candidates only for rows that are still undecided
+        order = np.lexsort((-row_sums[dominators], rows))
+        rows, dominators = rows[order], dominators[order]
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = rows[1:] != rows[:-1]
+        for selection in (first, None):
+            if selection is None:
+                selection = ~first & ~dominated[rows]
+            verified = _verify(matrix, rows[selection], dominators[selection],
+                               pair_strictly_better[order][selection] if weak else None, weak, atol, column_order[checked:])
+            dominated[rows[selection][verified]] = True
+    return dominated
+
+
+def eliminate_dominated(hero_matrix, villain_matrix, weak=False, atol=1e-12, max_rounds=None, block_cells=1 << 24):
+    """
+    Iteratively removes dominated rows (for Hero) and columns (for Villain).
+
+    Args:
+        hero_matrix, villain_matrix: Payoffs of shape (rows, cols).
+        weak: Also remove weakly dominated strategies (and duplicates).
+        atol: Payoff differences within this tolerance count as equal.
+        max_rounds: Optional limit on the number of elimination rounds.
+        block_cells: Approximate number of cells compared at once.
+
+    Returns:
+        A dict with the reduced "hero_matrix" and "villain_matrix", "row_index" and
+        "col_index" (original indices of the remaining rows/columns, see expand_strategy)
+        and "report" with "rounds", "rows" and "cols" as (before, after) and "cells"
+        (fraction of the cells left).
+    """
+    hero_matrix = np.asarray(hero_matrix, dtype=float)
+    villain_matrix = np.asarray(villain_matrix, dtype=float)
+    num_rows, num_cols = hero_matrix.shape
+    row_index = np.arange(num_rows)
+    col_index = np.arange(num_cols)
+
+    rounds = 0
+    while max_rounds is None or rounds < max_rounds:
+        hero = hero_matrix[np.ix_(row_index, col_index)]
+        keep_rows = ~_dominated(hero, weak, atol, block_cells)
+        row_index = row_index[keep_rows]
+        villain = villain_matrix[np.ix_(row_index, col_index)]
+        keep_cols = ~_dominated(villain.T, weak, atol, block_cells)
+        col_index = col_index[keep_cols]
+        rounds += 1
+        if keep_rows.all() and keep_cols.all():
+            break
+
+    return {
+        "hero_matrix": hero_matrix[np.ix_(row_index, col_index)],
+        "villain_matrix": villain_matrix[np.ix_(row_index, col_index)],
+        "row_index": row_index,
+        "col_index": col_index,
+        "report": {
+            "rounds": rounds,
+            "rows": (num_rows, len(row_index)),
+            "cols": (num_cols, len(col_index)),
+            "cells": len(row_index) * len(col_index) / (num_rows * num_cols),
+        },
+    }
+
+
+def expand_strategy(strategy, index, size):
+    """Maps a strategy over the remaining strategies back to a full-size vector."""
+    full = np.zeros(size)
+    full[index] = strategy
+    return full
+
+
+def solve_reduced(solve, hero_matrix, villain_matrix, weak=False, atol=1e-12, **solver_options):
+    """
+    Eliminates dominated strategies, solves the reduced game with `solve` (e.g.
+    solver.solve_game) and expands "row_strategy" / "col_strategy" back to full size.
+    The returned dict additionally holds the elimination "report".
+    """
+    hero_matrix = np.asarray(hero_matrix, dtype=float)
+    reduced = eliminate_dominated(hero_matrix, villain_matrix, weak=weak, atol=atol)
+    result = solve(reduced["hero_matrix"], reduced["villain_matrix"], **solver_options)
+    result["row_strategy"] = expand_strategy(result["row_strategy"], reduced["row_index"], hero_matrix.shape[0])
+    result["col_strategy"] = expand_strategy(result["col_strategy"], reduced["col_index"], hero_matrix.shape[1])
+    result["report"] = reduced["report"]
+    return result
+
+
+if __name__ == "__main__":
+    import time
+
+    from game_matrix import build_payoff_matrices
+    from solver import solve_game, exploitability
+
+    game = build_payoff_matrices(
+        pot=10, hero_bet=0.5, hero_raise=0.5, hero_3bet=0.5, villain_bet=0.5, villain_raise=0.5,
+        hero_ranges=[1, 1, 1], villain_ranges=[1, 1, 1],
+        equities=[[0.5, 0.3, 0.2], [0.7, 0.5, 0.3], [0.8, 0.7, 0.5]], max_actions=4,
+    )
+    hero_matrix, villain_matrix = game["hero_matrix"], game["villain_matrix"]
+
+    for weak in (False, True):
+        start = time.perf_counter()
+        reduced = eliminate_dominated(hero_matrix, villain_matrix, weak=weak)
+        elapsed = time.perf_counter() - start
+        report = reduced["report"]
+        print(f"{'Weak' if weak else 'Strict'} elimination: rows {report['rows'][0]} -> {report['rows'][1]}, "
+              f"cols {report['cols'][0]} -> {report['cols'][1]}, {report['cells']:.2%} of the cells left "
+              f"after {report['rounds']} rounds in {elapsed * 1000:.0f} ms")
+
+        start = time.perf_counter()
+        result = solve_reduced(solve_game, hero_matrix, villain_matrix, weak=weak, convergence_threshold=0.01)
+        elapsed = time.perf_counter() - start
+        _, _, hero_gap, villain_gap = exploitability(hero_matrix, villain_matrix, result["row_strategy"], result["col_strategy"])
+        print(f"  solved in {elapsed:.2f} s, value {result['hero_utility']:.4f}, "
+              f"exploitability in the full game {hero_gap:.4f}/{villain_gap:.4f}")
@@ -0,0 +1,170 @@
+import numpy as np
+
+from game_matrix import bet_amounts, expand, range_pair_payoffs, strategy_labels
+from solver import solve_game
+
+# Double oracle (column generation) for the combined-strategy game of game_matrix.py.
+#
+# The full matrices have n_actions ** n_ranges rows/columns, but an equilibrium is usually
+# supported on a handful of combined strategies. We solve a restricted game over the strategies
+# found so far and add each player's best response against the restricted equilibrium. With linear
+# utility a combined strategy's payoff is a sum over ranges, so the best response is separable: each
+# range simply picks its best action, and the product is never enumerated. The loop stops when
+# neither best response improves on the restricted equilibrium by more than the threshold, which
+# makes the restricted equilibrium an equilibrium of the full game.
+
+
+def _range_action_values(own_payoffs, opponent_codes, opponent_weights):
+    """
+    values[i, a]: payoff of playing action a in own range i against the opponent mixture over
+    the combined strategies `opponent_codes` (shape (k, n_opponent_ranges)) with weights (k,).
+
+    own_payoffs has shape (n_own_ranges, n_opponent_ranges, n_own_actions, n_opponent_actions).
+    """
+    num_opponent_ranges = opponent_codes.shape[1]
+    # gathered[t, j, i, a] = own_payoffs[i, j, a, opponent_codes[t, j]]
+    gathered = own_payoffs[:, np.arange(num_opponent_ranges), :, opponent_codes]
+    return np.tensordot(opponent_weights, gathered.sum(axis=1), axes=1)
+
+
+def best_response(own_payoffs, opponent_codes, opponent_weights):
+    """
+    Returns (codes, value): the best combined pure strategy against the opponent mixture,
+    as one action index per own range, and its payoff.
+    """
+    values = _range_action_values(own_payoffs, opponent_codes, opponent_weights)
+    return values.argmax(axis=-1), values.max(axis=-1).sum()
+
+
+def _add_strategy(support, codes):
+    # Returns the extended support, or None if `codes` is already in it
+    if (support == codes).all(axis=1).any():
+        return None
+    return np.vstack([support, codes])
+
+
+def solve_double_oracle_from_amounts(pot, amounts, hero_ranges, villain_ranges, equities, max_actions=4,
+                                     convergence_threshold=0.001, max_iterations=1000, solver_options=None):
+    """
+    Solves the combined-strategy game without building the full matrices.
+
+    Args:
+        pot, amounts, hero_ranges, villain_ranges, equities, max_actions:
+            As in game_matrix.payoff_matrices_from_amounts (linear utility only, since the
+            best responses rely on payoffs being additive over ranges).
+        convergence_threshold: Stop once neither player's best response gains more than this.
+        max_iterations: Maximum number of restricted games to solve.
+        solver_options: Keyword arguments for solver.solve_game on the restricted games
+                        (by default a fraction of the threshold is used as its own threshold).
+
+    Returns:
+        A dict with "hero_codes" / "villain_codes" (the restricted strategies, one action index
+        per range), "hero_labels" / "villain_labels", "row_strategy" / "col_strategy" (weights
+        over the restricted strategies), "hero_utility", "villain_utility", "hero_exploitability",
+        "villain_exploitability", "iterations" and "converged".
+    """
+    pairs = range_pair_payoffs(pot, amounts, hero_ranges, villain_ranges, equities, max_actions)
+    hero_payoffs = pairs["hero_payoffs"]
+    # Villain's payoffs oriented as (own range, opponent range, own action, opponent action)
+    villain_payoffs = pairs["villain_payoffs"].transpose(1, 0, 3, 2)
+    options = {"convergence_threshold": convergence_threshold / 4, "iterations": 100000, "method": "rm+", "check_every": 10}
+    options.update(solver_options or {})
+
+    hero_support = np.zeros((1, len(pairs["hero_range_probs"])), dtype=int)
+    villain_support = np.zeros((1, len(pairs["villain_range_probs"])), dtype=int)
+    result = None
+    converged = False
+    for iteration in range(1, max_iterations + 1):
+        hero_matrix = expand(hero_payoffs, hero_support, villain_support)
+        villain_matrix = expand(pairs["villain_payoffs"], hero_support, villain_support)  # not transposed
+        warm_start = None
+        if result is not None:
+            # Previous equilibrium, with zero weight on the strategies that were just added
+            warm_start = (
+                np.pad(result["row_strategy"], (0, len(hero_support) - len(result["row_strategy"]))),
+                np.pad(result["col_strategy"], (0, len(villain_support) - len(result["col_strategy"]))),
+            )
+        # The added strategies start with zero weight, so the schedule starts early enough for them to catch up
+        result = solve_game(hero_matrix, villain_matrix, warm_start=warm_start, warm_start_iteration=10, **options)
+
+        hero_codes, hero_best = best_response(hero_payoffs, villain_support, result["col_strategy"])
+        villain_codes, villain_best = best_response(villain_payoffs, hero_support, result["row_strategy"])
+        hero_exploitability = hero_best - result["hero_utility"]
+        villain_exploitability = villain_best - result["villain_utility"]
+        if hero_exploitability <= convergence_threshold and villain_exploitability <= convergence_threshold:
+            converged = True
+            break
+
+        extended_hero = _add_strategy(hero_support, hero_codes) if hero_exploitability > convergence_threshold else None
+        extended_villain = _add_strategy(villain_support, villain_codes) if villain_exploitability > convergence_threshold else None
+        if extended_hero is None and extended_villain is None:
+            # The best responses are already in the restricted game: the remaining gap is the
+            # restricted solver's own error, so only tightening it can help
+            break
+        hero_support = hero_support if extended_hero is None else extended_hero
+        villain_support = villain_support if extended_villain is None else extended_villain
+
+    return {
+        "hero_codes": hero_support,
+        "villain_codes": villain_support,
+        "hero_labels": strategy_labels(hero_support, pairs["hero_actions"], "H"),
+        "villain_labels": strategy_labels(villain_support, pairs["villain_actions"], "V"),
+        "row_strategy": result["row_strategy"],
+        "col_strategy": result["col_strategy"],
+        "hero_utility": result["hero_utility"],
+        "villain_utility": result["villain_utility"],
+        "hero_exploitability": hero_exploitability,
+        "villain_exploitability": villain_exploitability,
+        "iterations": iteration,
+        "converged": converged,
+    }
+
+
+def solve_double_oracle(pot, hero_bet, hero_raise, hero_3bet, villain_bet, villain_raise, hero_ranges,
+                        villain_ranges, equities, max_actions=4, convergence_threshold=0.001, max_iterations=1000,
+                        solver_options=None):
+    """
+    Same as solve_double_oracle_from_amounts, with bet/raise sizes given as fractions of the
+    current pot (see game_matrix.bet_amounts). The returned dict additionally holds "amounts".
+    """
+    amounts = bet_amounts(pot, hero_bet, hero_raise, hero_3bet, villain_bet, villain_raise)
+    result = solve_double_oracle_from_amounts(pot, amounts, hero_ranges, villain_ranges, equities, max_actions,
+                                              convergence_threshold, max_iterations, solver_options)
+    result["amounts"] = amounts
+    return result
+
+
+if __name__ == "__main__":
+    import time
+    import tracemalloc
+
+    from cfr import solve_tree
+
+    sizes = dict(pot=10, hero_bet=0.5, hero_raise=0.5, hero_3bet=0.5, villain_bet=0.5, villain_raise=0.5)
+
+    # 8 ranges per player: the full matrices would be 6 ** 8 x 12 ** 8 (1.7M x 430M)
+    rng = np.random.default_rng(0)
+    num_ranges = 8
+    strength_hero, strength_villain = rng.random(num_ranges), rng.random(num_ranges)
+    equities = 1 / (1 + np.exp(-5 * (strength_hero[:, None] - strength_villain[None, :])))
+
+    def solve():
+        return solve_double_oracle(**sizes, hero_ranges=np.ones(num_ranges), villain_ranges=np.ones(num_ranges),
+                                   equities=equities, convergence_threshold=0.01)
+
+    start = time.perf_counter()
+    result = solve()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    solve()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"Double oracle: value {result['hero_utility']:.4f} after {result['iterations']} iterations, "
+          f"support {len(result['hero_codes'])} x {len(result['villain_codes'])}, "
+          f"{elapsed:.2f} s, peak memory {peak / 2 ** 20:.1f} MiB")
+    for label, weight in zip(result["hero_labels"], result["row_strategy"]):
+        if weight > 0.01:
+            print(f"  {weight:.3f} {label}")
+
+    cfr = solve_tree(**sizes, hero_ranges=np.ones(num_ranges), villain_ranges=np.ones(num_ranges), equities=equities)
+    print(f"CFR+ value {cfr['hero_utility']:.4f}")
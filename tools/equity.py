@@ -0,0 +1,375 @@
+import itertools
+import math
+
+import numpy as np
+
+from pot_model import LinearPotModel
+
+# 7-card hand evaluator and range-vs-range equities, to replace the hand-typed equities of
+# street.py's pot_model_func and initial_game.py.
+#
+# Cards are ints 0..51, card = 4 * rank + suit with ranks 0..12 = "23456789TJQKA" and suits
+# "cdhs"; parse_cards("AsKd") converts strings. evaluate() returns the strength of 7-card hands
+# as an ordinal 0..4823 among the distinct 7-card hand values (higher wins, equal means a split pot).
+#
+# Every card contributes two additive terms, so hands are summed card by card (and the board's
+# share only once in the equity engine):
+#   - a rank key from RANK_KEYS; sums of 7 of them identify the rank multiset uniquely, and index
+#     a table of the best non-flush hand (about 7.8M entries of uint16),
+#   - a 64-bit word with one 16-bit lane per suit, holding the card's rank bit (bits 0..12) plus 1
+#     in bits 13..15, which count the cards of the suit. A count of 5 or more means a flush (at
+#     most one suit can have 5 of 7), and the lane's 13 rank bits index a table of the best flush.
+# With 5 or more cards of one suit no quads or full house is possible, so the flush table wins.
+#
+# Tables are built on first use (a fraction of a second) and kept for the process.
+
+RANKS = "23456789TJQKA"
+SUITS = "cdhs"
+
+# Rank keys whose sums over 7 cards (at most 4 of a rank) are all distinct
+RANK_KEYS = np.array([0, 1, 5, 22, 98, 453, 2031, 8698, 22854, 83661, 262349, 636345, 1479181], dtype=np.int64)
+
+HIGH_CARD, PAIR, TWO_PAIR, TRIPS, STRAIGHT, FLUSH, FULL_HOUSE, QUADS, STRAIGHT_FLUSH = range(9)
+CATEGORY_NAMES = ["high card", "pair", "two pair", "trips", "straight", "flush", "full house", "quads",
+                  "straight flush"]
+
+_CARD_RANK_KEYS = RANK_KEYS[np.arange(52) // 4].astype(np.int32)
+_CARD_BITS = np.left_shift(np.left_shift(np.uint64(1), (np.arange(52) // 4).astype(np.uint64)) | np.uint64(1 << 13),
+                           (16 * (np.arange(52) % 4)).astype(np.uint64))
+_COUNT_TOP_BITS = np.uint64(0x8000800080008000)
+_RANK_BITS = np.uint64(0x1FFF)
+
+_tables = None
+
+
+def parse_cards(cards):
+    """'AsKd' / 'As Kd' / ['As', 'Kd'] -> array of card ints."""
+    if isinstance(cards, str):
+        cards = cards.replace(" ", "").replace(",", "")
+        cards = [cards[k:k + 2] for k in range(0, len(cards), 2)]
+    parsed = []
+    for card in cards:
+        if isinstance(card, (int, np.integer)):
+            parsed.append(int(card))
+            continue
+        if len(card) != 2 or card[0].upper() not in RANKS or card[1].lower() not in SUITS:
+            raise ValueError(f"Invalid card: {card!r}")
+        parsed.append(4 * RANKS.index(card[0].upper()) + SUITS.index(card[1].lower()))
+    if len(set(parsed)) != len(parsed):
+        raise ValueError(f"Duplicate cards in {cards!r}")
+    return np.array(parsed, dtype=np.int64)
+
+
+def card_names(cards):
+    return "".join(RANKS[card // 4] + SUITS[card % 4] for card in np.ravel(cards))
+
+
+def _pack(category, ranks):
+    # category in the top bits, then up to five ranks (most significant first) as nibbles
+    value = np.asarray(category, dtype=np.int64) << 20
+    for k, rank in enumerate(ranks):
+        value = value | (np.asarray(rank, dtype=np.int64) << (16 - 4 * k))
+    return value
+
+
+def _straight_tops(present):
+    """Highest straight (top rank, 3 for the wheel) in rank-presence rows, -1 if none."""
+    top = np.full(len(present), -1)
+    for high in range(3, 13):
+        window = [12, 0, 1, 2, 3] if high == 3 else list(range(high - 4, high + 1))
+        top = np.where(present[:, window].all(axis=1), high, top)
+    return top
+
+
+def _rank_multisets():
+    # All count vectors over the 13 ranks with at most 4 of a rank and 7 cards in total
+    counts = np.zeros((1, 0), dtype=np.int64)
+    for _ in range(13):
+        counts = np.concatenate([np.hstack([counts, np.full((len(counts), 1), k)]) for k in range(5)])
+        counts = counts[counts.sum(axis=1) <= 7]
+    return counts[counts.sum(axis=1) == 7]
+
+
+def _non_flush_values(counts):
+    num_hands = len(counts)
+    ranks = np.arange(13)
+    # Ranks ordered by (count, rank), both descending: quads/trips/pairs first, then kickers
+    order = np.argsort(-(counts * 16 + ranks), axis=1, kind="stable")
+    grouped = np.take_along_axis(counts, order, axis=1)
+    present = counts > 0
+    straight_top = _straight_tops(present)
+
+    def highest_except(*excluded):
+        # Highest present rank other than the excluded ones
+        mask = present.copy()
+        for rank in excluded:
+            mask[np.arange(num_hands), rank] = False
+        return np.where(mask, ranks, -1).max(axis=1)
+
+    r = [order[:, k] for k in range(5)]
+    quads = grouped[:, 0] >= 4
+    full_house = (grouped[:, 0] >= 3) & (grouped[:, 1] >= 2)
+    straight = straight_top >= 0
+    trips = grouped[:, 0] == 3
+    two_pair = (grouped[:, 0] == 2) & (grouped[:, 1] == 2)
+    pair = grouped[:, 0] == 2
+
+    return np.select(
+        [quads, full_house, straight, trips, two_pair, pair],
+        [
+            _pack(QUADS, [r[0], highest_except(r[0])]),
+            _pack(FULL_HOUSE, [r[0], r[1]]),
+            _pack(STRAIGHT, [straight_top]),
+            _pack(TRIPS, [r[0], r[1], r[2]]),
+            _pack(TWO_PAIR, [r[0], r[1], highest_except(r[0], r[1])]),
+            _pack(PAIR, [r[0], r[1], r[2], r[3]]),
+        ],
+        _pack(HIGH_CARD, r),
+    )
+
+
+def _flush_values():
+    masks = np.arange(1 << 13)
+    present = ((masks[:, None] >> np.arange(13)) & 1).astype(bool)
+    straight_top = _straight_tops(present)
+    # Top five ranks of the suit, highest first
+    top = np.argsort(-(present * 16 + np.arange(13)), axis=1, kind="stable")[:, :5]
+    values = np.where(straight_top >= 0, _pack(STRAIGHT_FLUSH, [straight_top]), _pack(FLUSH, top.T))
+    return np.where(present.sum(axis=1) >= 5, values, -1)
+
+
+def _build_tables():
+    counts = _rank_multisets()
+    non_flush = _non_flush_values(counts)
+    flush = _flush_values()
+    # Replace the packed values by their ordinal among all distinct 5-card hand values
+    distinct = np.unique(np.concatenate([non_flush, flush[flush >= 0]]))
+    rank_table = np.zeros(int(RANK_KEYS[-1] * 4 + RANK_KEYS[-2] * 3) + 1, dtype=np.uint16)
+    rank_table[counts @ RANK_KEYS] = np.searchsorted(distinct, non_flush)
+    flush_table = np.zeros(1 << 13, dtype=np.uint16)
+    flush_table[flush >= 0] = np.searchsorted(distinct, flush[flush >= 0])
+    return {"rank": rank_table, "flush": flush_table, "values": distinct}
+
+
+def _get_tables():
+    global _tables
+    if _tables is None:
+        _tables = _build_tables()
+    return _tables
+
+
+def _sum_cards(table, cards):
+    # Sum of the per-card terms over the last axis. uint8 indices gather about twice as fast as
+    # int64 ones, and einsum beats .sum(axis=-1) on short rows
+    return np.einsum("...j->...", table[np.asarray(cards).astype(np.uint8, copy=False)])
+
+
+def _evaluate_sums(rank_keys, bits):
+    """Hand ordinals from the summed per-card terms of 7-card hands (any matching shapes)."""
+    tables = _get_tables()
+    # Clipped: the equity engine also evaluates combos that collide with a runout (masked out later),
+    # which can hold five cards of a rank
+    strength = np.take(tables["rank"], rank_keys, mode="clip")
+    # Suit count (bits 13..15 of a lane) >= 5 <=> bit 15 and (bit 14 or bit 13)
+    flags = bits & ((bits << np.uint64(1)) | (bits << np.uint64(2))) & _COUNT_TOP_BITS
+    flushes = np.flatnonzero(flags)
+    if len(flushes):
+        flat = strength.reshape(-1)
+        flush_flags = flags.reshape(-1)[flushes]
+        suit = (flush_flags >= np.uint64(1 << 31)).astype(np.uint64) + (flush_flags >= np.uint64(1 << 47)) \
+            + (flush_flags >= np.uint64(1 << 63))
+        masks = (bits.reshape(-1)[flushes] >> (np.uint64(16) * suit)) & _RANK_BITS
+        flat[flushes] = tables["flush"][masks.astype(np.int64)]
+    return strength
+
+
+def evaluate(cards):
+    """
+    Strength of 7-card hands.
+
+    Args:
+        cards: Card ints of shape (..., 7), see parse_cards.
+
+    Returns:
+        uint16 array of shape (...) with the hand ordinal (higher is better).
+    """
+    cards = np.asarray(cards)
+    if cards.shape[-1] != 7:
+        raise ValueError(f"Expected 7 cards per hand, got {cards.shape[-1]}")
+    return _evaluate_sums(_sum_cards(_CARD_RANK_KEYS, cards), _sum_cards(_CARD_BITS, cards))
+
+
+def hand_category(strength):
+    """Category index (HIGH_CARD ... STRAIGHT_FLUSH) of hand ordinals."""
+    return (_get_tables()["values"][np.asarray(strength, dtype=np.int64)] >> 20).astype(int)
+
+
+def expand_hand_class(hand_class, dead=()):
+    """
+    All two-card combos of a hand class: 'AA', 'AKs', 'AKo', 'AK' (suited and offsuit) or a
+    specific hand like 'AsKd'. Combos containing a dead card are dropped.
+
+    Returns:
+        Array of shape (n_combos, 2).
+    """
+    hand_class = hand_class.strip()
+    dead = set(int(card) for card in dead)
+    if len(hand_class) == 4:
+        combos = [tuple(parse_cards(hand_class))]
+    else:
+        high, low, kind = RANKS.index(hand_class[0].upper()), RANKS.index(hand_class[1].upper()), hand_class[2:].lower()
+        if kind not in ("", "s", "o") or (high == low and kind):
+            raise ValueError(f"Invalid hand class: {hand_class!r}")
+        if high == low:
+            combos = [(4 * high + a, 4 * high + b) for a, b in itertools.combinations(range(4), 2)]
+        else:
+            combos = [(4 * high + a, 4 * low + b) for a in range(4) for b in range(4)
+                      if kind == "" or (kind == "s") == (a == b)]
+    combos = [combo for combo in combos if not dead.intersection(combo)]
+    return np.array(combos, dtype=np.int64).reshape(-1, 2)
+
+
+def _class_combos(classes, dead):
+    # Concatenated combos of all classes and the class index of every combo
+    if isinstance(classes, str):
+        classes = classes.split(",")
+    combos = [expand_hand_class(c, dead) if isinstance(c, str) else np.asarray(c, dtype=np.int64).reshape(-1, 2)
+              for c in classes]
+    index = np.concatenate([np.full(len(c), k) for k, c in enumerate(combos)])
+    return np.concatenate(combos), index.astype(int), len(combos)
+
+
+def _runouts(board, num_samples, seed):
+    # Cards completing the board to 5: all of them, or `num_samples` random ones if there are more
+    missing = 5 - len(board)
+    deck = np.setdiff1d(np.arange(52), board)
+    if missing == 0:
+        return np.zeros((1, 0), dtype=np.int64), True
+    total = math.comb(len(deck), missing)
+    if num_samples is None or num_samples >= total:
+        return np.array(list(itertools.combinations(deck, missing)), dtype=np.int64), True
+    rng = np.random.default_rng(seed)
+    # All samples at once: the first `missing` cards of a random permutation of the deck per row
+    samples = deck[np.argsort(rng.random((num_samples, len(deck))), axis=1)[:, :missing]]
+    return samples, False
+
+
+def _combo_strengths(combos, board, runouts):
+    # (n_combos, n_runouts) strengths, with the board's terms summed once
+    sums = [table[board].sum() + _sum_cards(table, combos)[:, None] + _sum_cards(table, runouts)[None, :]
+            for table in (_CARD_RANK_KEYS, _CARD_BITS)]
+    return _evaluate_sums(*sums)
+
+
+def _card_masks(cards):
+    return np.bitwise_or.reduce(np.left_shift(np.uint64(1), cards.astype(np.uint64)), axis=-1) \
+        if cards.shape[-1] else np.zeros(len(cards), dtype=np.uint64)
+
+
+def equity_matrix(hero_classes, villain_classes, board, num_samples=1000, seed=0, block_cells=1 << 24):
+    """
+    Hero's equity (wins plus half the ties) of every hero hand class against every villain
+    hand class on `board`, averaged over all compatible combo pairs and runouts.
+
+    Args:
+        hero_classes, villain_classes: Lists (or comma-separated strings) of hand classes as
+            taken by expand_hand_class, or arrays of (n_combos, 2) card ints.
+        board: 3, 4 or 5 board cards.
+        num_samples: On the flop (or turn), at most this many runouts are sampled at random
+            with `seed`, shared by all combo pairs; None enumerates all of them. Turn and
+            river boards are always exhaustive unless num_samples is below the number of runouts.
+        block_cells: Approximate number of (combo pair, runout) comparisons per block.
+
+    Returns:
+        A dict with "equity" (n_hero_classes, n_villain_classes), NaN where no combo pair is
+        compatible, "weights" (number of compatible combo pairs x runouts behind each entry),
+        "exhaustive" and "num_runouts".
+    """
+    board = parse_cards(board)
+    if not 3 <= len(board) <= 5:
+        raise ValueError(f"Board must have 3 to 5 cards, got {len(board)}")
+    hero_combos, hero_index, num_hero = _class_combos(hero_classes, board)
+    villain_combos, villain_index, num_villain = _class_combos(villain_classes, board)
+    runouts, exhaustive = _runouts(board, num_samples, seed)
+
+    hero_strength = _combo_strengths(hero_combos, board, runouts)
+    villain_strength = _combo_strengths(villain_combos, board, runouts)
+    runout_masks = _card_masks(runouts)
+    hero_masks, villain_masks = _card_masks(hero_combos), _card_masks(villain_combos)
+    hero_valid = (hero_masks[:, None] & runout_masks[None, :]) == 0
+    villain_valid = (villain_masks[:, None] & runout_masks[None, :]) == 0
+
+    # Combo -> class one-hot matrices aggregate the per-combo-pair sums
+    hero_onehot = np.eye(num_hero)[hero_index]
+    villain_onehot = np.eye(num_villain)[villain_index]
+    score = np.zeros((num_hero, num_villain))   # in half points: 2 per win, 1 per tie
+    weight = np.zeros((num_hero, num_villain))
+
+    block = max(1, block_cells // max(1, len(villain_combos) * len(runouts)))
+    for start in range(0, len(hero_combos), block):
+        stop = min(start + block, len(hero_combos))
+        compatible = (hero_masks[start:stop, None] & villain_masks[None, :]) == 0
+        both = hero_valid[start:stop, None, :] & villain_valid[None, :, :] & compatible[:, :, None]
+        h, v = hero_strength[start:stop, None, :], villain_strength[None, :, :]
+        half_points = 2 * ((h > v) & both).sum(axis=-1) + ((h == v) & both).sum(axis=-1)
+        score += hero_onehot[start:stop].T @ half_points @ villain_onehot
+        weight += hero_onehot[start:stop].T @ both.sum(axis=-1) @ villain_onehot
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        equity = np.where(weight > 0, score / (2 * weight), np.nan)
+    return {"equity": equity, "weights": weight, "exhaustive": exhaustive, "num_runouts": len(runouts)}
+
+
+def equity_pot_model(hero_hand, villain_classes, board, **options):
+    """
+    pot_model for street.f / f_batch: Hero holds `hero_hand` (a specific hand or a class) and
+    Villain's hand types are `villain_classes`, with equities from equity_matrix on `board`.
+    """
+    equities = equity_matrix([hero_hand], villain_classes, board, **options)["equity"][0]
+    if np.isnan(equities).any():
+        raise ValueError("Some villain classes are incompatible with the hero hand and board")
+    return LinearPotModel(equities)
+
+
+if __name__ == "__main__":
+    import time
+
+    start = time.perf_counter()
+    _get_tables()
+    print(f"Tables built in {time.perf_counter() - start:.2f} s, {len(_get_tables()['values'])} distinct hand values")
+
+    rng = np.random.default_rng(0)
+    hands = np.argsort(rng.random((2_000_000, 52)), axis=1)[:, :7].astype(np.uint8)
+    evaluate(hands[:1000])
+    start = time.perf_counter()
+    strengths = evaluate(hands)
+    elapsed = time.perf_counter() - start
+    frequencies = np.bincount(hand_category(strengths), minlength=9) / len(hands)
+    print(f"{len(hands):,} random hands in {elapsed:.3f} s ({len(hands) / elapsed / 1e6:.1f}M hands/s)")
+    print({name: round(float(p), 4) for name, p in zip(CATEGORY_NAMES, frequencies)})
+
+    # With the board summed once, a hand is two additions and a table lookup
+    combos = np.array(list(itertools.combinations(np.setdiff1d(np.arange(52), parse_cards("Ah7d2c")), 2)))
+    runouts, _ = _runouts(parse_cards("Ah7d2c"), None, 0)
+    start = time.perf_counter()
+    _combo_strengths(combos, parse_cards("Ah7d2c"), runouts)
+    elapsed = time.perf_counter() - start
+    print(f"All {len(combos)} hands x {len(runouts)} runouts of a flop in {elapsed:.3f} s "
+          f"({len(combos) * len(runouts) / elapsed / 1e6:.1f}M hands/s)")
+
+    villain_classes = ["AA", "KQs", "JTs", "76s"]
+    for board in ("Ah7d2c", "Ah7d2c9s", "Ah7d2c9sKd"):
+        start = time.perf_counter()
+        result = equity_matrix(["AKo", "QQ", "T9s"], villain_classes, board)
+        print(f"{board}: {result['num_runouts']} runouts ({'exhaustive' if result['exhaustive'] else 'sampled'}) "
+              f"in {time.perf_counter() - start:.3f} s")
+        print(np.round(result["equity"], 3))
+
+    # Drop-in pot model for street.f: Hero holds AsKd against the four villain classes
+    from street import f
+
+    pot_model = equity_pot_model("AsKd", villain_classes, "Ah7d2c")
+    print(pot_model)
+    results = f(pot_model, 300, 150, 300, 500, np.array([0.1, 0.3, 0.3, 0.3]), [0.1, 0.5, 0.5, 0.7],
+                [0.5, 0.4, 0.4, 0.3], [0.4, 0.1, 0.1, 0.0], [1.0, 0.5, 0.5, 0.5])
+    print(f"EV of betting 150 into 300: {results['step1_hero_initial_action']['overall_ev_hero_action']:.2f}")
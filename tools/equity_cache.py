@@ -0,0 +1,354 @@
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from equity import card_names, equity_matrix, parse_cards
+
+# On-disk cache of equity matrices (equity.equity_matrix), shared by processes without copying.
+#
+#   cache = EquityCache("equity_cache")                       # one writer, e.g. the main process
+#   equities = cache.equity_matrix("Ah7d2c", hero_classes, villain_classes)
+#   reader = EquityCache("equity_cache", readonly=True)       # any number of read-only workers
+#
+# Entries are content-addressed: the key is a hash of the canonical board (sorted, suits relabelled
+# to the smallest suit-isomorphic board, with explicit combos like "AsKd" relabelled the same way),
+# the hand classes and the sampling options. So "Ah7d2c" and "7s2hAc" share an entry.
+#
+# All matrices live in one append-only float64 file, data-<generation>.bin, which readers map with
+# np.memmap, so a lookup returns a read-only view into the page cache. index.json maps keys to
+# offsets and is replaced atomically. When the data file grows beyond max_bytes, the least recently
+# used entries are dropped and the survivors are compacted into the next generation's file; readers
+# that still map the old file keep a valid mapping until they notice the new index, and a reader
+# whose index names a file that is gone reloads the index and looks the entry up again. There must
+# be a single writer per directory. Readers only write their own hits-<pid>.json (on flush/close),
+# the last use of every entry they hit, which the writer merges into the LRU order when it compacts.
+#
+# `python equity_cache.py warm equity_cache --hero AA,KK,AKs --villain QQ,JJ,AQs` precomputes all
+# 1755 suit-isomorphic flops for the given classes.
+
+INDEX_FILE = "index.json"
+HITS_PREFIX = "hits-"
+ITEM_SIZE = np.dtype(np.float64).itemsize
+_SUIT_PERMUTATIONS = np.array(list(itertools.permutations(range(4))))
+
+
+def _relabel(cards, permutation):
+    cards = np.asarray(cards, dtype=np.int64)
+    return cards - cards % 4 + permutation[cards % 4]
+
+
+def canonical_board(board):
+    """
+    Smallest suit-isomorphic relabelling of `board` (as a sorted card array) and the
+    suit permutation that produces it.
+    """
+    board = parse_cards(board)
+    candidates = [tuple(np.sort(_relabel(board, permutation))) for permutation in _SUIT_PERMUTATIONS]
+    best = min(range(len(candidates)), key=candidates.__getitem__)
+    return np.array(candidates[best], dtype=np.int64), _SUIT_PERMUTATIONS[best]
+
+
+def flop_isomorphism_classes():
+    """The 1755 canonical flops, as an array of shape (1755, 3)."""
+    flops = np.array(list(itertools.combinations(range(52), 3)))
+    codes = []
+    for permutation in _SUIT_PERMUTATIONS:
+        relabelled = np.sort(_relabel(flops, permutation), axis=1)
+        codes.append((relabelled[:, 0] * 52 + relabelled[:, 1]) * 52 + relabelled[:, 2])
+    unique = np.unique(np.min(codes, axis=0))
+    return np.stack([unique // (52 * 52), unique // 52 % 52, unique % 52], axis=1)
+
+
+def _canonical_classes(classes, permutation):
+    if isinstance(classes, str):
+        classes = classes.split(",")
+    canonical = []
+    for hand_class in classes:
+        if isinstance(hand_class, str):
+            hand_class = hand_class.strip()
+            if len(hand_class) == 4:  # a specific hand, whose suits matter
+                hand_class = card_names(np.sort(_relabel(parse_cards(hand_class), permutation)))
+            else:
+                hand_class = hand_class[:2].upper() + hand_class[2:].lower()
+            canonical.append(hand_class)
+        else:
+            combos = np.sort(_relabel(np.asarray(hand_class).reshape(-1, 2), permutation), axis=1)
+            canonical.append(combos[np.lexsort(combos.T[::-1])].tolist())
+    return canonical
+
+
+def cache_key(board, hero_classes, villain_classes, num_samples=1000, seed=0):
+    """Content address of an equity matrix: (hex digest, canonical board string)."""
+    board, permutation = canonical_board(board)
+    description = json.dumps({
+        "board": card_names(board),
+        "hero": _canonical_classes(hero_classes, permutation),
+        "villain": _canonical_classes(villain_classes, permutation),
+        "num_samples": num_samples if len(board) < 5 else None,
+        "seed": seed if len(board) < 5 else None,
+    }, sort_keys=True)
+    return hashlib.sha256(description.encode()).hexdigest(), card_names(board)
+
+
+class EquityCache:
+    """Memory-mapped equity matrix cache in `directory` (see the module comment)."""
+
+    def __init__(self, directory, max_bytes=1 << 30, readonly=False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.readonly = readonly
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._index = {"generation": 0, "data_bytes": 0, "entries": {}}
+        self._index_mtime = None
+        self._data = None
+        self._data_generation = None
+        self._dirty = False
+        self._reader_hits = {}
+        if not readonly:
+            os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    # Index and data file
+
+    def _index_path(self):
+        return os.path.join(self.directory, INDEX_FILE)
+
+    def _data_path(self, generation=None):
+        generation = self._index["generation"] if generation is None else generation
+        return os.path.join(self.directory, f"data-{generation}.bin")
+
+    def _load_index(self):
+        try:
+            mtime = os.stat(self._index_path()).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime != self._index_mtime:
+            with open(self._index_path()) as file:
+                self._index = json.load(file)
+            self._index_mtime = mtime
+
+    def _write_index(self):
+        temporary = self._index_path() + ".tmp"
+        with open(temporary, "w") as file:
+            json.dump(self._index, file)
+        os.replace(temporary, self._index_path())
+        self._index_mtime = os.stat(self._index_path()).st_mtime_ns
+        self._dirty = False
+
+    def _mapped(self, end):
+        # A memmap of the current data file that covers `end` bytes, remapped after appends/compaction
+        if self._data is None or self._data_generation != self._index["generation"] or len(self._data) * ITEM_SIZE < end:
+            self._data = np.memmap(self._data_path(), dtype=np.float64, mode="r")
+            self._data_generation = self._index["generation"]
+        return self._data
+
+    # Lookups
+
+    def get(self, board, hero_classes, villain_classes, num_samples=1000, seed=0):
+        """The cached equity matrix (a read-only view into the mapped file), or None."""
+        key, _ = cache_key(board, hero_classes, villain_classes, num_samples, seed)
+        entry = self._index["entries"].get(key)
+        if entry is None and self.readonly:
+            self._load_index()  # the writer may have added it since
+            entry = self._index["entries"].get(key)
+        if entry is not None:
+            try:
+                data = self._mapped(entry["offset"] + int(np.prod(entry["shape"])) * ITEM_SIZE)
+            except FileNotFoundError:
+                # The writer compacted into a new generation since our index was loaded
+                self._data = None
+                self._load_index()
+                entry = self._index["entries"].get(key)
+                if entry is not None:
+                    data = self._mapped(entry["offset"] + int(np.prod(entry["shape"])) * ITEM_SIZE)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if self.readonly:
+            self._reader_hits[key] = time.time()
+        else:
+            entry["last_used"] = time.time()
+            self._dirty = True
+        offset, shape = entry["offset"], tuple(entry["shape"])
+        size = int(np.prod(shape))
+        return data[offset // ITEM_SIZE:offset // ITEM_SIZE + size].reshape(shape)
+
+    def put(self, board, hero_classes, villain_classes, equities, num_samples=1000, seed=0):
+        """Appends an equity matrix; evicts least recently used entries beyond max_bytes."""
+        if self.readonly:
+            raise PermissionError("EquityCache opened read-only")
+        key, canonical = cache_key(board, hero_classes, villain_classes, num_samples, seed)
+        if key in self._index["entries"]:
+            return
+        equities = np.ascontiguousarray(equities, dtype=np.float64)
+        with open(self._data_path(), "ab") as file:
+            offset = file.tell()
+            file.write(equities.tobytes())
+        self._index["entries"][key] = {
+            "offset": offset,
+            "shape": list(equities.shape),
+            "last_used": time.time(),
+            "board": canonical,
+        }
+        self._index["data_bytes"] = offset + equities.nbytes
+        if self._index["data_bytes"] > self.max_bytes:
+            self._compact()
+        self._write_index()
+
+    def equity_matrix(self, board, hero_classes, villain_classes, num_samples=1000, seed=0):
+        """Cached equity.equity_matrix(...)["equity"], computed and stored on a miss."""
+        equities = self.get(board, hero_classes, villain_classes, num_samples, seed)
+        if equities is None:
+            # Compute on the canonical board with the relabelled classes, like every other request of this entry
+            canonical, permutation = canonical_board(board)
+            hero, villain = (
+                [c if isinstance(c, str) else np.array(c) for c in _canonical_classes(classes, permutation)]
+                for classes in (hero_classes, villain_classes)
+            )
+            equities = equity_matrix(hero, villain, canonical, num_samples=num_samples, seed=seed)["equity"]
+            if not self.readonly:
+                self.put(board, hero_classes, villain_classes, equities, num_samples, seed)
+        return equities
+
+    # Maintenance
+
+    def _merge_reader_hits(self):
+        # Fold the readers' hits-<pid>.json files into last_used, then drop them
+        entries = self._index["entries"]
+        for name in os.listdir(self.directory):
+            if not (name.startswith(HITS_PREFIX) and name.endswith(".json")):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path) as file:
+                    hits = json.load(file)
+                os.remove(path)
+            except (FileNotFoundError, ValueError):
+                continue  # removed or being replaced by its reader, merged next time
+            for key, last_used in hits.items():
+                if key in entries:
+                    entries[key]["last_used"] = max(entries[key]["last_used"], last_used)
+
+    def _compact(self):
+        # Keep the most recently used entries within 3/4 of max_bytes, rewritten into the next generation
+        self._merge_reader_hits()
+        entries = sorted(self._index["entries"].items(), key=lambda item: item[1]["last_used"], reverse=True)
+        kept, size = [], 0
+        for key, entry in entries:
+            nbytes = int(np.prod(entry["shape"])) * ITEM_SIZE
+            if size + nbytes > self.max_bytes * 3 // 4:
+                self.evictions += 1
+                continue
+            kept.append((key, entry))
+            size += nbytes
+
+        old_path, generation = self._data_path(), self._index["generation"] + 1
+        old = np.memmap(old_path, dtype=np.float64, mode="r") if self._index["data_bytes"] else np.zeros(0)
+        offset = 0
+        with open(self._data_path(generation), "wb") as file:
+            for key, entry in kept:
+                start, count = entry["offset"] // ITEM_SIZE, int(np.prod(entry["shape"]))
+                file.write(np.asarray(old[start:start + count]).tobytes())
+                entry["offset"] = offset
+                offset += count * ITEM_SIZE
+        del old
+        self._data = None
+        self._index = {"generation": generation, "data_bytes": offset, "entries": dict(kept)}
+        self._write_index()
+        os.remove(old_path)  # readers that still map it keep their mapping
+
+    def flush(self):
+        """
+        Persists the LRU timestamps of cache hits (puts are persisted immediately): into the
+        index for the writer, into this process's hits file for a reader.
+        """
+        if self.readonly:
+            if self._reader_hits:
+                path = os.path.join(self.directory, f"{HITS_PREFIX}{os.getpid()}.json")
+                try:
+                    with open(path) as file:
+                        previous = json.load(file)
+                except (FileNotFoundError, ValueError):
+                    previous = {}
+                for key, last_used in previous.items():
+                    self._reader_hits[key] = max(self._reader_hits.get(key, 0), last_used)
+                try:
+                    with open(path + ".tmp", "w") as file:
+                        json.dump(self._reader_hits, file)
+                    os.replace(path + ".tmp", path)
+                except OSError:
+                    return  # a directory the reader cannot write to: its hits do not count for the LRU order
+                self._reader_hits = {}
+        elif self._dirty:
+            self._write_index()
+
+    def close(self):
+        self.flush()
+        self._data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def cache_info(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._index["entries"]),
+            "bytes": self._index["data_bytes"],
+            "max_bytes": self.max_bytes,
+        }
+
+
+def warm_up(cache, hero_classes, villain_classes, num_samples=1000, seed=0, progress=True):
+    """Computes the equity matrices of all canonical flops that are not cached yet."""
+    flops = flop_isomorphism_classes()
+    start = time.perf_counter()
+    for k, flop in enumerate(flops):
+        cache.equity_matrix(flop, hero_classes, villain_classes, num_samples, seed)
+        if progress and (k + 1) % 25 == 0:
+            elapsed = time.perf_counter() - start
+            print(f"\r{k + 1}/{len(flops)} flops, {(k + 1) / elapsed:.1f} flops/s", end="", file=sys.stderr, flush=True)
+    if progress:
+        print(file=sys.stderr)
+    cache.flush()
+    return len(flops)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain an on-disk equity matrix cache.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    warm = commands.add_parser("warm", help="precompute all suit-isomorphic flops")
+    warm.add_argument("directory")
+    warm.add_argument("--hero", required=True, help="comma-separated hero hand classes, e.g. AA,KK,AKs")
+    warm.add_argument("--villain", required=True, help="comma-separated villain hand classes")
+    warm.add_argument("--samples", type=int, default=1000, help="Monte Carlo runouts per flop (0 = exhaustive)")
+    warm.add_argument("--seed", type=int, default=0)
+    warm.add_argument("--max-bytes", type=int, default=1 << 30)
+    info = commands.add_parser("info", help="print the cache statistics")
+    info.add_argument("directory")
+    args = parser.parse_args(argv)
+
+    if args.command == "warm":
+        with EquityCache(args.directory, max_bytes=args.max_bytes) as cache:
+            warm_up(cache, args.hero.split(","), args.villain.split(","), args.samples or None, args.seed)
+            print(cache.cache_info())
+    else:
+        print(EquityCache(args.directory, readonly=True).cache_info())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,502 @@
+import itertools
+
+import numpy as np
+
+# Builds the hero/villain payoff matrices of the range-vs-range game played in the React app
+# (src/utils/matrixCalculator.ts) for any number of ranges and max actions 2, 3 or 4.
+#
+# The action tree is enumerated once, every terminal node is reduced to an affine function
+# of the equity (value = A * equity + B), and the matrices over combined pure strategies are
+# assembled with NumPy broadcasting over terminal nodes x range pairs.
+#
+# With linear utility the game is constant-sum (villain = pot - hero), so one matrix is enough:
+# zero_sum_payoff_matrix builds hero - pot / 2 in float32, block by block and optionally straight
+# into a memory-mapped .npy file, for configurations whose two float64 matrices do not fit in RAM.
+# The two-matrix builders remain for the logarithmic utility, which is not constant-sum.
+
+HERO = "hero"
+VILLAIN = "villain"
+
+# Terminal node kinds
+SHOWDOWN = 0       # both players invested `amount`, the pot goes to showdown
+HERO_FOLDS = 1     # hero folds after investing `amount`
+VILLAIN_FOLDS = 2  # villain folds after investing `amount`
+
+
+def _decision(player, actions):
+    return {"player": player, "actions": actions}
+
+
+def _terminal(kind, amount=None):
+    return {"outcome": kind, "amount": amount}
+
+
+def action_tree(max_actions):
+    """
+    Returns the betting tree for the given max actions as nested dicts.
+
+    Decision nodes are {"player": HERO | VILLAIN, "actions": {action: child}}, terminal
+    nodes are {"outcome": SHOWDOWN | HERO_FOLDS | VILLAIN_FOLDS, "amount": key} where
+    key names the total amount invested by the player(s) concerned, see bet_amounts
+    (None when nothing was invested).
+    """
+    if max_actions == 2:
+        return _decision(HERO, {
+            "check": _decision(VILLAIN, {"check": _terminal(SHOWDOWN)}),
+            "bet": _decision(VILLAIN, {
+                "fold": _terminal(VILLAIN_FOLDS),
+                "call": _terminal(SHOWDOWN, "hero_bet"),
+            }),
+        })
+    if max_actions == 3:
+        return _decision(HERO, {
+            "check": _decision(VILLAIN, {
+                "check": _terminal(SHOWDOWN),
+                "bet": _decision(HERO, {
+                    "fold": _terminal(HERO_FOLDS),
+                    "call": _terminal(SHOWDOWN, "villain_bet"),
+                }),
+            }),
+            "bet": _decision(VILLAIN, {
+                "fold": _terminal(VILLAIN_FOLDS),
+                "call": _terminal(SHOWDOWN, "hero_bet"),
+                "raise": _decision(HERO, {
+                    "fold": _terminal(HERO_FOLDS, "hero_bet"),
+                    "call": _terminal(SHOWDOWN, "villain_raise"),
+                }),
+            }),
+        })
+    if max_actions == 4:
+        return _decision(HERO, {
+            "check": _decision(VILLAIN, {
+                "check": _terminal(SHOWDOWN),
+                "bet": _decision(HERO, {
+                    "fold": _terminal(HERO_FOLDS),
+                    "call": _terminal(SHOWDOWN, "villain_bet"),
+                    "raise": _decision(VILLAIN, {
+                        "fold": _terminal(VILLAIN_FOLDS, "villain_bet"),
+                        "call": _terminal(SHOWDOWN, "hero_raise"),
+                    }),
+                }),
+            }),
+            "bet": _decision(VILLAIN, {
+                "fold": _terminal(VILLAIN_FOLDS),
+                "call": _terminal(SHOWDOWN, "hero_bet"),
+                "raise": _decision(HERO, {
+                    "fold": _terminal(HERO_FOLDS, "hero_bet"),
+                    "call": _terminal(SHOWDOWN, "villain_raise"),
+                    "3bet": _decision(VILLAIN, {
+                        "fold": _terminal(VILLAIN_FOLDS, "villain_raise"),
+                        "call": _terminal(SHOWDOWN, "hero_3bet"),
+                    }),
+                }),
+            }),
+        })
+    raise ValueError(f"Unsupported maxActions level: {max_actions}")
+
+
+def bet_amounts(pot, hero_bet, hero_raise, hero_3bet, villain_bet, villain_raise):
+    """
+    Converts bet/raise sizes given as fractions of the current pot into the total
+    amount each player has invested on the street, as in matrixCalculator.ts.
+    """
+    hero_bet_amount = pot * hero_bet
+    villain_bet_amount = pot * villain_bet
+    pot_after_villain_bet = pot + 2 * villain_bet_amount
+    hero_raise_amount = villain_bet_amount + pot_after_villain_bet * hero_raise
+    pot_after_hero_bet = pot + 2 * hero_bet_amount
+    villain_raise_amount = hero_bet_amount + pot_after_hero_bet * villain_raise
+    pot_after_villain_raise = pot_after_hero_bet + 2 * (villain_raise_amount - hero_bet_amount)
+    hero_3bet_amount = villain_raise_amount + pot_after_villain_raise * hero_3bet
+    return {
+        "hero_bet": hero_bet_amount,
+        "villain_bet": villain_bet_amount,
+        "hero_raise": hero_raise_amount,
+        "villain_raise": villain_raise_amount,
+        "hero_3bet": hero_3bet_amount,
+    }
+
+
+def pure_strategies(tree, player):
+    """
+    Enumerates the reduced pure strategies of `player`, in the order of
+    getHeroActions / getVillainActions in src/types.ts.
+
+    Returns:
+        A list of (name, plan) tuples, where name is e.g. 'check-raise' or
+        'bet-call/raise-fold' and plan maps the path of each of the player's
+        reachable decision nodes (a tuple of actions from the root) to an action.
+    """
+    def enumerate_node(node, path):
+        if "outcome" in node:
+            return [("", {})]
+        if node["player"] == player:
+            options = []
+            for action, child in node["actions"].items():
+                for child_name, child_plan in enumerate_node(child, path + (action,)):
+                    name = f"{action}-{child_name}" if child_name else action
+                    options.append((name, {path: action, **child_plan}))
+            return options
+        # Opponent node: the player needs a plan for every opponent action
+        per_child = [enumerate_node(child, path + (action,)) for action, child in node["actions"].items()]
+        options = []
+        for combination in itertools.product(*per_child):
+            name = "/".join(child_name for child_name, _ in combination if child_name)
+            plan = {}
+            for _, child_plan in combination:
+                plan.update(child_plan)
+            options.append((name, plan))
+        return options
+
+    return enumerate_node(tree, ())
+
+
+def play(tree, hero_plan, villain_plan):
+    """Follows both plans from the root and returns the terminal node reached."""
+    node, path = tree, ()
+    while "outcome" not in node:
+        plan = hero_plan if node["player"] == HERO else villain_plan
+        action = plan[path]
+        node, path = node["actions"][action], path + (action,)
+    return node
+
+
+def terminal_structure(tree_or_max_actions):
+    """
+    Plays every (hero pure strategy, villain pure strategy) pair once.
+
+    Returns:
+        A dict with "hero_actions", "villain_actions" (names), "kinds" (terminal kind of every
+        pair, shape (n_hero_actions, n_villain_actions)) and "amounts" (the bet_amounts key of
+        the amount invested at every pair, or None).
+    """
+    tree = action_tree(tree_or_max_actions) if isinstance(tree_or_max_actions, int) else tree_or_max_actions
+    hero_strategies = pure_strategies(tree, HERO)
+    villain_strategies = pure_strategies(tree, VILLAIN)
+
+    shape = (len(hero_strategies), len(villain_strategies))
+    kinds = np.empty(shape, dtype=np.int8)
+    amount_keys = np.empty(shape, dtype=object)
+    for h, (_, hero_plan) in enumerate(hero_strategies):
+        for v, (_, villain_plan) in enumerate(villain_strategies):
+            terminal = play(tree, hero_plan, villain_plan)
+            kinds[h, v] = terminal["outcome"]
+            amount_keys[h, v] = terminal["amount"]
+    return {
+        "hero_actions": [name for name, _ in hero_strategies],
+        "villain_actions": [name for name, _ in villain_strategies],
+        "kinds": kinds,
+        "amounts": amount_keys,
+    }
+
+
+def _affine_payoffs(pot, invested, kinds):
+    # A_hero, B_hero, A_villain, B_villain for broadcastable pot / invested arrays
+    showdown = kinds == SHOWDOWN
+    final_pot = pot + 2 * invested
+    return (
+        np.where(showdown, final_pot, 0.0),
+        np.select([showdown, kinds == HERO_FOLDS], [-invested, -invested], pot + invested),
+        np.where(showdown, -final_pot, 0.0),
+        np.select([showdown, kinds == HERO_FOLDS], [pot + invested, pot + invested], -invested),
+    )
+
+
+def terminal_coefficients(pot, amounts, tree_or_max_actions):
+    """
+    Reduces every (hero pure strategy, villain pure strategy) pair to the affine
+    payoffs hero = A_hero * equity + B_hero and villain = A_villain * equity + B_villain,
+    with the same conventions as getActionPayoffs in calculationHelpers.ts.
+
+    Returns:
+        A dict with "hero_actions", "villain_actions" (names) and the four
+        (n_hero_actions, n_villain_actions) arrays "A_hero", "B_hero", "A_villain", "B_villain".
+    """
+    structure = terminal_structure(tree_or_max_actions)
+    invested = np.array([
+        [0.0 if key is None else amounts[key] for key in row] for row in structure["amounts"]
+    ]).reshape(structure["kinds"].shape)
+    A_hero, B_hero, A_villain, B_villain = _affine_payoffs(pot, invested, structure["kinds"])
+    return {
+        "hero_actions": structure["hero_actions"],
+        "villain_actions": structure["villain_actions"],
+        "A_hero": A_hero,
+        "B_hero": B_hero,
+        "A_villain": A_villain,
+        "B_villain": B_villain,
+    }
+
+
+def combined_strategy_codes(num_ranges, num_actions):
+    """
+    Action index of every range in every combined pure strategy, shape
+    (num_actions ** num_ranges, num_ranges). Range 0 varies fastest, as in
+    generateStrategies (strategyUtils.ts).
+    """
+    combined = np.arange(num_actions ** num_ranges)
+    return (combined[:, None] // num_actions ** np.arange(num_ranges)) % num_actions
+
+
+def strategy_labels(codes, actions, prefix):
+    """Labels combined pure strategies as e.g. 'H1:check-fold,H2:bet-call'."""
+    return [
+        ",".join(f"{prefix}{i+1}:{actions[a]}" for i, a in enumerate(row))
+        for row in codes.tolist()
+    ]
+
+
+def _contract_villain_ranges(range_pair_payoffs, villain_codes):
+    """per_hero_range[t, i, a] = sum over villain ranges j of payoffs[i, j, a, villain_codes[t, j]]."""
+    num_villain_ranges = villain_codes.shape[1]
+    return range_pair_payoffs[:, np.arange(num_villain_ranges), :, villain_codes].sum(axis=1)
+
+
+def _expand_rows(per_hero_range, hero_codes):
+    # Matrix rows of the combined hero strategies `hero_codes` from _contract_villain_ranges
+    matrix = np.zeros((hero_codes.shape[0], per_hero_range.shape[0]))
+    for i in range(hero_codes.shape[1]):
+        matrix += per_hero_range[:, i, hero_codes[:, i]].T
+    return matrix
+
+
+def expand(range_pair_payoffs, hero_codes, villain_codes):
+    """
+    Expands per range pair payoffs into the payoff matrix of combined strategies: sums
+    range_pair_payoffs[i, j, hero_codes[s, i], villain_codes[t, j]] over all range pairs
+    (i, j), for every combined hero strategy s and villain strategy t.
+
+    Args:
+        range_pair_payoffs: Probability-weighted payoffs of shape (hero ranges, villain ranges,
+                            hero actions, villain actions), like range_pair_payoffs returns.
+        hero_codes, villain_codes: Per-range action codes of the combined strategies (rows),
+                                   e.g. from combined_strategy_codes or a subset of them.
+
+    Returns:
+        A float64 matrix of shape (len(hero_codes), len(villain_codes)).
+    """
+    # Contract the villain ranges first, then add up the hero ranges' rows
+    return _expand_rows(_contract_villain_ranges(range_pair_payoffs, villain_codes), hero_codes)
+
+
+def apply_utility(amount, utility, stack):
+    """Same as calculateUtility in calculationHelpers.ts, elementwise."""
+    if utility == "logarithmic":
+        return np.log(np.maximum(amount + stack, 0.01))
+    return amount
+
+
+def range_pair_payoffs(pot, amounts, hero_ranges, villain_ranges, equities, max_actions=4):
+    """
+    Probability-weighted payoffs of every (hero range, villain range, hero action, villain action),
+    from which the combined-strategy matrices are assembled (see payoff_matrices_from_amounts
+    for the arguments). With linear utility, a matrix entry is the sum of these over range pairs.
+
+    Returns:
+        A dict with "hero_payoffs" and "villain_payoffs" of shape
+        (n_hero_ranges, n_villain_ranges, n_hero_actions, n_villain_actions),
+        "hero_actions", "villain_actions", "hero_range_probs", "villain_range_probs" and "equities".
+    """
+    hero_range_probs = np.asarray(hero_ranges, dtype=float)
+    hero_range_probs = hero_range_probs / hero_range_probs.sum()
+    villain_range_probs = np.asarray(villain_ranges, dtype=float)
+    villain_range_probs = villain_range_probs / villain_range_probs.sum()
+    equities = np.asarray(equities, dtype=float).reshape(len(hero_range_probs), len(villain_range_probs))
+
+    coefficients = terminal_coefficients(pot, amounts, max_actions)
+    pair_probs = (hero_range_probs[:, None] * villain_range_probs[None, :])[:, :, None, None]
+    pair_equities = equities[:, :, None, None]
+    return {
+        "hero_payoffs": pair_probs * (coefficients["A_hero"] * pair_equities + coefficients["B_hero"]),
+        "villain_payoffs": pair_probs * (coefficients["A_villain"] * pair_equities + coefficients["B_villain"]),
+        "hero_actions": coefficients["hero_actions"],
+        "villain_actions": coefficients["villain_actions"],
+        "hero_range_probs": hero_range_probs,
+        "villain_range_probs": villain_range_probs,
+        "equities": equities,
+    }
+
+
+def payoff_matrices_from_amounts(pot, amounts, hero_ranges, villain_ranges, equities, max_actions=4,
+                                 utility="linear", hero_stack=0.0, villain_stack=0.0):
+    """
+    Builds the payoff matrices from absolute invested amounts (see bet_amounts for the keys).
+
+    Args:
+        pot: Initial pot.
+        amounts: Dict of total amounts invested on the street, keyed like bet_amounts.
+        hero_ranges, villain_ranges: Relative range frequencies (normalized here).
+        equities: Hero equity of each hero range vs each villain range, in [0, 1],
+                  shape (n_hero_ranges, n_villain_ranges).
+        max_actions: 2, 3 or 4.
+        utility: 'linear' or 'logarithmic' (applied to the expected amount, as in the app).
+        hero_stack, villain_stack: Stacks used by the logarithmic utility.
+
+    Returns:
+        A dict with "hero_matrix" and "villain_matrix" of shape
+        (n_hero_actions ** n_hero_ranges, n_villain_actions ** n_villain_ranges),
+        "hero_actions" / "villain_actions" (per-range pure strategy names),
+        "hero_codes" / "villain_codes" (combined strategy action indices),
+        "hero_range_probs", "villain_range_probs" and "equities".
+    """
+    pairs = range_pair_payoffs(pot, amounts, hero_ranges, villain_ranges, equities, max_actions)
+    hero_codes = combined_strategy_codes(len(pairs["hero_range_probs"]), len(pairs["hero_actions"]))
+    villain_codes = combined_strategy_codes(len(pairs["villain_range_probs"]), len(pairs["villain_actions"]))
+
+    return {
+        "hero_matrix": apply_utility(expand(pairs["hero_payoffs"], hero_codes, villain_codes), utility, hero_stack),
+        "villain_matrix": apply_utility(expand(pairs["villain_payoffs"], hero_codes, villain_codes), utility, villain_stack),
+        "hero_actions": pairs["hero_actions"],
+        "villain_actions": pairs["villain_actions"],
+        "hero_codes": hero_codes,
+        "villain_codes": villain_codes,
+        "hero_range_probs": pairs["hero_range_probs"],
+        "villain_range_probs": pairs["villain_range_probs"],
+        "equities": pairs["equities"],
+    }
+
+
+def zero_sum_payoff_matrix(pot, amounts, hero_ranges, villain_ranges, equities, max_actions=4, dtype=np.float32,
+                           path=None, block_bytes=64 << 20):
+    """
+    Builds the game of payoff_matrices_from_amounts (linear utility) as a single zero-sum matrix,
+    Hero's payoff minus half the pot (Villain's payoff is minus that, plus half the pot), block of
+    rows by block of rows.
+
+    With `path`, the matrix is written to a .npy file through np.lib.format.open_memmap and returned
+    as that memmap (open it again later with np.load(path, mmap_mode="r")), so only one block of
+    float64 rows (about `block_bytes`) is ever held in memory. Pass it to solver.solve_game with
+    villain_matrix=None, which reads it in row chunks as well.
+
+    Returns:
+        A dict with "matrix" of shape (n_hero_actions ** n_hero_ranges, n_villain_actions ** n_villain_ranges)
+        and `dtype`, "offset" (pot / 2: hero = matrix + offset, villain = offset - matrix) and the
+        other keys of payoff_matrices_from_amounts except the two matrices.
+    """
+    pairs = range_pair_payoffs(pot, amounts, hero_ranges, villain_ranges, equities, max_actions)
+    hero_codes = combined_strategy_codes(len(pairs["hero_range_probs"]), len(pairs["hero_actions"]))
+    villain_codes = combined_strategy_codes(len(pairs["villain_range_probs"]), len(pairs["villain_actions"]))
+    shape = (len(hero_codes), len(villain_codes))
+    if path is None:
+        matrix = np.empty(shape, dtype=dtype)
+    else:
+        matrix = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+
+    per_hero_range = _contract_villain_ranges(pairs["hero_payoffs"], villain_codes)
+    block_rows = max(1, block_bytes // (8 * shape[1]))
+    offset = pot / 2
+    for start in range(0, shape[0], block_rows):
+        block = _expand_rows(per_hero_range, hero_codes[start:start + block_rows])
+        block -= offset
+        matrix[start:start + block_rows] = block
+    if path is not None:
+        matrix.flush()
+
+    return {
+        "matrix": matrix,
+        "offset": offset,
+        "hero_actions": pairs["hero_actions"],
+        "villain_actions": pairs["villain_actions"],
+        "hero_codes": hero_codes,
+        "villain_codes": villain_codes,
+        "hero_range_probs": pairs["hero_range_probs"],
+        "villain_range_probs": pairs["villain_range_probs"],
+        "equities": pairs["equities"],
+    }
+
+
+def build_payoff_matrices(pot, hero_bet, hero_raise, hero_3bet, villain_bet, villain_raise,
+                          hero_ranges, villain_ranges, equities, max_actions=4,
+                          utility="linear", hero_stack=0.0, villain_stack=0.0):
+    """
+    Builds the payoff matrices from bet/raise sizes given as fractions of the current
+    pot, like calculateMatrix in matrixCalculator.ts. See payoff_matrices_from_amounts
+    for the remaining arguments and the returned dict, which additionally holds "amounts".
+    """
+    amounts = bet_amounts(pot, hero_bet, hero_raise, hero_3bet, villain_bet, villain_raise)
+    result = payoff_matrices_from_amounts(
+        pot, amounts, hero_ranges, villain_ranges, equities, max_actions,
+        utility=utility, hero_stack=hero_stack, villain_stack=villain_stack,
+    )
+    result["amounts"] = amounts
+    return result
+
+
+def batched_payoff_matrices(pot, hero_bet, hero_raise, hero_3bet, villain_bet, villain_raise, equity, max_actions=4):
+    """
+    Payoff matrices of many single-range spots at once (one hero range against one villain
+    range, like initial_game.py). All arguments except max_actions are arrays of shape (n_spots,)
+    (or scalars), sizes as fractions of the pot as in bet_amounts.
+
+    Returns:
+        A dict with "hero_matrix" and "villain_matrix" of shape
+        (n_spots, n_hero_actions, n_villain_actions), "hero_actions" and "villain_actions".
+    """
+    structure = terminal_structure(max_actions)
+    arrays = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in
+                                   (pot, hero_bet, hero_raise, hero_3bet, villain_bet, villain_raise, equity)))
+    pot, hero_bet, hero_raise, hero_3bet, villain_bet, villain_raise, equity = (np.atleast_1d(x)[:, None, None] for x in arrays)
+    amounts = bet_amounts(pot, hero_bet, hero_raise, hero_3bet, villain_bet, villain_raise)
+    invested = np.zeros(np.broadcast_shapes(pot.shape, structure["kinds"].shape))
+    for key, amount in amounts.items():
+        invested = np.where(structure["amounts"] == key, amount, invested)
+    A_hero, B_hero, A_villain, B_villain = _affine_payoffs(pot, invested, structure["kinds"])
+    return {
+        "hero_matrix": A_hero * equity + B_hero,
+        "villain_matrix": A_villain * equity + B_villain,
+        "hero_actions": structure["hero_actions"],
+        "villain_actions": structure["villain_actions"],
+    }
+
+
+if __name__ == "__main__":
+    import time
+
+    # Defaults of the React app (src/hooks/useHomeForm.ts)
+    game = build_payoff_matrices(
+        pot=4, hero_bet=0.25, hero_raise=1.0, hero_3bet=1.0, villain_bet=1.0, villain_raise=1.0,
+        hero_ranges=[1, 4], villain_ranges=[1], equities=[[1.0], [0.0]], max_actions=4,
+        utility="logarithmic", hero_stack=100, villain_stack=100,
+    )
+    print(f"Hero actions:    {game['hero_actions']}")
+    print(f"Villain actions: {game['villain_actions']}")
+    print(strategy_labels(game["hero_codes"], game["hero_actions"], "H")[:3])
+    print(game["hero_matrix"].round(3))
+
+    # Larger configurations
+    for num_ranges in (2, 3, 4):
+        rng = np.random.default_rng(0)
+        start = time.perf_counter()
+        game = build_payoff_matrices(
+            pot=10, hero_bet=0.5, hero_raise=0.5, hero_3bet=0.5, villain_bet=0.5, villain_raise=0.5,
+            hero_ranges=np.ones(num_ranges), villain_ranges=np.ones(num_ranges),
+            equities=rng.random((num_ranges, num_ranges)), max_actions=4,
+        )
+        elapsed = time.perf_counter() - start
+        print(f"{num_ranges} ranges: matrix shape {game['hero_matrix'].shape} built in {elapsed * 1000:.1f} ms")
+
+    # Out of core: one float32 zero-sum matrix in a memmap, built and solved in blocks
+    import os
+    import tempfile
+    import tracemalloc
+
+    from solver import solve_game
+
+    num_ranges, max_actions = 5, 3
+    amounts = bet_amounts(10, 0.5, 0.5, 0.5, 0.5, 0.5)
+    equities = np.random.default_rng(0).random((num_ranges, num_ranges))
+    with tempfile.TemporaryDirectory() as directory:
+        tracemalloc.start()
+        start = time.perf_counter()
+        game = zero_sum_payoff_matrix(10, amounts, np.ones(num_ranges), np.ones(num_ranges), equities, max_actions,
+                                      path=os.path.join(directory, "matrix.npy"), block_bytes=16 << 20)
+        built = time.perf_counter()
+        result = solve_game(game["matrix"], None, iterations=200, method="rm+", check_every=50)
+        solved = time.perf_counter()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        matrix = game["matrix"]
+        print(f"{num_ranges} ranges, max actions {max_actions}: {matrix.shape} {matrix.dtype} memmap of "
+              f"{matrix.nbytes / 2 ** 20:.0f} MiB (two float64 matrices: {4 * matrix.nbytes / 2 ** 20:.0f} MiB) built in "
+              f"{built - start:.2f} s, 200 rm+ iterations in {solved - built:.2f} s, peak traced memory "
+              f"{peak / 2 ** 20:.0f} MiB, value {result['hero_utility'] + game['offset']:.3f}")
+        del matrix, game
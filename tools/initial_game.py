@@ -2,30 +2,9 @@ import numpy as np
 import pandas as pd
 import nashpy as nash
 
-
-index = [
-    'check-fold',
-    'check-call',
-    'check-raise',
-    'bet-fold',
-    'bet-call',
-    'bet-3bet'
-]
-
-columns = [
-    'check/fold',
-    'check/call',
-    'check/raise-fold',
-    'check/raise-call',
-    'bet-fold/fold',
-    'bet-fold/call',
-    'bet-fold/raise-fold',
-    'bet-fold/raise-call',
-    'bet-call/fold',
-    'bet-call/call',
-    'bet-call/raise-fold',
-    'bet-call/raise-call'
-]
+from game_matrix import payoff_matrices_from_amounts
+from solver import solve_game
+from dominance import eliminate_dominated
 
 
 pot = 500
@@ -37,32 +16,24 @@ hero_3bet = pot
 villain_bet = pot
 villain_raise = pot/2
 
-pwin_initial = 0.5
-pwin_after_villain_bet = 0.5
-pwin_after_villain_raise = 0.5
-
-
-df = pd.DataFrame(index=index, columns=columns)
-df.loc[['check-fold', 'check-call', 'check-raise'], ['check/fold', 'check/call', 'check/raise-fold', 'check/raise-call']] = pwin_initial * pot
+pwin = 0.5
 
-df.loc[['check-fold'], ['bet-fold/fold', 'bet-fold/call', 'bet-fold/raise-fold', 'bet-fold/raise-call']] = 0
-df.loc[['check-call'], ['bet-fold/fold', 'bet-fold/call', 'bet-fold/raise-fold', 'bet-fold/raise-call']] = pwin_after_villain_bet * (pot + villain_bet) - (1 - pwin_after_villain_bet) * villain_bet
-df.loc[['check-raise'], ['bet-fold/fold', 'bet-fold/call', 'bet-fold/raise-fold', 'bet-fold/raise-call']] = pot + villain_bet
 
-df.loc[['check-fold'], ['bet-call/fold', 'bet-call/call', 'bet-call/raise-fold', 'bet-call/raise-call']] = 0
-df.loc[['check-call'], ['bet-call/fold', 'bet-call/call', 'bet-call/raise-fold', 'bet-call/raise-call']] = pwin_after_villain_bet * (pot + villain_bet) - (1 - pwin_after_villain_bet) * villain_bet
-df.loc[['check-raise'], ['bet-call/fold', 'bet-call/call', 'bet-call/raise-fold', 'bet-call/raise-call']] = pwin_after_villain_bet * (pot + villain_bet + hero_raise) - (1 - pwin_after_villain_bet) * (villain_bet + hero_raise)
+# total amount each player has invested when the hand ends at the corresponding node
+amounts = {
+    "hero_bet": hero_bet,
+    "villain_bet": villain_bet,
+    "hero_raise": villain_bet + hero_raise,
+    "villain_raise": hero_bet + villain_raise,
+    "hero_3bet": hero_bet + villain_raise + hero_3bet,
+}
 
-df.loc[['bet-fold', 'bet-call', 'bet-3bet'], ['check/fold', 'bet-fold/fold', 'bet-call/fold']] = pot
-df.loc[['bet-fold', 'bet-call', 'bet-3bet'], ['check/call', 'bet-fold/call', 'bet-call/call']] = pwin_initial * (pot + hero_bet) - (1 - pwin_initial) * hero_bet
+# a single hero range against a single villain range
+game = payoff_matrices_from_amounts(pot, amounts, [1], [1], [[pwin]], max_actions=4)
+index = game['hero_actions']
+columns = game['villain_actions']
 
-df.loc[['bet-fold'], ['check/raise-fold', 'bet-fold/raise-fold', 'bet-call/raise-fold']] = -hero_bet
-df.loc[['bet-call'], ['check/raise-fold', 'bet-fold/raise-fold', 'bet-call/raise-fold']] = pwin_after_villain_raise * (pot + hero_bet + villain_raise) - (1 - pwin_after_villain_raise) * (hero_bet + villain_raise)
-df.loc[['bet-3bet'], ['check/raise-fold', 'bet-fold/raise-fold', 'bet-call/raise-fold']] = pot + hero_bet + villain_raise
-
-df.loc[['bet-fold'], ['check/raise-call', 'bet-fold/raise-call', 'bet-call/raise-call']] = -hero_bet
-df.loc[['bet-call'], ['check/raise-call', 'bet-fold/raise-call', 'bet-call/raise-call']] = pwin_after_villain_raise * (pot + hero_bet + villain_raise) - (1 - pwin_after_villain_raise) * (hero_bet + villain_raise)
-df.loc[['bet-3bet'], ['check/raise-call', 'bet-fold/raise-call', 'bet-call/raise-call']] = pwin_after_villain_raise * (pot + hero_bet + villain_raise + hero_3bet) - (1 - pwin_after_villain_raise) * (hero_bet + villain_raise + hero_3bet)
+df = pd.DataFrame(game['hero_matrix'], index=index, columns=columns)
 
 # subtracting half the pot makes it zero-sum, so zero-sum tools can be used
 df = df - pot / 2
@@ -75,4 +46,21 @@ s1, s2 = game.linear_program()
 display(pd.DataFrame(s1, index=index))
 display(pd.DataFrame(s2, index=columns))
 
-game[s1, s2]  # utilities
\ No newline at end of file
+game[s1, s2]  # utilities
+
+
+# many strategies are dominated (e.g. check-fold and check-call both get the check/check payoff)
+reduced = eliminate_dominated(df.to_numpy(), -df.to_numpy(), weak=True)
+display(df.iloc[reduced["row_index"], reduced["col_index"]])
+reduced["report"]
+
+
+# same equilibrium with the iterative solver, which also scales to large matrices; the game is
+# zero-sum, so it only needs the one matrix (see game_matrix.zero_sum_payoff_matrix for games
+# too large for RAM)
+result = solve_game(df.to_numpy(), None, method="rm+")
+
+display(pd.DataFrame(result["row_strategy"], index=index))
+display(pd.DataFrame(result["col_strategy"], index=columns))
+
+result["hero_utility"], result["converged_at_iteration"]
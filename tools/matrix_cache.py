@@ -0,0 +1,354 @@
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import time
+import zlib
+from contextlib import contextmanager
+
+import numpy as np
+
+from game_matrix import bet_amounts, payoff_matrices_from_amounts, terminal_structure
+from profiling import count, stage
+from solver import solve_game
+
+# Content-addressed disk cache of payoff matrices and solved equilibria, shared by runs and processes.
+#
+#   cache = MatrixCache("matrix_cache", max_bytes=4 << 30)
+#   game = cache.payoff_matrices_from_amounts(pot, amounts, hero_ranges, villain_ranges, equities)
+#   result = cache.solve_game(game["hero_matrix"], game["villain_matrix"], method="rm+")
+#   cache.cache_info()      # hits, misses, writes, evictions, bytes, seconds spent computing misses
+#
+# Keys are the SHA-256 of the normalized inputs: range frequencies are normalized, floats rounded to
+# 12 significant digits, only the invested amounts the betting tree of max_actions uses are included,
+# and the stacks only for the logarithmic utility. So [1, 1] and [2, 2] ranges share an entry. Solves
+# are keyed on the matrix contents (whatever built them), the solver options and the warm start.
+#
+# Every entry is one .npz file (arrays, plus the non-array fields as JSON), written to a temporary
+# file and renamed into place, so readers never see a partial entry and need no lock. Writers that
+# miss the same key take the same lock (one of LOCK_STRIPES fcntl lock files), so concurrent processes
+# compute an entry once. Cache hits bump the file's mtime; when the directory grows beyond max_bytes,
+# the least recently used entries are deleted down to 3/4 of it under the directory lock. A reader
+# that loses an entry to eviction just counts a miss.
+#
+# `python matrix_cache.py info matrix_cache` prints the size of a cache, `... clear matrix_cache`
+# empties it. Bump FORMAT_VERSION when the matrices or the solver change meaning.
+
+FORMAT_VERSION = 1
+LOCK_STRIPES = 64
+_META = "__meta__"
+
+
+def _normalize(value):
+    """JSON-serializable canonical form of a key component (floats rounded to 12 significant digits)."""
+    if isinstance(value, dict):
+        return {str(key): _normalize(value[key]) for key in sorted(value)}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind in "fc" or value.size > 256:
+            # Large arrays are addressed by their contents rather than spelled out
+            array = np.ascontiguousarray(value, dtype=np.float64 if value.dtype.kind in "biuf" else value.dtype)
+            return {"shape": list(array.shape), "sha256": hashlib.sha256(array.tobytes()).hexdigest()}
+        return _normalize(value.tolist())
+    if isinstance(value, (bool, np.bool_)) or value is None or isinstance(value, str):
+        return bool(value) if isinstance(value, np.bool_) else value
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        return float(f"{float(value):.12g}") + 0.0  # + 0.0 turns -0.0 into 0.0
+    raise TypeError(f"Cannot build a cache key from {type(value).__name__}")
+
+
+def cache_key(kind, **inputs):
+    """Content address of an entry: hex SHA-256 of the normalized inputs of `kind`."""
+    description = json.dumps({"kind": kind, "version": FORMAT_VERSION, "inputs": _normalize(inputs)}, sort_keys=True)
+    return hashlib.sha256(description.encode()).hexdigest()
+
+
+def game_key(pot, amounts, hero_ranges, villain_ranges, equities, max_actions=4, utility="linear",
+             hero_stack=0.0, villain_stack=0.0):
+    """Cache key of payoff_matrices_from_amounts with these arguments."""
+    hero_ranges = np.asarray(hero_ranges, dtype=float)
+    villain_ranges = np.asarray(villain_ranges, dtype=float)
+    equities = np.asarray(equities, dtype=float).reshape(len(hero_ranges), len(villain_ranges))
+    used = {key for key in terminal_structure(max_actions)["amounts"].ravel() if key is not None}
+    return cache_key(
+        "payoff_matrices",
+        pot=pot,
+        amounts={key: float(amounts[key]) for key in used},
+        hero_ranges=(hero_ranges / hero_ranges.sum()).tolist(),
+        villain_ranges=(villain_ranges / villain_ranges.sum()).tolist(),
+        equities=equities.tolist(),
+        max_actions=max_actions,
+        utility=utility,
+        stacks=[hero_stack, villain_stack] if utility == "logarithmic" else None,
+    )
+
+
+def _pack(result, prefix=""):
+    # Splits a result dict into NumPy arrays (npz members) and the JSON-serializable rest
+    arrays, meta = {}, {}
+    for name, value in result.items():
+        if isinstance(value, dict):
+            nested_arrays, nested_meta = _pack(value, f"{prefix}{name}/")
+            arrays.update(nested_arrays)
+            meta[name] = {"dict": nested_meta}
+        elif isinstance(value, np.ndarray) and value.dtype != object:
+            arrays[prefix + name] = value
+            meta[name] = {"array": prefix + name}
+        else:
+            meta[name] = {"value": value.tolist() if isinstance(value, np.ndarray) else value}
+    return arrays, meta
+
+
+def _unpack(arrays, meta):
+    result = {}
+    for name, field in meta.items():
+        if "dict" in field:
+            result[name] = _unpack(arrays, field["dict"])
+        elif "array" in field:
+            result[name] = arrays[field["array"]]
+        else:
+            result[name] = field["value"]
+    return result
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class MatrixCache:
+    """
+    Disk cache of payoff matrices and solve_game results in `directory` (see the module comment).
+
+    Args:
+        directory: Cache directory, created if needed; any number of processes may share it.
+        max_bytes: Size beyond which the least recently used entries are evicted.
+        compress: Store entries with np.savez_compressed (smaller, slower to read and write).
+    """
+
+    def __init__(self, directory, max_bytes=1 << 30, compress=False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.compute_seconds = 0.0
+        os.makedirs(os.path.join(directory, "locks"), exist_ok=True)
+
+    # Files and locks
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".npz")
+
+    @contextmanager
+    def _lock(self, name):
+        with open(os.path.join(self.directory, "locks", name), "a") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+    def _key_lock(self, key):
+        return self._lock(f"{zlib.crc32(key.encode()) % LOCK_STRIPES:02d}.lock")
+
+    def _entries(self):
+        # (path, size, mtime) of every entry
+        entries = []
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir() or shard.name == "locks":
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".npz"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:  # evicted meanwhile
+                        continue
+                    entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    # Entries
+
+    def get(self, key):
+        """The cached result dict of `key`, or None."""
+        path = self._path(key)
+        try:
+            with stage("matrix_cache.read"), np.load(path, allow_pickle=False) as data:
+                arrays = {name: data[name] for name in data.files}
+            os.utime(path)  # most recently used
+        except FileNotFoundError:
+            self.misses += 1
+            count("matrix_cache.misses")
+            return None
+        self.hits += 1
+        self.bytes_read += sum(array.nbytes for array in arrays.values())
+        count("matrix_cache.hits")
+        return _unpack(arrays, json.loads(str(arrays.pop(_META))))
+
+    def put(self, key, result):
+        """Stores a result dict of arrays, scalars, lists and nested dicts atomically."""
+        arrays, meta = _pack(result)
+        arrays[_META] = np.array(json.dumps(meta, default=_json_default))
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with stage("matrix_cache.write"), os.fdopen(descriptor, "wb") as file:
+                (np.savez_compressed if self.compress else np.savez)(file, **arrays)
+            os.replace(temporary, path)
+        except BaseException:
+            os.remove(temporary)
+            raise
+        self.writes += 1
+        self.bytes_written += os.path.getsize(path)
+        if self.max_bytes is not None:
+            self._evict()
+
+    def get_or_compute(self, key, compute):
+        """Cached result of `key`, or compute() stored under it; a key is computed by one process at a time."""
+        result = self.get(key)
+        if result is not None:
+            return result
+        with self._key_lock(key):
+            # Another process may have stored it while we waited for the lock
+            if os.path.exists(self._path(key)):
+                self.misses -= 1
+                result = self.get(key)
+                if result is not None:
+                    return result
+                self.misses += 1
+            start = time.perf_counter()
+            with stage("matrix_cache.compute"):
+                result = compute()
+            self.compute_seconds += time.perf_counter() - start
+            self.put(key, result)
+        return result
+
+    def _evict(self):
+        entries = self._entries()
+        if sum(size for _, size, _ in entries) <= self.max_bytes:
+            return
+        with self._lock("directory.lock"):
+            entries = sorted(self._entries(), key=lambda entry: entry[2], reverse=True)
+            total = 0
+            for path, size, _ in entries:
+                total += size
+                if total > self.max_bytes * 3 // 4:
+                    try:
+                        os.remove(path)
+                        self.evictions += 1
+                        count("matrix_cache.evictions")
+                    except FileNotFoundError:
+                        pass
+
+    # Cached computations
+
+    def payoff_matrices_from_amounts(self, pot, amounts, hero_ranges, villain_ranges, equities, max_actions=4,
+                                     utility="linear", hero_stack=0.0, villain_stack=0.0):
+        """Cached game_matrix.payoff_matrices_from_amounts (same arguments and returned dict)."""
+        key = game_key(pot, amounts, hero_ranges, villain_ranges, equities, max_actions, utility, hero_stack, villain_stack)
+        return self.get_or_compute(key, lambda: payoff_matrices_from_amounts(
+            pot, amounts, hero_ranges, villain_ranges, equities, max_actions, utility, hero_stack, villain_stack))
+
+    def build_payoff_matrices(self, pot, hero_bet, hero_raise, hero_3bet, villain_bet, villain_raise,
+                              hero_ranges, villain_ranges, equities, max_actions=4, utility="linear",
+                              hero_stack=0.0, villain_stack=0.0):
+        """Cached game_matrix.build_payoff_matrices (same arguments and returned dict)."""
+        amounts = bet_amounts(pot, hero_bet, hero_raise, hero_3bet, villain_bet, villain_raise)
+        result = self.payoff_matrices_from_amounts(pot, amounts, hero_ranges, villain_ranges, equities, max_actions,
+                                                   utility, hero_stack, villain_stack)
+        result["amounts"] = amounts
+        return result
+
+    def solve_game(self, hero_matrix, villain_matrix, **solver_options):
+        """Cached solver.solve_game, keyed on the matrix contents and the solver options."""
+        hero_matrix = np.asarray(hero_matrix, dtype=float)
+        villain_matrix = np.asarray(villain_matrix, dtype=float)
+        with stage("matrix_cache.key"):
+            key = cache_key("solve_game", hero_matrix=hero_matrix, villain_matrix=villain_matrix, options=solver_options)
+        return self.get_or_compute(key, lambda: solve_game(hero_matrix, villain_matrix, **solver_options))
+
+    # Maintenance
+
+    def clear(self):
+        """Deletes every entry."""
+        with self._lock("directory.lock"):
+            for path, _, _ in self._entries():
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def cache_info(self):
+        entries = self._entries()
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else None,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "compute_seconds": self.compute_seconds,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or clear an on-disk payoff matrix / equilibrium cache.")
+    parser.add_argument("command", choices=["info", "clear"])
+    parser.add_argument("directory")
+    args = parser.parse_args(argv)
+
+    cache = MatrixCache(args.directory, max_bytes=None)
+    if args.command == "clear":
+        cache.clear()
+    print(json.dumps(cache.cache_info(), indent=2))
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1:
+        main()
+        sys.exit()
+
+    from multiprocessing import Pool
+
+    def nightly_run(directory):
+        """A sweep over bet sizes with 3 ranges per player, solved with rm+."""
+        cache = MatrixCache(directory, max_bytes=256 << 20)
+        equities = np.random.default_rng(0).uniform(0.2, 0.8, (3, 3))
+        start = time.perf_counter()
+        for hero_bet in (0.33, 0.5, 0.75, 1.0):
+            for villain_bet in (0.5, 1.0):
+                game = cache.build_payoff_matrices(100, hero_bet, 0.5, 1.0, villain_bet, 0.5, [1, 1, 1], [1, 1, 1],
+                                                   equities, max_actions=3)
+                cache.solve_game(game["hero_matrix"], game["villain_matrix"], iterations=20000,
+                                 convergence_threshold=0.1, method="rm+", check_every=10)
+        return time.perf_counter() - start, cache.cache_info()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for run in ("first", "second"):
+            seconds, info = nightly_run(directory)
+            print(f"{run} run: {seconds:.2f} s, {info['hits']} hits, {info['misses']} misses, "
+                  f"{info['entries']} entries, {info['bytes'] / 2 ** 20:.1f} MiB")
+
+        # Concurrent workers on a fresh cache compute every entry once between them
+        with tempfile.TemporaryDirectory() as shared, Pool(4) as pool:
+            infos = [info for _, info in pool.map(nightly_run, [shared] * 4)]
+        print(f"4 concurrent runs: {sum(i['hits'] for i in infos)} hits, {sum(i['writes'] for i in infos)} writes, "
+              f"{infos[0]['entries']} entries")
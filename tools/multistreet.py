@@ -0,0 +1,318 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from bayes import posterior
+from profiling import count, stage
+
+# Full-hand EV: street.f's betting logic chained across streets (e.g. flop -> turn -> river).
+#
+# Every street is played like street.f: Hero bets (or checks), Villain folds / calls / raises, Hero
+# folds / calls / reraises and Villain calls or folds to the reraise. Where street.f ends a called
+# line with pot_model(pot, posterior), here it continues on the next street with the bigger pot,
+# the smaller stacks and Villain's posterior as the new prior; only the river (or an all-in) goes
+# to showdown. Hero picks the best bet size on every street, so the value of a line is the EV of
+# Hero's best continuation given the range Villain showed so far.
+#
+# Before a street, a card can be dealt: streets[k]["cards"] lists (label, probability) outcomes like
+# [("favors hero", 0.2), ("blank", 0.8)], which replace street.py's hand-tuned "board favors hero"
+# probability. The board (the tuple of labels dealt so far) is passed to the likelihoods and picks
+# the showdown pot model, so equities and Villain's play can depend on the run-out.
+#
+# Subgames repeat: different lines reach the same street with the same pot, stacks and posterior
+# (e.g. bet-call and check-bet-call of the same total, or likelihoods that ignore the bet size). A
+# transposition table memoizes every node on (street, board, pot, stacks, range) with pot and stacks
+# rounded to `pot_decimals` and the range to `decimals`, in LRU order within `max_bytes`.
+
+ACTIONS = np.array(["f", "c", "r"])
+ENTRY_OVERHEAD = 512  # approximate bytes of a table entry besides its key and per-bet dicts
+BET_BYTES = 1024
+
+
+class TranspositionTable:
+    """
+    LRU memo of multi-street nodes keyed on (street, board, pot, stacks, quantized range),
+    holding at most about `max_bytes` (0 disables it).
+    """
+
+    def __init__(self, max_bytes=64 << 20, decimals=6, pot_decimals=2):
+        self.max_bytes = max_bytes
+        self.decimals = decimals
+        self.pot_decimals = pot_decimals
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.nbytes = 0
+        self._entries = OrderedDict()
+
+    def key(self, street, board, pot, hero_stack, villain_stack, distribution):
+        numbers = np.round([pot, hero_stack, villain_stack], self.pot_decimals) + 0.0
+        distribution = np.round(distribution, self.decimals) + 0.0  # + 0.0 turns -0.0 into 0.0
+        return (street, board, numbers.tobytes(), distribution.tobytes())
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            count("multistreet_table.misses")
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        count("multistreet_table.hits")
+        return entry[0]
+
+    def put(self, key, node):
+        if not self.max_bytes:
+            return
+        nbytes = ENTRY_OVERHEAD + len(key[2]) + len(key[3]) + BET_BYTES * len(node["bets"])
+        self._entries[key] = (node, nbytes)
+        self.nbytes += nbytes
+        while self.nbytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.nbytes -= evicted
+            self.evictions += 1
+
+    def cache_info(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "currsize": len(self._entries),
+            "nbytes": self.nbytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    def cache_clear(self):
+        self._entries.clear()
+        self.nbytes = 0
+        self.hits = self.misses = self.evictions = 0
+
+
+class MultiStreetGame:
+    """
+    Recursive EV of Hero's best play over several streets (see the module comment).
+
+    Args:
+        streets: One dict per street with
+            "name": label of the street (e.g. "flop"),
+            "hero_bets": Hero's bet sizes as fractions of the pot, 0 being a check,
+            "villain_raise": Villain's raise over Hero's bet (or bet after a check), as a fraction
+                             of the pot after Hero's bet is called,
+            "hero_reraise": Hero's reraise on top of calling, as a fraction of the pot after the
+                            raise is called,
+            "likelihoods": Villain's (fold, call, raise, reraise_call) likelihood vectors per hand
+                           type for every bet of hero_bets, as in street.f (after a check, "fold"
+                           is 0 and "call" is checking back), either as a list indexed like
+                           hero_bets or as a callable likelihoods(board, bet_index),
+            "cards": Optional (label, probability) outcomes of the card dealt before the street.
+        pot_model: pot_model(pot, distribution) at showdown as in street.f, or a dict mapping every
+                   full board (tuple of card labels) to one.
+        hero_stack, villain_stack: Chips behind; bets and raises are capped at the smaller one.
+        table: TranspositionTable to use, e.g. shared by several games with the same streets;
+               by default a new one holding `max_bytes`.
+    """
+
+    def __init__(self, streets, pot_model, hero_stack=np.inf, villain_stack=np.inf, table=None, max_bytes=64 << 20):
+        self.streets = [dict(street) for street in streets]
+        for k, street in enumerate(self.streets):
+            street.setdefault("name", f"street {k}")
+            street.setdefault("cards", [(None, 1.0)])
+        self.pot_model = pot_model
+        self.hero_stack = hero_stack
+        self.villain_stack = villain_stack
+        self.table = TranspositionTable(max_bytes) if table is None else table
+        self.nodes_evaluated = 0
+
+    # Leaves and chance
+
+    def _showdown(self, board, pot, distribution):
+        pot_model = self.pot_model[board] if isinstance(self.pot_model, dict) else self.pot_model
+        return float(pot_model(pot, distribution))
+
+    def _deal(self, street, board):
+        # (board after the card dealt before `street`, probability) outcomes
+        for card, probability in self.streets[street]["cards"]:
+            yield (board if card is None else board + (card,)), probability
+
+    def _continuation(self, street, board, pot, hero_stack, villain_stack, distribution):
+        """Value of a called line of `street`: the next street's node, or showdown after the river / an all-in."""
+        if street + 1 == len(self.streets):
+            return self._showdown(board, pot, distribution)
+        all_in = min(hero_stack, villain_stack) <= 0
+        value = 0.0
+        for next_board, probability in self._deal(street + 1, board):
+            if all_in:  # the remaining cards are dealt without betting
+                value += probability * self._continuation(street + 1, next_board, pot, 0, 0, distribution)
+            else:
+                value += probability * self.node(street + 1, next_board, pot, hero_stack, villain_stack, distribution)["ev"]
+        return value
+
+    # Decision nodes
+
+    def _likelihoods(self, street, board, bet_index):
+        likelihoods = self.streets[street]["likelihoods"]
+        likelihoods = likelihoods(board, bet_index) if callable(likelihoods) else likelihoods[bet_index]
+        return [np.asarray(likelihood, dtype=float) for likelihood in likelihoods]
+
+    def _bet(self, street, board, pot, hero_stack, villain_stack, distribution, bet_index):
+        spec = self.streets[street]
+        effective = min(hero_stack, villain_stack)
+        bet = min(spec["hero_bets"][bet_index] * pot, effective)
+        likelihood_fold, likelihood_call, likelihood_raise, likelihood_reraise_call = \
+            self._likelihoods(street, board, bet_index)
+        raise_size = min(spec["villain_raise"] * (pot + 2 * bet), effective - bet)
+        if raise_size <= 0:  # Hero is all-in, so Villain can only call
+            likelihood_call, likelihood_raise = likelihood_call + likelihood_raise, np.zeros_like(likelihood_raise)
+        reraise_size = min(spec["hero_reraise"] * (pot + 2 * bet + 2 * raise_size), effective - bet - raise_size)
+
+        (_, posterior_call, posterior_raise), (prob_fold, prob_call, prob_raise) = \
+            posterior(distribution, np.stack([likelihood_fold, likelihood_call, likelihood_raise]))
+        posterior_reraise_call, prob_reraise_call = posterior(posterior_raise, likelihood_reraise_call)
+
+        def called(added, range_):
+            # Value of the next street after both players put in `added` more
+            return self._continuation(street, board, pot + 2 * added, hero_stack - added, villain_stack - added, range_)
+
+        ev_call = called(bet, posterior_call) if prob_call > 0 else 0.0
+        # Hero's response to the raise: fold, call or reraise (only if chips are left)
+        step2 = np.array([0.0, -np.inf, -np.inf])
+        if prob_raise > 0:
+            step2[1] = called(bet + raise_size, posterior_raise) - raise_size
+            if reraise_size > 0:
+                showdown = called(bet + raise_size + reraise_size, posterior_reraise_call) if prob_reraise_call > 0 else 0.0
+                step2[2] = (1 - prob_reraise_call) * (pot + 2 * bet + raise_size) + prob_reraise_call * showdown \
+                    - (raise_size + reraise_size)
+        response = int(np.argmax(step2))
+        ev = prob_fold * pot + prob_call * ev_call + prob_raise * step2[response] - bet
+        return {
+            "bet": bet,
+            "ev": float(ev),
+            "prob_villain_folds": float(prob_fold),
+            "prob_villain_calls": float(prob_call),
+            "prob_villain_raises": float(prob_raise),
+            "raise": raise_size,
+            "reraise": reraise_size,
+            "ev_if_villain_calls": ev_call,
+            "ev_call_raise": float(step2[1]),
+            "ev_reraise": float(step2[2]),
+            "response_to_raise": str(ACTIONS[response]),
+        }
+
+    def node(self, street, board, pot, hero_stack, villain_stack, distribution):
+        """
+        Hero's decision at the start of `street` (an index into streets).
+
+        Returns:
+            A dict with "street", "board", "pot", "ev" (of the best bet, net of Hero's investment
+            from here on, counting the pot), "best_bet" (index into hero_bets) and "bets", one dict
+            per bet size with Villain's response probabilities, the raise / reraise amounts, the
+            EVs of every branch and Hero's "response_to_raise" ('f', 'c' or 'r').
+        """
+        distribution = np.asarray(distribution, dtype=float)
+        key = self.table.key(street, board, pot, hero_stack, villain_stack, distribution)
+        node = self.table.get(key)
+        if node is not None:
+            return node
+        self.nodes_evaluated += 1
+        bets = [self._bet(street, board, pot, hero_stack, villain_stack, distribution, k)
+                for k in range(len(self.streets[street]["hero_bets"]))]
+        best = int(np.argmax([bet["ev"] for bet in bets]))
+        node = {
+            "street": self.streets[street]["name"],
+            "board": board,
+            "pot": pot,
+            "ev": bets[best]["ev"],
+            "best_bet": best,
+            "bets": bets,
+        }
+        self.table.put(key, node)
+        return node
+
+    def evaluate(self, pot, priors, board=()):
+        """Root node of the first street for Villain's `priors` (see node())."""
+        with stage("multistreet.evaluate"):
+            return self.node(0, tuple(board), float(pot), self.hero_stack, self.villain_stack, priors)
+
+    def best_line(self, pot, priors, board=()):
+        """
+        Hero's best bet on every street along the line where Villain calls (or checks back) and
+        the first card outcome of every street is dealt, as a list of (street name, bet, ev).
+        """
+        street, pot, distribution = 0, float(pot), np.asarray(priors, dtype=float)
+        hero_stack, villain_stack, board = self.hero_stack, self.villain_stack, tuple(board)
+        line = []
+        while True:
+            node = self.node(street, board, pot, hero_stack, villain_stack, distribution)
+            bet = node["bets"][node["best_bet"]]
+            line.append((node["street"], bet["bet"], node["ev"]))
+            if street + 1 == len(self.streets) or bet["prob_villain_calls"] == 0:
+                return line
+            likelihoods = self._likelihoods(street, board, node["best_bet"])
+            distribution, _ = posterior(distribution, likelihoods[1])
+            pot, hero_stack, villain_stack = pot + 2 * bet["bet"], hero_stack - bet["bet"], villain_stack - bet["bet"]
+            if min(hero_stack, villain_stack) <= 0:
+                return line
+            street += 1
+            board = next(self._deal(street, board))[0]
+
+    def cache_info(self):
+        return {"nodes_evaluated": self.nodes_evaluated, **self.table.cache_info()}
+
+
+if __name__ == "__main__":
+    import time
+
+    from street import f
+
+    # street.py's demo spot, but every street is played out instead of pot_model_func's flat
+    # "board favors hero with probability 0.2": the turn and the river each favor Hero with that probability.
+    priors = np.array([0.03, 0.2, 0.5, 0.17])
+    equities = {"favors hero": np.array([0.7, 0.8, 0.9, 1.0]), "blank": np.array([0.2, 0.3, 0.4, 0.5])}
+    cards = [("favors hero", 0.2), ("blank", 0.8)]
+
+    def likelihoods(board, bet_index):
+        # Villain calls more and raises less once the board favors Hero
+        scared = board.count("favors hero")
+        if bet_index == 0:  # Hero checks: Villain checks back or bets
+            check_back = np.clip(np.array([0.1, 0.2, 0.5, 0.8]) + 0.2 * scared, 0, 1)
+            return np.zeros(4), check_back, 1 - check_back, np.array([1.0, 0.5, 0.1, 0.0])
+        fold = np.array([0.1, 0.2, 0.0, 0.0]) * bet_index
+        raise_ = np.array([0.2, 0.1, 0.2, 0.0]) / (1 + scared)
+        return fold, 1 - fold - raise_, raise_, np.array([0.8, 0.3, 0.05, 0.0])
+
+    street_spec = {"hero_bets": [0, 0.5, 1.0], "villain_raise": 1.0, "hero_reraise": 1.0, "likelihoods": likelihoods}
+    streets = [{"name": "flop", **street_spec}, {"name": "turn", "cards": cards, **street_spec},
+               {"name": "river", "cards": cards, **street_spec}]
+
+    def board_pot_model(board):
+        share = np.mean([equities[card] for card in board], axis=0)
+        return lambda pot, distribution: pot * (np.asarray(distribution) @ share)
+
+    pot_models = {(a, b): board_pot_model((a, b)) for a, _ in cards for b, _ in cards}
+
+    # A single street with a flat pot model is street.f
+    single = MultiStreetGame([streets[2]], lambda pot, d: pot * (d @ (0.2 * equities["favors hero"] + 0.8 * equities["blank"])))
+    # 1/2 pot bet, pot-sized raise (600 into 600) and pot-sized reraise (1800 into 1800)
+    reference = f(single.pot_model, 300, 150, 600, 1800, priors, *likelihoods((), 1))
+    node = single.evaluate(300, priors)
+    print(f"single street: EV of the 1/2 pot bet {node['bets'][1]['ev']:.6f}, "
+          f"street.f {reference['step1_hero_initial_action']['overall_ev_hero_action']:.6f}")
+
+    for name, max_bytes in (("no table", 0), ("transposition table", 64 << 20)):
+        for stack in (1500, np.inf):
+            game = MultiStreetGame(streets, pot_models, hero_stack=stack, villain_stack=stack, max_bytes=max_bytes)
+            start = time.perf_counter()
+            node = game.evaluate(300, priors)
+            elapsed = time.perf_counter() - start
+            info = game.cache_info()
+            print(f"{name:20} stacks {stack:>6}: EV {node['ev']:8.3f}, best flop bet {node['bets'][node['best_bet']]['bet']:6.1f}, "
+                  f"{info['nodes_evaluated']:6} nodes in {elapsed * 1000:7.1f} ms, {info['hits']} table hits")
+    print("best line if Villain calls:", game.best_line(300, priors))
+
+    # The table is shared across evaluations, e.g. a sweep over flop priors reuses turn and river subgames
+    sweep = MultiStreetGame(streets, pot_models, hero_stack=1500, villain_stack=1500)
+    rng = np.random.default_rng(0)
+    start = time.perf_counter()
+    for _ in range(20):
+        sweep.evaluate(300, priors if rng.random() < 0.5 else priors[::-1])
+    print(f"20 evaluations in {(time.perf_counter() - start) * 1000:.1f} ms:", sweep.cache_info())
@@ -0,0 +1,218 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from profiling import count
+
+# Wrappers for the `pot_model(pot, distribution)` callables used by street.f / f_batch.
+#
+# A pot model returns Hero's expected share of `pot` at showdown against Villain's hand
+# distribution (the posterior over Villain's hand types). f_batch calls it with batches:
+# `pot` of shape (...) and `distribution` of shape (..., n_types), reducing over the last axis.
+#
+# Most models are linear, pot * sum(distribution * equity) like pot_model_func in street.py's
+# demo: those are detected by probing and replaced by a LinearPotModel, which is a single matrix
+# product. Other models can be wrapped in a CachedPotModel, which memoizes them on the pot and
+# the quantized posterior, since the same posteriors recur across bet sizes in sweeps.
+#
+# f_batch(..., gradient=True) also needs the derivatives of the model with respect to the pot
+# and the distribution: a model provides them as a `gradient(pot, distribution)` method
+# (LinearPotModel does), see pot_model_gradient.
+
+
+class LinearPotModel:
+    """pot * (distribution @ equities), for any batch shape."""
+
+    def __init__(self, equities):
+        self.equities = np.asarray(equities, dtype=float)
+
+    def __call__(self, pot, distribution):
+        return np.asarray(pot) * (np.asarray(distribution) @ self.equities)
+
+    def gradient(self, pot, distribution):
+        """(d value / d pot, d value / d distribution), of the batch shape and the distribution shape."""
+        pot = np.asarray(pot, dtype=float)
+        distribution = np.asarray(distribution, dtype=float)
+        return distribution @ self.equities, pot[..., None] * self.equities
+
+    def __repr__(self):
+        return f"LinearPotModel(equities={self.equities!r})"
+
+
+def detect_linear(pot_model, num_types, num_checks=8, rtol=1e-9, seed=0):
+    """
+    Returns a LinearPotModel equivalent to `pot_model` if it behaves like
+    pot * (distribution @ equities), else None.
+
+    The equities are read off with a unit pot against every pure hand type, and linearity is
+    then checked on random pots and random distributions (scalar calls only, so models that do
+    not support batches can be probed too).
+    """
+    try:
+        equities = np.array([float(pot_model(1.0, row)) for row in np.eye(num_types)])
+        rng = np.random.default_rng(seed)
+        for _ in range(num_checks):
+            pot = rng.uniform(1, 1000)
+            distribution = rng.dirichlet(np.ones(num_types))
+            expected = pot * (distribution @ equities)
+            if not np.isclose(float(pot_model(pot, distribution)), expected, rtol=rtol, atol=rtol * pot):
+                return None
+    except (TypeError, ValueError):
+        return None
+    return LinearPotModel(equities)
+
+
+class CachedPotModel:
+    """
+    Memoizes a pot model on (pot, distribution), both rounded to `decimals`, with LRU
+    eviction after `maxsize` entries.
+
+    With `pot_linear`, the model is assumed to be pot * share(distribution), and only the
+    share is cached, keyed on the distribution alone. In sweeps the showdown pot changes with
+    every bet size while the posteriors repeat, so this is what makes the cache hit.
+
+    Batched calls are deduplicated first, and all missing rows are passed to the wrapped model
+    in a single batched call, so it must accept batches like the pot models of f_batch.
+    """
+
+    def __init__(self, pot_model, maxsize=4096, decimals=9, pot_linear=False):
+        self.pot_model = pot_model
+        self.maxsize = maxsize
+        self.decimals = decimals
+        self.pot_linear = pot_linear
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._cache = OrderedDict()
+
+    def __call__(self, pot, distribution):
+        distribution = np.asarray(distribution, dtype=float)
+        pot = np.broadcast_to(np.asarray(pot, dtype=float), distribution.shape[:-1])
+        batch_shape = pot.shape
+        num_types = distribution.shape[-1]
+
+        # One row of (pot, distribution) per evaluation; + 0.0 turns -0.0 into 0.0 for the keys
+        key_pot = np.ones(batch_shape) if self.pot_linear else pot
+        rows = np.concatenate([key_pot.reshape(-1, 1), distribution.reshape(-1, num_types)], axis=1)
+        keys = np.round(rows, self.decimals) + 0.0
+        unique_keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+
+        values = np.empty(len(unique_keys))
+        missing = []
+        for k, key_row in enumerate(unique_keys):
+            key = key_row.tobytes()
+            value = self._cache.get(key)
+            if value is None:
+                missing.append(k)
+            else:
+                self._cache.move_to_end(key)
+                values[k] = value
+        # A miss is one evaluation of the wrapped model, repeated rows within a batch are hits
+        self.misses += len(missing)
+        self.hits += len(inverse) - len(missing)
+        count("pot_model_cache.hits", len(inverse) - len(missing))
+        count("pot_model_cache.misses", len(missing))
+
+        if missing:
+            # Evaluate the first occurrence of every missing key, not its rounded key
+            first_rows = np.empty(len(unique_keys), dtype=int)
+            first_rows[inverse[::-1]] = np.arange(len(inverse))[::-1]
+            missing_rows = rows[first_rows[missing]]
+            computed = np.asarray(self.pot_model(missing_rows[:, 0], missing_rows[:, 1:]), dtype=float).reshape(-1)
+            values[missing] = computed
+            for k, value in zip(missing, computed):
+                self._cache[unique_keys[k].tobytes()] = float(value)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+                self.evictions += 1
+
+        result = values[inverse].reshape(batch_shape)
+        if self.pot_linear:
+            result = result * pot
+        return result[()] if result.ndim == 0 else result
+
+    def cache_info(self):
+        """Hit/miss counters, like functools.lru_cache."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "maxsize": self.maxsize,
+            "currsize": len(self._cache),
+        }
+
+    def cache_clear(self):
+        self._cache.clear()
+        self.hits = self.misses = self.evictions = 0
+
+
+def memoize_pot_model(pot_model, num_types=None, maxsize=4096, decimals=9, pot_linear=False):
+    """
+    Returns the fastest equivalent of `pot_model`: a LinearPotModel if it is linear
+    (checked when `num_types` is given), otherwise a CachedPotModel (see there for `pot_linear`).
+    """
+    if isinstance(pot_model, (LinearPotModel, CachedPotModel)):
+        return pot_model
+    if num_types is not None:
+        linear = detect_linear(pot_model, num_types)
+        if linear is not None:
+            return linear
+    return CachedPotModel(pot_model, maxsize=maxsize, decimals=decimals, pot_linear=pot_linear)
+
+
+def pot_model_gradient(pot_model, num_types=None):
+    """
+    Returns `gradient(pot, distribution)` -> (d value / d pot, d value / d distribution) for
+    `pot_model`: its own `gradient` method (also through a CachedPotModel), or that of the
+    equivalent LinearPotModel if the model is detected as linear (with `num_types` given).
+
+    Raises:
+        TypeError: If the model has no gradient method and is not linear.
+    """
+    model = pot_model.pot_model if isinstance(pot_model, CachedPotModel) else pot_model
+    if hasattr(model, "gradient"):
+        return model.gradient
+    linear = detect_linear(model, num_types) if num_types is not None else None
+    if linear is None:
+        raise TypeError(f"{model!r} is not linear and has no gradient(pot, distribution) method")
+    return linear.gradient
+
+
+if __name__ == "__main__":
+    import time
+
+    from street import f_batch
+
+    equities = np.array([0.3, 0.4, 0.5, 0.6])
+
+    def linear_pot_model(pot, distribution):
+        return pot * np.sum(distribution * equities, axis=-1)
+
+    def nonlinear_pot_model(pot, distribution):
+        # Equity realization drops when Villain's range is strong, simulated run-out by run-out
+        distribution = np.asarray(distribution)
+        runouts = np.random.default_rng(1).random(2000).reshape((-1,) + (1,) * (distribution.ndim - 1)) < 0.2
+        realization = np.where(runouts, 1.0, 1 - 0.5 * np.sum(distribution * np.array([0, 0.2, 0.5, 1]), axis=-1))
+        return pot * realization.mean(axis=0) * np.sum(distribution * equities, axis=-1)
+
+    print(memoize_pot_model(linear_pot_model, num_types=4))
+    print(type(memoize_pot_model(nonlinear_pot_model, num_types=4)).__name__)
+
+    # Sweep many bet sizes with a handful of shared likelihood vectors
+    rng = np.random.default_rng(0)
+    priors = np.array([0.03, 0.2, 0.5, 0.17])
+    likelihoods = rng.dirichlet(np.ones(3), size=(8, 4))
+    sizes = np.linspace(0, 1500, 2000)
+    which = rng.integers(0, len(likelihoods), len(sizes))
+    likelihood_fold, likelihood_call, likelihood_raise = np.moveaxis(likelihoods[which], -1, 0)
+    likelihood_reraise_call = np.full((len(sizes), 4), 0.5)
+
+    cached = memoize_pot_model(nonlinear_pot_model, pot_linear=True)
+    for model in (nonlinear_pot_model, cached):
+        start = time.perf_counter()
+        for _ in range(20):
+            f_batch(model, 300, sizes, 300, 500, priors, likelihood_fold, likelihood_call, likelihood_raise,
+                    likelihood_reraise_call)
+        print(f"{getattr(model, '__name__', type(model).__name__)}: {time.perf_counter() - start:.3f} s")
+    print(cached.cache_info())
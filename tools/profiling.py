@@ -0,0 +1,256 @@
+import atexit
+import functools
+import json
+import marshal
+import os
+import sys
+import time
+import tracemalloc
+from collections import Counter
+
+# Per-stage timers and counters for the EV and strategy pipelines (street.py, utils.py, pot_model.py).
+#
+#   with profiling.profile() as profile:
+#       f_batch(...)
+#   profile.print_summary()
+#   profile.to_json("profile.json")      # or profile.dump_stats("profile.prof") for pstats / snakeviz
+#
+# or, without touching the code, RIVER_PROFILE=profile.json python run_spots.py ... (a .prof / .pstats
+# path writes pstats data, "1" prints the summary to stderr at exit; RIVER_PROFILE_MEMORY=1 also traces
+# allocated bytes with tracemalloc, which is slow). Worker processes never write a report of their own:
+# run_spots.py profiles every chunk in its worker and merges the reports into the parent's profile
+# (Profile.merge), and other multi-process callers have to do the same.
+#
+# Instrumented code calls stage(name), count(name, n) and the @profiled(name) decorator. While no
+# profile is active these are a single global check (stage returns a shared no-op context manager),
+# so they stay in the hot paths. Stages nest: a stage's "self" time excludes its child stages, and
+# "blocks" is the net number of Python memory blocks allocated inside it (sys.getallocatedblocks).
+# Counters named "<cache>.hits" and "<cache>.misses" are reported as hit rates as well.
+
+_active = None
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("profile", "name", "path", "start", "blocks", "bytes", "children")
+
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        stack = self.profile._stack
+        self.path = f"{stack[-1].path}/{self.name}" if stack else self.name
+        self.children = 0.0
+        stack.append(self)
+        if self.profile.memory:
+            self.bytes = tracemalloc.get_traced_memory()[0]
+        self.blocks = sys.getallocatedblocks()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        blocks = sys.getallocatedblocks() - self.blocks
+        profile = self.profile
+        profile._stack.pop()
+        stats = profile.stages.get(self.path)
+        if stats is None:
+            stats = profile.stages[self.path] = {"calls": 0, "seconds": 0.0, "self_seconds": 0.0, "blocks": 0}
+            if profile.memory:
+                stats["bytes"] = 0
+        stats["calls"] += 1
+        stats["seconds"] += elapsed
+        stats["self_seconds"] += elapsed - self.children
+        stats["blocks"] += blocks
+        if profile.memory:
+            stats["bytes"] += tracemalloc.get_traced_memory()[0] - self.bytes
+        if profile._stack:
+            profile._stack[-1].children += elapsed
+        return False
+
+
+class Profile:
+    """Collects stage statistics and counters while active (see profile())."""
+
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.stages = {}
+        self.counters = Counter()
+        self._stack = []
+        self._previous = None
+        self._started_tracemalloc = False
+
+    def __enter__(self):
+        global _active
+        self._previous = _active
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        _active = self
+        return self
+
+    def __exit__(self, *exc_info):
+        global _active
+        _active = self._previous
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        return False
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def report(self):
+        """Stages, counters and cache hit rates as a JSON-serializable dict."""
+        hit_rates = {}
+        for name, hits in self.counters.items():
+            if name.endswith(".hits"):
+                cache = name[:-len(".hits")]
+                total = hits + self.counters.get(cache + ".misses", 0)
+                hit_rates[cache] = hits / total if total else None
+        return {
+            "stages": {path: dict(stats) for path, stats in self.stages.items()},
+            "counters": dict(self.counters),
+            "cache_hit_rates": hit_rates,
+        }
+
+    def merge(self, report):
+        """Adds the stages and counters of another profile's report(), e.g. one sent back by a worker process."""
+        for path, stats in report["stages"].items():
+            merged = self.stages.setdefault(path, {})
+            for key, value in stats.items():
+                merged[key] = merged.get(key, 0) + value
+        self.counters.update(report["counters"])
+
+    def to_json(self, path):
+        with open(path, "w") as file:
+            json.dump(self.report(), file, indent=2)
+
+    def dump_stats(self, path):
+        """Writes the stages in the marshal format of pstats / cProfile, one "function" per stage path."""
+        def key(stage_path):
+            return ("river", 0, stage_path)
+
+        stats = {}
+        for stage_path, stage_stats in self.stages.items():
+            calls = stage_stats["calls"]
+            timing = (calls, calls, stage_stats["self_seconds"], stage_stats["seconds"])
+            parent, _, _ = stage_path.rpartition("/")
+            callers = {key(parent): timing} if parent else {}
+            stats[key(stage_path)] = timing + (callers,)
+        with open(path, "wb") as file:
+            marshal.dump(stats, file)
+
+    def print_summary(self, file=None):
+        file = file or sys.stdout
+        print(f"{'stage':60} {'calls':>8} {'total s':>10} {'self s':>10} {'blocks':>10}", file=file)
+        for path, stats in sorted(self.stages.items()):
+            print(f"{path:60} {stats['calls']:8} {stats['seconds']:10.4f} {stats['self_seconds']:10.4f} "
+                  f"{stats['blocks']:10}", file=file)
+        report = self.report()
+        for name, value in sorted(report["counters"].items()):
+            print(f"{name:60} {value:>10}", file=file)
+        for cache, rate in sorted(report["cache_hit_rates"].items()):
+            print(f"{cache + ' hit rate':60} {'-' if rate is None else f'{rate:.1%}':>10}", file=file)
+
+
+def profile(memory=False):
+    """Context manager that activates a new Profile and returns it."""
+    return Profile(memory=memory)
+
+
+def enabled():
+    return _active is not None
+
+
+def stage(name):
+    """Times the enclosed block as a stage of the active profile (no-op while disabled)."""
+    return _NULL_STAGE if _active is None else _active.stage(name)
+
+
+def count(name, n=1):
+    """Adds `n` to a counter of the active profile."""
+    if _active is not None:
+        _active.counters[name] += n
+
+
+def profiled(name):
+    """Decorator that times every call of the function as stage `name`."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return func(*args, **kwargs)
+            with _active.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def profiled_callable(func, name):
+    """`func` timed as stage `name` if a profile is active, else `func` itself (e.g. for pot models)."""
+    if _active is None:
+        return func
+    return profiled(name)(func)
+
+
+def _profile_from_environment():
+    target = os.environ.get("RIVER_PROFILE")
+    if not target:
+        return
+    environment_profile = Profile(memory=os.environ.get("RIVER_PROFILE_MEMORY") == "1").__enter__()
+
+    def write():
+        if target in ("1", "stderr"):
+            environment_profile.print_summary(sys.stderr)
+        elif os.path.splitext(target)[1] in (".prof", ".pstats"):
+            environment_profile.dump_stats(target)
+        else:
+            environment_profile.to_json(target)
+
+    atexit.register(write)
+
+
+_profile_from_environment()
+
+
+if __name__ == "__main__":
+    import pstats
+    import tempfile
+
+    import numpy as np
+
+    import profiling  # the module instrumented code sees, not this __main__ copy
+    from pot_model import CachedPotModel
+    from street import f_batch
+    from utils import generate_villain_strategies, parse_strategies_to_input_format
+
+    equities = np.array([0.3, 0.4, 0.5, 0.6])
+    rng = np.random.default_rng(0)
+    responses = rng.dirichlet(np.ones(3), size=(8, 4))[rng.integers(0, 8, 100_000)]
+    pot_model = CachedPotModel(lambda pot, distribution: pot * (distribution @ equities), pot_linear=True)
+    villain_ranges = [{"ch": {"ch": 0.3, "be-fo": 0.2, "be-ca": 0.5}, "be": {"fo": 0.1, "ca": 0.2, "ra-fo": 0.3, "ra-ca": 0.4}}] * 5
+
+    with profiling.profile() as demo_profile:
+        f_batch(pot_model, 300, rng.uniform(0, 600, len(responses)), 300, 500, [0.03, 0.2, 0.5, 0.17],
+                *np.moveaxis(responses, -1, 0), np.full(4, 0.5))
+        parse_strategies_to_input_format(generate_villain_strategies(villain_ranges))
+    demo_profile.print_summary()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "profile.prof")
+        demo_profile.dump_stats(path)
+        pstats.Stats(path).sort_stats("cumulative").print_stats(5)
@@ -0,0 +1,186 @@
+import os
+
+import numpy as np
+
+# Columnar storage for the results of street.f / f_batch.
+#
+# The nested result dict is flattened into a NumPy structured array with one field per value,
+# named "<section>.<key>" (e.g. "step1_hero_initial_action.overall_ev_hero_action"). Posteriors,
+# priors and likelihoods are (n_hands,) subarray fields, optimal actions are 1-character strings.
+# f_batch(..., out=records) fills a preallocated array directly.
+#
+# Records are saved as .npy (memory-mapped back with np.load(mmap_mode="r"); .npz archives cannot
+# be memory-mapped) or, if pyarrow is installed, as an Arrow IPC file (.arrow / .feather), which
+# is memory-mapped and read without copying. as_dict gives the familiar nested dict on top of
+# either, as views.
+
+# (section, key, kind) of every value in the result dict; kind is "scalar", "vector" or "action"
+STREET_FIELDS = [
+    ("inputs", "pot", "scalar"),
+    ("inputs", "size_hero_bet", "scalar"),
+    ("inputs", "size_villain_raise", "scalar"),
+    ("inputs", "size_hero_reraise", "scalar"),
+    ("inputs", "priors", "vector"),
+    ("inputs", "likelihood_fold_to_hero_bet", "vector"),
+    ("inputs", "likelihood_call_to_hero_bet", "vector"),
+    ("inputs", "likelihood_raise_to_hero_bet", "vector"),
+    ("inputs", "likelihood_villain_calls_hero_reraise", "vector"),
+    ("posteriors", "villain_hand_if_villain_calls_hero_action", "vector"),
+    ("posteriors", "villain_hand_if_villain_raises_hero_action", "vector"),
+    ("posteriors", "villain_hand_if_villain_calls_hero_reraise", "vector"),
+    ("step2_hero_faces_villain_bet_or_raise", "ev_fold", "scalar"),
+    ("step2_hero_faces_villain_bet_or_raise", "ev_call", "scalar"),
+    ("step2_hero_faces_villain_bet_or_raise", "ev_reraise", "scalar"),
+    ("step2_hero_faces_villain_bet_or_raise", "prob_villain_calls_hero_reraise", "scalar"),
+    ("step2_hero_faces_villain_bet_or_raise", "optimal_action", "action"),
+    ("step2_hero_faces_villain_bet_or_raise", "ev_optimal_action_if_villain_raises", "scalar"),
+    ("step1_hero_initial_action", "prob_villain_folds_to_hero_action", "scalar"),
+    ("step1_hero_initial_action", "prob_villain_calls_hero_action", "scalar"),
+    ("step1_hero_initial_action", "prob_villain_raises_to_hero_action", "scalar"),
+    ("step1_hero_initial_action", "ev_if_villain_folds_to_hero_action", "scalar"),
+    ("step1_hero_initial_action", "ev_if_villain_calls_hero_action", "scalar"),
+    ("step1_hero_initial_action", "ev_if_villain_raises_hero_responds_optimally", "scalar"),
+    ("step1_hero_initial_action", "overall_ev_hero_action", "scalar"),
+]
+
+ARROW_EXTENSIONS = (".arrow", ".feather")
+
+
+def street_result_dtype(num_hands):
+    """Structured dtype with one field per value of the street.f result dict."""
+    fields = []
+    for section, key, kind in STREET_FIELDS:
+        name = f"{section}.{key}"
+        if kind == "vector":
+            fields.append((name, np.float64, (num_hands,)))
+        elif kind == "action":
+            fields.append((name, "U1"))
+        else:
+            fields.append((name, np.float64))
+    return np.dtype(fields)
+
+
+def empty_records(batch_shape, num_hands):
+    """Preallocates records for f_batch(..., out=...)."""
+    return np.empty(batch_shape, dtype=street_result_dtype(num_hands))
+
+
+def to_records(results, out=None):
+    """
+    Writes a street.f / f_batch result dict into a structured array (allocated if `out` is
+    None) and returns it. Inputs that were not broadcast to the batch shape are broadcast here.
+    """
+    batch_shape = np.shape(results["step1_hero_initial_action"]["overall_ev_hero_action"])
+    num_hands = np.shape(results["posteriors"]["villain_hand_if_villain_calls_hero_action"])[-1]
+    if out is None:
+        out = empty_records(batch_shape, num_hands)
+    elif out.shape != batch_shape:
+        raise ValueError(f"Records of shape {out.shape} do not match the batch shape {batch_shape}")
+    for section, key, _ in STREET_FIELDS:
+        column = out[f"{section}.{key}"]
+        column[...] = np.broadcast_to(results[section][key], column.shape)
+    return out
+
+
+def as_dict(records):
+    """
+    Nested dict view (same layout as street.f) of records, a single record, or an Arrow
+    table written by save_results. Values are views into the records where possible.
+    """
+    if hasattr(records, "column_names"):  # pyarrow Table
+        columns = {name: _arrow_column_to_numpy(records.column(name)) for name in records.column_names}
+    else:
+        columns = {name: records[name] for name in records.dtype.names}
+
+    view = {}
+    for name, values in columns.items():
+        section, key = name.split(".", 1)
+        view.setdefault(section, {})[key] = values
+    return view
+
+
+def _arrow_column_to_numpy(column):
+    # Zero-copy for single-chunk numeric columns (as written by save_results)
+    import pyarrow as pa
+
+    array = column.combine_chunks() if column.num_chunks != 1 else column.chunk(0)
+    if pa.types.is_fixed_size_list(array.type):
+        return array.flatten().to_numpy().reshape(len(array), array.type.list_size)
+    if pa.types.is_floating(array.type) or pa.types.is_integer(array.type):
+        return array.to_numpy()
+    return np.asarray(array.to_pylist())
+
+
+def save_results(path, records):
+    """
+    Saves records as .npy, or as an Arrow IPC file for .arrow / .feather paths. Any other
+    extension raises ValueError, since np.save would silently append ".npy" to it.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in (".npy",) + ARROW_EXTENSIONS:
+        raise ValueError(f"Unsupported results file {path!r}: use a .npy path (or .arrow / .feather with pyarrow)")
+    if extension in ARROW_EXTENSIONS:
+        import pyarrow as pa  # optional dependency, only needed for Arrow files
+
+        flat = records.reshape(-1)
+        arrays, names = [], []
+        for name in flat.dtype.names:
+            values = np.ascontiguousarray(flat[name])
+            if values.ndim == 2:
+                arrays.append(pa.FixedSizeListArray.from_arrays(pa.array(values.reshape(-1)), values.shape[1]))
+            else:
+                arrays.append(pa.array(values))
+            names.append(name)
+        table = pa.Table.from_arrays(arrays, names=names)
+        with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    else:
+        np.save(path, records)
+
+
+def load_results(path, mmap=True):
+    """
+    Loads records saved by save_results, memory-mapped by default: a structured array
+    for .npy files, a pyarrow Table for Arrow files (use as_dict for the nested view).
+    """
+    if os.path.splitext(path)[1].lower() in ARROW_EXTENSIONS:
+        import pyarrow as pa
+
+        source = pa.memory_map(path, "r") if mmap else pa.OSFile(path, "rb")
+        return pa.ipc.open_file(source).read_all()
+    return np.load(path, mmap_mode="r" if mmap else None)
+
+
+if __name__ == "__main__":
+    import tempfile
+    import time
+
+    from street import f_batch
+
+    rng = np.random.default_rng(0)
+    num_spots, num_hands = 200_000, 4
+    equities = np.array([0.3, 0.4, 0.5, 0.6])
+    responses = rng.dirichlet(np.ones(3), size=(num_spots, num_hands))
+
+    def pot_model(pot, distribution):
+        return pot * (distribution @ equities)
+
+    arguments = (pot_model, 300, rng.uniform(0, 600, num_spots), 300, 500, np.array([0.03, 0.2, 0.5, 0.17]),
+                 responses[..., 0], responses[..., 1], responses[..., 2], rng.random((num_spots, num_hands)))
+
+    records = empty_records((num_spots,), num_hands)
+    start = time.perf_counter()
+    f_batch(*arguments, out=records)
+    print(f"{num_spots} spots into preallocated records: {time.perf_counter() - start:.3f} s, "
+          f"{records.nbytes / 2 ** 20:.0f} MiB")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "results.npy")
+        save_results(path, records)
+        start = time.perf_counter()
+        loaded = load_results(path)
+        view = as_dict(loaded)
+        mean_ev = view["step1_hero_initial_action"]["overall_ev_hero_action"].mean()
+        print(f"Memory-mapped {type(loaded).__name__} and averaged the EV ({mean_ev:.3f}) "
+              f"in {time.perf_counter() - start:.3f} s")
+        print(as_dict(loaded[0])["posteriors"]["villain_hand_if_villain_raises_hero_action"])
@@ -0,0 +1,263 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+import pandas as pd
+
+import profiling
+from game_matrix import batched_payoff_matrices
+from solver import solve_games_batch
+from street import f_batch
+
+# Command-line runner for batches of spots, e.g.
+#
+#   python run_spots.py spots.csv results.parquet --mode street --workers 16 --chunk-size 100000
+#
+# Spots are read in chunks (CSV, or Parquet if pyarrow is installed), every chunk is evaluated
+# with one vectorized call in a worker process, and results are appended to the output file in
+# input order as soon as they are ready, so memory is bounded by about 2 * workers chunks.
+#
+# Input columns:
+#   --mode street (street.f_batch, with a linear pot model from the equities):
+#       pot, size_hero_bet, size_villain_raise, size_hero_reraise, and per hand class i = 0, 1, ...
+#       prior_i, fold_i, call_i, raise_i, reraise_call_i, equity_i
+#   --mode game (single-range game of initial_game.py, solved with solver.solve_games_batch):
+#       pot, hero_bet, hero_raise, hero_3bet, villain_bet, villain_raise (fractions of the pot), equity
+# An optional spot_id column is passed through; otherwise the row number is used.
+
+STREET_SCALARS = ["pot", "size_hero_bet", "size_villain_raise", "size_hero_reraise"]
+STREET_VECTORS = ["prior", "fold", "call", "raise", "reraise_call", "equity"]
+GAME_COLUMNS = ["pot", "hero_bet", "hero_raise", "hero_3bet", "villain_bet", "villain_raise", "equity"]
+
+
+def _vector_columns(frame, prefix):
+    # prefix_0, prefix_1, ... as a (rows, hands) array
+    columns = sorted((c for c in frame.columns if c.startswith(prefix + "_") and c[len(prefix) + 1:].isdigit()),
+                     key=lambda c: int(c[len(prefix) + 1:]))
+    if not columns:
+        raise ValueError(f"Missing columns {prefix}_0, {prefix}_1, ...")
+    return frame[columns].to_numpy(dtype=float)
+
+
+def evaluate_street(frame):
+    """Evaluates street.f_batch on every row of `frame`."""
+    scalars = [frame[c].to_numpy(dtype=float) for c in STREET_SCALARS]
+    priors, fold, call, raise_, reraise_call, equities = (_vector_columns(frame, prefix) for prefix in STREET_VECTORS)
+
+    def pot_model(pot, distribution):
+        return pot * np.sum(distribution * equities, axis=-1)
+
+    results = f_batch(pot_model, *scalars, priors, fold, call, raise_, reraise_call)
+    step1 = results["step1_hero_initial_action"]
+    step2 = results["step2_hero_faces_villain_bet_or_raise"]
+    return pd.DataFrame({
+        "prob_villain_folds": step1["prob_villain_folds_to_hero_action"],
+        "prob_villain_calls": step1["prob_villain_calls_hero_action"],
+        "prob_villain_raises": step1["prob_villain_raises_to_hero_action"],
+        "ev_fold": step2["ev_fold"],
+        "ev_call": step2["ev_call"],
+        "ev_reraise": step2["ev_reraise"],
+        "prob_villain_calls_hero_reraise": step2["prob_villain_calls_hero_reraise"],
+        "optimal_action": step2["optimal_action"],
+        "ev_if_villain_raises": step2["ev_optimal_action_if_villain_raises"],
+        "overall_ev": step1["overall_ev_hero_action"],
+    })
+
+
+def evaluate_game(frame, max_actions=4, **solver_options):
+    """Solves the single-range game of every row of `frame` in one batched solve."""
+    game = batched_payoff_matrices(*(frame[c].to_numpy(dtype=float) for c in GAME_COLUMNS), max_actions=max_actions)
+    result = solve_games_batch(game["hero_matrix"], game["villain_matrix"], **solver_options)
+    columns = {
+        key: result[key]
+        for key in ("hero_utility", "villain_utility", "hero_exploitability", "villain_exploitability", "converged_at_iteration")
+    }
+    for k, action in enumerate(game["hero_actions"]):
+        columns[f"hero:{action}"] = result["row_strategy"][:, k]
+    for k, action in enumerate(game["villain_actions"]):
+        columns[f"villain:{action}"] = result["col_strategy"][:, k]
+    return pd.DataFrame(columns)
+
+
+def evaluate_chunk(mode, frame, options, parquet=False):
+    """
+    Worker entry point: evaluates one chunk, prepends the spot ids and serializes the
+    results for the output file (formatting CSV is as expensive as the evaluation itself,
+    so it is done in the workers too).
+
+    Returns:
+        (number of rows, payload, profile report), where payload is a pyarrow Table for Parquet
+        output, and the (header, body) CSV text otherwise. The profile report (see
+        profiling.Profile.report) covers this chunk only and is None while no profile is active.
+    """
+    if not profiling.enabled():
+        return _evaluate_chunk(mode, frame, options, parquet) + (None,)
+    # A fresh profile per chunk: a forked worker's copy of the parent's profile would count its stages twice
+    with profiling.profile(memory=profiling._active.memory) as chunk_profile:
+        num_rows, payload = _evaluate_chunk(mode, frame, options, parquet)
+    return num_rows, payload, chunk_profile.report()
+
+
+def _evaluate_chunk(mode, frame, options, parquet):
+    results = evaluate_street(frame) if mode == "street" else evaluate_game(frame, **options)
+    results.insert(0, "spot_id", frame["spot_id"].to_numpy())
+    if parquet:
+        import pyarrow as pa
+
+        return len(results), pa.Table.from_pandas(results, preserve_index=False)
+    header = results.iloc[:0].to_csv(index=False)
+    return len(results), (header, results.to_csv(index=False, header=False))
+
+
+def _is_parquet(path):
+    return os.path.splitext(path)[1].lower() in (".parquet", ".pq")
+
+
+def read_chunks(path, chunk_size):
+    """Yields (DataFrame, total number of rows or None) chunks of the input file."""
+    if _is_parquet(path):
+        import pyarrow.parquet as pq  # optional dependency, only needed for Parquet files
+
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas(), parquet_file.metadata.num_rows
+    else:
+        for frame in pd.read_csv(path, chunksize=chunk_size):
+            yield frame, None
+
+
+class ResultWriter:
+    """Appends the payloads of evaluate_chunk to a CSV or Parquet file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.parquet = _is_parquet(path)
+        self._file = None
+        self._parquet_writer = None
+
+    def write(self, payload):
+        if self.parquet:
+            import pyarrow.parquet as pq
+
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.path, payload.schema)
+            self._parquet_writer.write_table(payload)
+        else:
+            header, body = payload
+            if self._file is None:
+                self._file = open(self.path, "w", newline="")
+                self._file.write(header)
+            self._file.write(body)
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+        if self._file is not None:
+            self._file.close()
+
+
+def run(input_path, output_path, mode="street", workers=None, chunk_size=100_000, options=None, progress=True):
+    """
+    Evaluates all spots of `input_path` and writes the results to `output_path`.
+    Returns the number of spots evaluated.
+    """
+    workers = workers or os.cpu_count() or 1
+    options = options or {}
+    writer = ResultWriter(output_path)
+    start = time.perf_counter()
+    done = 0
+    offset = 0
+
+    def report(total):
+        if progress:
+            elapsed = time.perf_counter() - start
+            total_text = f"/{total:,}" if total else ""
+            print(f"\r{done:,}{total_text} spots, {done / max(elapsed, 1e-9):,.0f} spots/s", end="", file=sys.stderr, flush=True)
+
+    def chunks():
+        nonlocal offset
+        for frame, total in read_chunks(input_path, chunk_size):
+            if "spot_id" not in frame.columns:
+                frame = frame.assign(spot_id=np.arange(offset, offset + len(frame)))
+            offset += len(frame)
+            yield frame, total
+
+    try:
+        if workers == 1:
+            for frame, total in chunks():
+                num_rows, payload, profile_report = evaluate_chunk(mode, frame, options, writer.parquet)
+                if profile_report is not None:
+                    profiling._active.merge(profile_report)
+                writer.write(payload)
+                done += num_rows
+                report(total)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                pending = {}    # future -> chunk index
+                finished = {}   # chunk index -> results, waiting for the earlier chunks
+                next_to_write = 0
+                total = None
+                source = iter(enumerate(chunks()))
+                exhausted = False
+                while not exhausted or pending:
+                    # Keep at most 2 chunks per worker in flight to bound memory
+                    while not exhausted and len(pending) + len(finished) < 2 * workers:
+                        item = next(source, None)
+                        if item is None:
+                            exhausted = True
+                            break
+                        index, (frame, total) = item
+                        pending[pool.submit(evaluate_chunk, mode, frame, options, writer.parquet)] = index
+                    if not pending:
+                        continue
+                    completed, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in completed:
+                        finished[pending.pop(future)] = future.result()
+                    while next_to_write in finished:
+                        num_rows, payload, profile_report = finished.pop(next_to_write)
+                        if profile_report is not None:
+                            # Workers exit without writing a profile, so their stages are merged here
+                            profiling._active.merge(profile_report)
+                        writer.write(payload)
+                        done += num_rows
+                        next_to_write += 1
+                    report(total)
+    finally:
+        writer.close()
+        if progress:
+            print(file=sys.stderr)
+    return done
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate a file of spots with street.f_batch or the batched game solver.")
+    parser.add_argument("input", help="CSV or Parquet file of spots")
+    parser.add_argument("output", help="CSV or Parquet file for the results")
+    parser.add_argument("--mode", choices=["street", "game"], default="street")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=100_000, help="spots per chunk")
+    parser.add_argument("--max-actions", type=int, default=4, choices=[2, 3, 4], help="game mode only")
+    parser.add_argument("--iterations", type=int, default=10000, help="game mode only")
+    parser.add_argument("--learning-rate", type=float, default=0.005, help="game mode only")
+    parser.add_argument("--threshold", type=float, default=0.001, help="game mode only")
+    parser.add_argument("--method", choices=["exponential_weights", "rm+"], default="rm+", help="game mode only")
+    parser.add_argument("--quiet", action="store_true", help="no progress counter")
+    args = parser.parse_args(argv)
+
+    options = {}
+    if args.mode == "game":
+        options = {
+            "max_actions": args.max_actions,
+            "iterations": args.iterations,
+            "learning_rate": args.learning_rate,
+            "convergence_threshold": args.threshold,
+            "method": args.method,
+        }
+    run(args.input, args.output, args.mode, args.workers, args.chunk_size, options, progress=not args.quiet)
+
+
+if __name__ == "__main__":
+    main()
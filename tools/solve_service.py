@@ -0,0 +1,476 @@
+import argparse
+import asyncio
+import functools
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from game_matrix import bet_amounts, payoff_matrices_from_amounts, strategy_labels
+from matrix_cache import cache_key, game_key
+from solver import METHODS, solve_game
+
+# Local HTTP/JSON service around the matrix builder and the solvers, for the React app and scripts:
+#
+#   python solve_service.py --port 8765 --workers 4
+#   curl -s localhost:8765/solve -d '{"potSize": 100, "maxActions": 4, "heroRanges": "1,1", ...}'
+#   curl -sN 'localhost:8765/solve?stream=1' -d @game.json      # NDJSON progress, then the result
+#
+# POST /solve takes a GameState of src/types.ts (strings like the form: "1,1" ranges, equity rows
+# separated by newlines, in percent) or the same keys with JSON lists (equities in [0, 1]), plus the
+# optional "method" ("exponential_weights" like the app, "rm+" or "lp"), "checkEvery" and
+# "heroFixed" / "villainFixed" frequency vectors. The response mirrors solveGame in gameSolver.ts
+# (row_strategy, col_strategy, heroUtility, villainUtility, convergenceHistory, convergedAtIteration)
+# plus the matrices' strategy labels. GET /stats returns the service metrics, GET /health "ok".
+#
+# Requests are keyed on their normalized game and solver options (matrix_cache.cache_key), so
+#   - finished results are served from an in-memory LRU cache,
+#   - a request identical to one in flight subscribes to it instead of starting another solve
+#     (streaming subscribers get the history so far replayed, then the rest live),
+#   - solves run in a process pool, at most --max-solves at a time (others wait their turn, and
+#     beyond --max-pending waiting solves new ones are refused with 503).
+# A solve runs as chunks of --chunk-iterations iterations, every chunk resuming the previous one's
+# state (solve_game's warm start), so progress streams back after every chunk and the result is
+# the same as one long run. Workers keep the matrices of their recent games, so chunks do not
+# rebuild them.
+#
+# Only the standard library is used for HTTP (one request per connection, CORS enabled), so the
+# service runs anywhere the tools run; it binds to localhost unless told otherwise.
+
+HISTORY_KEYS = ("iteration", "hero_utility", "villain_utility", "hero_exploitability", "villain_exploitability")
+_CAMEL_CASE = {"hero_utility": "heroUtility", "villain_utility": "villainUtility",
+               "hero_exploitability": "heroExploitability", "villain_exploitability": "villainExploitability",
+               "iteration": "iteration"}
+
+
+class BadRequest(ValueError):
+    pass
+
+
+class Busy(RuntimeError):
+    pass
+
+
+# Requests
+
+def _numbers(value, name):
+    try:
+        if isinstance(value, str):
+            return [float(x) for x in value.replace("\n", ",").split(",") if x.strip()]
+        return [float(x) for x in np.ravel(value)]
+    except (TypeError, ValueError):
+        raise BadRequest(f"{name} must be numbers, got {value!r}") from None
+
+
+def parse_request(body):
+    """
+    Normalized (game, options) dicts of a /solve request body; raises BadRequest.
+
+    `game` holds the payoff_matrices_from_amounts arguments, `options` the solve_game ones.
+    """
+    def get(name, default=None, kind=float):
+        value = body.get(name, default)
+        if value is None:
+            raise BadRequest(f"Missing {name}")
+        try:
+            return kind(value)
+        except (TypeError, ValueError):
+            raise BadRequest(f"{name} must be a {kind.__name__}, got {value!r}") from None
+
+    if not isinstance(body, dict):
+        raise BadRequest("Expected a JSON object")
+    max_actions = get("maxActions", 4, int)
+    if max_actions not in (2, 3, 4):
+        raise BadRequest("maxActions must be 2, 3 or 4")
+    hero_ranges = _numbers(body.get("heroRanges", "1"), "heroRanges")
+    villain_ranges = _numbers(body.get("villainRanges", "1"), "villainRanges")
+    if not hero_ranges or not villain_ranges or min(hero_ranges + villain_ranges) < 0 \
+            or not sum(hero_ranges) or not sum(villain_ranges):
+        raise BadRequest("Ranges must be non-negative with a positive sum")
+    equities = _numbers(body.get("equities", "50"), "equities")
+    if isinstance(body.get("equities", "50"), str):
+        equities = [equity / 100 for equity in equities]  # percent, like the form
+    if len(equities) != len(hero_ranges) * len(villain_ranges):
+        raise BadRequest(f"Expected {len(hero_ranges)} x {len(villain_ranges)} equities, got {len(equities)}")
+
+    pot = get("potSize")
+    sizes = [get(name) for name in ("heroBet", "heroRaise", "hero3bet", "villainBet", "villainRaise")]
+    utility = body.get("utility", "linear")
+    if utility not in ("linear", "logarithmic"):
+        raise BadRequest("utility must be 'linear' or 'logarithmic'")
+    game = {
+        "pot": pot,
+        "amounts": bet_amounts(pot, *sizes),
+        "hero_ranges": hero_ranges,
+        "villain_ranges": villain_ranges,
+        "equities": np.reshape(equities, (len(hero_ranges), len(villain_ranges))).tolist(),
+        "max_actions": max_actions,
+        "utility": utility,
+        "hero_stack": get("heroStack", 0.0),
+        "villain_stack": get("villainStack", 0.0),
+    }
+
+    method = body.get("method", "exponential_weights")
+    if method not in METHODS:
+        raise BadRequest(f"method must be one of {METHODS}")
+    if method == "lp" and utility != "linear":
+        raise BadRequest("method 'lp' needs the constant-sum game of the linear utility")
+    options = {
+        "iterations": get("iterations", 10000, int),
+        "learning_rate": get("learningRate", 0.005),
+        "convergence_threshold": get("convergenceThreshold", 0.001),
+        "method": method,
+        "check_every": max(1, get("checkEvery", 10, int)),
+    }
+    for name, key in (("heroFixed", "hero_fixed"), ("villainFixed", "villain_fixed")):
+        if body.get(name) is not None:
+            options[key] = _numbers(body[name], name)
+    return game, options
+
+
+def request_key(game, options):
+    return cache_key("solve_service", game=game_key(**game), options=options)
+
+
+# Worker side (runs in the process pool)
+
+@functools.lru_cache(maxsize=8)
+def _matrices(game_json):
+    return payoff_matrices_from_amounts(**json.loads(game_json))
+
+
+def _strategy_labels(game_json):
+    game = _matrices(game_json)
+    return (strategy_labels(game["hero_codes"], game["hero_actions"], "H"),
+            strategy_labels(game["villain_codes"], game["villain_actions"], "V"))
+
+
+def _solve_chunk(game_json, options, state, iterations):
+    """Runs `iterations` more iterations from `state` (the previous chunk's result, or None)."""
+    game = _matrices(game_json)
+    result = solve_game(game["hero_matrix"], game["villain_matrix"], iterations=iterations, warm_start=state, **options)
+    state = {key: value.tolist() if isinstance(value, np.ndarray) else value for key, value in result.items()}
+    state["convergence_history"] = {key: value.tolist() for key, value in result["convergence_history"].items()}
+    return state
+
+
+# Service
+
+def _history_rows(history):
+    return [{_CAMEL_CASE[key]: history[key][k] for key in HISTORY_KEYS} for k in range(len(history["iteration"]))]
+
+
+class _Job:
+    """One solve in flight: its progress events so far and the subscribers waiting for more."""
+
+    def __init__(self):
+        self.events = []
+        self.changed = asyncio.Condition()
+
+    async def publish(self, event):
+        async with self.changed:
+            self.events.append(event)
+            self.changed.notify_all()
+
+    async def follow(self):
+        """Yields every event, the ones published so far first."""
+        position = 0
+        while True:
+            async with self.changed:
+                await self.changed.wait_for(lambda: position < len(self.events))
+                events = self.events[position:]
+            for event in events:
+                yield event
+            position += len(events)
+            if events[-1]["type"] in ("result", "error"):
+                return
+
+
+class SolveService:
+    """
+    Coalescing, caching solver front end over a process pool (see the module comment).
+
+    Args:
+        workers: Processes of the pool (default: the number of CPUs).
+        max_solves: Solves running at once.
+        max_pending: Solves allowed to wait for a slot before new ones are refused.
+        cache_size: Finished results kept in memory.
+        chunk_iterations: Iterations per chunk, i.e. between two progress events.
+    """
+
+    def __init__(self, workers=None, max_solves=None, max_pending=64, cache_size=256, chunk_iterations=500):
+        self.workers = workers or os.cpu_count()
+        self.max_solves = max_solves or self.workers
+        self.max_pending = max_pending
+        self.cache_size = cache_size
+        self.chunk_iterations = chunk_iterations
+        self._pool = None
+        self._slots = None
+        self._pending = 0
+        self._jobs = {}
+        self._cache = OrderedDict()
+        self.metrics = {"requests": 0, "cache_hits": 0, "coalesced": 0, "solves": 0, "chunks": 0,
+                        "rejected": 0, "errors": 0, "solve_seconds": 0.0}
+
+    def start(self):
+        self._pool = ProcessPoolExecutor(self.workers)
+        self._slots = asyncio.Semaphore(self.max_solves)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    def stats(self):
+        return {**self.metrics, "in_flight": len(self._jobs), "pending": self._pending,
+                "cached": len(self._cache), "workers": self.workers, "max_solves": self.max_solves}
+
+    def submit(self, body):
+        """The _Job answering a /solve request body: cached, already in flight or newly started."""
+        game, options = parse_request(body)
+        key = request_key(game, options)
+        self.metrics["requests"] += 1
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self.metrics["cache_hits"] += 1
+            return self._cache[key]
+        if key in self._jobs:
+            self.metrics["coalesced"] += 1
+            return self._jobs[key]
+        if self._pending >= self.max_pending:
+            self.metrics["rejected"] += 1
+            raise Busy("Too many solves waiting, try again later")
+        job = self._jobs[key] = _Job()
+        asyncio.get_running_loop().create_task(self._run(key, job, game, options))
+        return job
+
+    async def _run(self, key, job, game, options):
+        loop = asyncio.get_running_loop()
+        game_json = json.dumps(game, sort_keys=True)
+        self._pending += 1
+        try:
+            async with self._slots:
+                self._pending -= 1
+                start = time.perf_counter()
+                self.metrics["solves"] += 1
+                await job.publish({"type": "started"})
+                state, remaining, history = None, options["iterations"], {key: [] for key in HISTORY_KEYS}
+                chunk_options = {name: value for name, value in options.items() if name != "iterations"}
+                while True:
+                    iterations = remaining if options["method"] == "lp" else min(self.chunk_iterations, remaining)
+                    state = await loop.run_in_executor(self._pool, _solve_chunk, game_json, chunk_options, state, iterations)
+                    self.metrics["chunks"] += 1
+                    remaining -= iterations
+                    for name in HISTORY_KEYS:
+                        history[name] += state["convergence_history"][name]
+                    finished = remaining <= 0 or state["converged_at_iteration"] is not None \
+                        or options["method"] == "lp" or ("hero_fixed" in options and "villain_fixed" in options)
+                    if finished:
+                        break
+                    await job.publish({"type": "progress", "convergenceHistory": _history_rows(state["convergence_history"])})
+                hero_labels, villain_labels = await loop.run_in_executor(self._pool, _strategy_labels, game_json)
+                self.metrics["solve_seconds"] += time.perf_counter() - start
+            result = {
+                "row_strategy": state["row_strategy"],
+                "col_strategy": state["col_strategy"],
+                "heroUtility": state["hero_utility"],
+                "villainUtility": state["villain_utility"],
+                "convergenceHistory": _history_rows(history),
+                "convergedAtIteration": state["converged_at_iteration"],
+                "heroStrategies": hero_labels,
+                "villainStrategies": villain_labels,
+            }
+            # Cached jobs replay a single result event
+            cached = _Job()
+            cached.events = [{"type": "result", "result": result}]
+            self._cache[key] = cached
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            await job.publish({"type": "result", "result": result})
+        except Exception as error:  # reported to the waiting requests, which answer 500
+            self.metrics["errors"] += 1
+            await job.publish({"type": "error", "error": f"{type(error).__name__}: {error}"})
+        finally:
+            del self._jobs[key]
+
+    # HTTP
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1")
+                if line in ("\r\n", "\n", ""):
+                    break
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            if len(request_line) < 2:
+                return
+            method, target = request_line[0], urlsplit(request_line[1])
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+            await self._route(writer, method, target.path, parse_qs(target.query), headers, body)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, writer, method, path, query, headers, body):
+        if method == "OPTIONS":
+            return await _respond(writer, 204, None)
+        if method == "GET" and path == "/health":
+            return await _respond(writer, 200, {"status": "ok"})
+        if method == "GET" and path == "/stats":
+            return await _respond(writer, 200, self.stats())
+        if path != "/solve":
+            return await _respond(writer, 404, {"error": f"No route {method} {path}"})
+        if method != "POST":
+            return await _respond(writer, 405, {"error": "Use POST /solve"})
+        try:
+            job = self.submit(json.loads(body or b"{}"))
+        except (json.JSONDecodeError, BadRequest) as error:
+            return await _respond(writer, 400, {"error": str(error)})
+        except Busy as error:
+            return await _respond(writer, 503, {"error": str(error)})
+
+        if query.get("stream", ["0"])[0] in ("1", "true") or "application/x-ndjson" in headers.get("accept", ""):
+            writer.write(_head(200, "application/x-ndjson", chunked=True))
+            async for event in job.follow():
+                writer.write(_chunk(json.dumps(event).encode() + b"\n"))
+                await writer.drain()
+            writer.write(_chunk(b""))
+            return await writer.drain()
+        async for event in job.follow():
+            if event["type"] == "result":
+                return await _respond(writer, 200, event["result"])
+            if event["type"] == "error":
+                return await _respond(writer, 500, {"error": event["error"]})
+
+
+_REASONS = {200: "OK", 204: "No Content", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+def _head(status, content_type, length=None, chunked=False):
+    lines = [f"HTTP/1.1 {status} {_REASONS[status]}", f"Content-Type: {content_type}", "Connection: close",
+             "Access-Control-Allow-Origin: *", "Access-Control-Allow-Methods: GET, POST, OPTIONS",
+             "Access-Control-Allow-Headers: Content-Type, Accept"]
+    lines.append("Transfer-Encoding: chunked" if chunked else f"Content-Length: {length or 0}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+def _chunk(data):
+    return f"{len(data):x}\r\n".encode() + data + b"\r\n"
+
+
+async def _respond(writer, status, payload):
+    data = b"" if payload is None else json.dumps(payload).encode()
+    writer.write(_head(status, "application/json", len(data)) + data)
+    await writer.drain()
+
+
+async def serve(service, host="127.0.0.1", port=8765, ready=None):
+    """Runs `service` on host:port until cancelled; `ready` (an asyncio.Future) receives the bound port."""
+    service.start()
+    server = await asyncio.start_server(service.handle, host, port)
+    try:
+        if ready is not None:
+            ready.set_result(server.sockets[0].getsockname()[1])
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+# Client (for scripts and the self-test)
+
+async def request(port, method, path, payload=None, host="127.0.0.1"):
+    """
+    One HTTP request to the service. Returns (status, body) with the body parsed from JSON,
+    or, for NDJSON streams, the list of events.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    data = b"" if payload is None else json.dumps(payload).encode()
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(data)}\r\n\r\n".encode() + data)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while (line := (await reader.readline()).decode("latin-1")) not in ("\r\n", ""):
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if headers.get("transfer-encoding") == "chunked":
+        body = b""
+        while size := int((await reader.readline()).strip(), 16):
+            body += await reader.readexactly(size)
+            await reader.readline()
+        result = [json.loads(line) for line in body.splitlines()]
+    else:
+        body = await reader.readexactly(int(headers.get("content-length", 0)))
+        result = json.loads(body) if body else None
+    writer.close()
+    return status, result
+
+
+async def self_test(workers=2):
+    """Starts the service on a free localhost port and checks coalescing, caching and streaming."""
+    service = SolveService(workers=workers, chunk_iterations=200)
+    ready = asyncio.get_running_loop().create_future()
+    server = asyncio.create_task(serve(service, port=0, ready=ready))
+    port = await ready
+    game = {"potSize": 100, "maxActions": 4, "heroBet": 0.5, "heroRaise": 0.5, "hero3bet": 1, "villainBet": 0.75,
+            "villainRaise": 0.5, "heroRanges": "1,1", "villainRanges": "1,1", "equities": "60,40\n35,55",
+            "iterations": 5000, "method": "rm+", "convergenceThreshold": 0.01}
+    try:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(request(port, "POST", "/solve", game) for _ in range(8)),
+                                         request(port, "POST", "/solve?stream=1", game))
+        elapsed = time.perf_counter() - start
+        statuses = [status for status, _ in responses]
+        events = responses[-1][1]
+        result = responses[0][1]
+        print(f"9 identical concurrent requests: statuses {set(statuses)}, {elapsed * 1000:.0f} ms, "
+              f"value {result['heroUtility']:.3f}, converged at {result['convergedAtIteration']}")
+        print(f"stream: {[event['type'] for event in events]}")
+
+        start = time.perf_counter()
+        status, cached = await request(port, "POST", "/solve", dict(game, heroRanges="2,2"))  # same normalized game
+        print(f"normalized repeat: status {status}, {(time.perf_counter() - start) * 1000:.1f} ms, "
+              f"same result {cached['row_strategy'] == result['row_strategy']}")
+        print("bad request:", await request(port, "POST", "/solve", {"potSize": 100, "maxActions": 5}))
+        print("stats:", (await request(port, "GET", "/stats"))[1])
+    finally:
+        server.cancel()
+        await asyncio.gather(server, return_exceptions=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the matrix builder and solvers over HTTP/JSON on localhost.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=None, help="solver processes (default: CPU count)")
+    parser.add_argument("--max-solves", type=int, default=None, help="solves running at once (default: --workers)")
+    parser.add_argument("--max-pending", type=int, default=64, help="waiting solves before requests get 503")
+    parser.add_argument("--cache-size", type=int, default=256, help="finished results kept in memory")
+    parser.add_argument("--chunk-iterations", type=int, default=500, help="iterations between progress events")
+    parser.add_argument("--self-test", action="store_true", help="run a local self-test and exit")
+    args = parser.parse_args(argv)
+
+    if args.self_test:
+        asyncio.run(self_test(args.workers or 2))
+        return
+    service = SolveService(args.workers, args.max_solves, args.max_pending, args.cache_size, args.chunk_iterations)
+    print(f"Serving on http://{args.host}:{args.port}", file=sys.stderr)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,555 @@
+import numpy as np
+
+# Iterative equilibrium solvers for the payoff matrices built by game_matrix.py.
+#
+# "exponential_weights" is the scheme of src/utils/gameSolver.ts: every iteration both players
+# play a softmax (with temperature `learning_rate`) of their payoffs against the opponent's
+# average strategy, which is then mixed into their own average with weight 2 / (t + 2).
+# "rm+" is regret matching+ with the same 2 / (t + 2) (i.e. linear) averaging.
+# Each iteration only needs matrix-vector products, so the cost is O(rows * cols) per iteration.
+#
+# Zero-sum games (game_matrix.zero_sum_payoff_matrix) are passed as the hero matrix alone, with
+# villain_matrix=None. Memory-mapped matrices are multiplied in blocks of rows (CHUNK_BYTES each by
+# default), so a solve holds the strategy vectors and one product block in memory; the mapped pages
+# are file cache that the OS can drop. float32 matrices are multiplied in float32 (the strategy is
+# cast, never the matrix) and the blocks are summed in float64.
+#
+# A (row_strategy, col_strategy) warm start is averaged as if it were the average of the first
+# WARM_START_ITERATION iterations: starting the schedule at t = 0 would give the first update
+# weight 1 and throw the warm start away.
+
+METHODS = ("exponential_weights", "rm+", "lp")
+CHUNK_BYTES = 4 << 20
+WARM_START_ITERATION = 100
+
+
+def _normalized(strategy, size):
+    strategy = np.asarray(strategy, dtype=float)
+    if strategy.shape != (size,):
+        raise ValueError(f"Strategy must have shape ({size},), got {strategy.shape}")
+    return strategy / strategy.sum()
+
+
+def _softmax(payoffs, learning_rate):
+    # Over the last axis, so that it also works for a batch of payoff vectors
+    weights = np.exp((payoffs - payoffs.max(axis=-1, keepdims=True)) / learning_rate)
+    return weights / weights.sum(axis=-1, keepdims=True)
+
+
+def regret_matching(regrets):
+    """
+    Regret matching: the strategy proportional to the (non-negative) cumulative regrets,
+    over the last axis, so a stack of regret vectors gives a stack of strategies. Where
+    all regrets are zero the strategy is uniform.
+
+    Args:
+        regrets: Non-negative cumulative regrets, shape (..., num_actions).
+
+    Returns:
+        Strategies of the same shape, summing to one over the last axis.
+    """
+    total = regrets.sum(axis=-1, keepdims=True)
+    uniform = np.full(regrets.shape, 1.0 / regrets.shape[-1])
+    return np.where(total > 0, regrets / np.where(total > 0, total, 1), uniform)
+
+
+def _as_matrix(matrix):
+    # Keeps float32 / float64 arrays and memmaps as they are, converts anything else to float64
+    matrix = np.asanyarray(matrix)
+    return matrix if matrix.dtype in (np.float32, np.float64) else matrix.astype(float)
+
+
+def _chunk_rows(matrix, chunk_rows):
+    # Rows per block for matvec / vecmat, or None to multiply in one go
+    if chunk_rows is None:
+        if not isinstance(matrix, np.memmap):
+            return None
+        chunk_rows = max(1, CHUNK_BYTES // (matrix.itemsize * matrix.shape[1]))
+    return chunk_rows if chunk_rows < matrix.shape[0] else None
+
+
+def matvec(matrix, vector, chunk_rows=None):
+    """
+    matrix @ vector as float64, in the matrix's precision and in blocks of `chunk_rows` rows
+    (by default blocks of CHUNK_BYTES for memmaps).
+    """
+    vector = np.asarray(vector).astype(matrix.dtype, copy=False)
+    rows = _chunk_rows(matrix, chunk_rows)
+    if rows is None:
+        return (matrix @ vector).astype(float, copy=False)
+    out = np.empty(matrix.shape[0])
+    for start in range(0, len(out), rows):
+        out[start:start + rows] = matrix[start:start + rows] @ vector
+    return out
+
+
+def vecmat(vector, matrix, chunk_rows=None):
+    """vector @ matrix as float64, in blocks of rows like matvec."""
+    vector = np.asarray(vector).astype(matrix.dtype, copy=False)
+    rows = _chunk_rows(matrix, chunk_rows)
+    if rows is None:
+        return (vector @ matrix).astype(float, copy=False)
+    out = np.zeros(matrix.shape[1])
+    for start in range(0, matrix.shape[0], rows):
+        out += vector[start:start + rows] @ matrix[start:start + rows]
+    return out
+
+
+def exploitability(hero_matrix, villain_matrix, row_strategy, col_strategy, chunk_rows=None):
+    """
+    Returns (hero_utility, villain_utility, hero_exploitability, villain_exploitability),
+    where a player's exploitability is what they could gain by switching to a best
+    response against the other's strategy (as in gameSolver.ts). With villain_matrix=None
+    the game is zero-sum (Villain gets minus the hero matrix).
+    """
+    row_payoffs = matvec(hero_matrix, col_strategy, chunk_rows)
+    if villain_matrix is None:
+        col_payoffs = -vecmat(row_strategy, hero_matrix, chunk_rows)
+    else:
+        col_payoffs = vecmat(row_strategy, villain_matrix, chunk_rows)
+    hero_utility = row_strategy @ row_payoffs
+    villain_utility = col_payoffs @ col_strategy
+    return hero_utility, villain_utility, row_payoffs.max() - hero_utility, col_payoffs.max() - villain_utility
+
+
+def solve_game(hero_matrix, villain_matrix, iterations=10000, learning_rate=0.005, convergence_threshold=0.001,
+               method="exponential_weights", hero_fixed=None, villain_fixed=None, warm_start=None, check_every=1,
+               chunk_rows=None, warm_start_iteration=None):
+    """
+    Iteratively solves the bimatrix game (hero_matrix, villain_matrix).
+
+    Args:
+        hero_matrix, villain_matrix: Payoffs of shape (rows, cols) for Hero (row player)
+                                     and Villain (column player); villain_matrix=None for a
+                                     zero-sum game, where Villain gets minus hero_matrix
+                                     (which may then be a float32 np.memmap).
+        iterations: Maximum number of iterations.
+        learning_rate: Softmax temperature of the exponential-weights method.
+        convergence_threshold: Stop once the exploitability of every non-fixed player
+                               is below this value.
+        method: "exponential_weights", "rm+" or "lp" (see solve_game_lp).
+        hero_fixed, villain_fixed: Optional strategy vectors (relative frequencies) that
+                                   are kept fixed instead of being solved for.
+        warm_start: Either a (row_strategy, col_strategy) pair to start from (returned as it
+                    is if it is already within the threshold), or the result of a previous
+                    solve_game call on the same (or a slightly changed) game, which resumes
+                    its averaging schedule and regrets.
+        check_every: Evaluate exploitability and record history every this many iterations.
+        chunk_rows: Rows per block of the matrix-vector products (see matvec).
+        warm_start_iteration: Iteration at which the averaging schedule starts for a
+                              (row_strategy, col_strategy) warm start (default
+                              WARM_START_ITERATION); larger values trust the warm start more.
+
+    Returns:
+        A dict with "row_strategy", "col_strategy", "hero_utility", "villain_utility",
+        "convergence_history" (dict of arrays: "iteration", "hero_utility",
+        "villain_utility", "hero_exploitability", "villain_exploitability"),
+        "converged_at_iteration" (None if not converged), "next_iteration" and, for
+        rm+, the cumulative "row_regrets" and "col_regrets".
+    """
+    if method == "lp":
+        return solve_game_lp(hero_matrix, villain_matrix)
+    if method not in METHODS:
+        raise ValueError(f"Unknown method {method!r}, expected one of {METHODS}")
+
+    hero_matrix = _as_matrix(hero_matrix)
+    villain_matrix = None if villain_matrix is None else _as_matrix(villain_matrix)
+    rows, cols = hero_matrix.shape
+
+    def row_payoffs_against(col_strategy):
+        return matvec(hero_matrix, col_strategy, chunk_rows)
+
+    def col_payoffs_against(row_strategy):
+        if villain_matrix is None:
+            return -vecmat(row_strategy, hero_matrix, chunk_rows)
+        return vecmat(row_strategy, villain_matrix, chunk_rows)
+    is_hero_fixed = hero_fixed is not None
+    is_villain_fixed = villain_fixed is not None
+
+    start_iteration = 0
+    row_regrets = np.zeros(rows)
+    col_regrets = np.zeros(cols)
+    if warm_start is None:
+        row_avg = np.full(rows, 1.0 / rows)
+        col_avg = np.full(cols, 1.0 / cols)
+    elif isinstance(warm_start, dict):
+        row_avg = _normalized(warm_start["row_strategy"], rows)
+        col_avg = _normalized(warm_start["col_strategy"], cols)
+        start_iteration = warm_start.get("next_iteration", 0)
+        if "row_regrets" in warm_start:
+            row_regrets = np.array(warm_start["row_regrets"], dtype=float)
+            col_regrets = np.array(warm_start["col_regrets"], dtype=float)
+    else:
+        row_avg = _normalized(warm_start[0], rows)
+        col_avg = _normalized(warm_start[1], cols)
+        # Start the averaging schedule late, so the first iterations refine the warm start instead of replacing it
+        start_iteration = WARM_START_ITERATION if warm_start_iteration is None else warm_start_iteration
+    if method == "rm+" and not row_regrets.any() and not col_regrets.any() and warm_start is not None:
+        # Seed the regrets so that regret matching starts out playing the warm-start strategies
+        scale = max(np.ptp(hero_matrix), 0 if villain_matrix is None else np.ptp(villain_matrix), 1e-12)
+        row_regrets = row_avg * scale
+        col_regrets = col_avg * scale
+
+    if is_hero_fixed:
+        row_avg = _normalized(hero_fixed, rows)
+    if is_villain_fixed:
+        col_avg = _normalized(villain_fixed, cols)
+
+    history = {key: [] for key in ("iteration", "hero_utility", "villain_utility", "hero_exploitability", "villain_exploitability")}
+    converged_at_iteration = None
+
+    def record(t, hero_utility, villain_utility, hero_exploitability, villain_exploitability):
+        history["iteration"].append(t)
+        history["hero_utility"].append(hero_utility)
+        history["villain_utility"].append(villain_utility)
+        history["hero_exploitability"].append(hero_exploitability)
+        history["villain_exploitability"].append(villain_exploitability)
+        hero_converged = is_hero_fixed or hero_exploitability < convergence_threshold
+        villain_converged = is_villain_fixed or villain_exploitability < convergence_threshold
+        return hero_converged and villain_converged
+
+    # If both strategies are fixed, there is nothing to iterate: just evaluate them once.
+    loop_iterations = 1 if (is_hero_fixed and is_villain_fixed) else iterations
+    if warm_start is not None and not isinstance(warm_start, dict) and not (is_hero_fixed and is_villain_fixed):
+        # A strategy pair that already is an equilibrium is returned without iterating
+        if record(start_iteration, *exploitability(hero_matrix, villain_matrix, row_avg, col_avg, chunk_rows)):
+            converged_at_iteration = start_iteration
+            loop_iterations = 0
+    next_iteration = start_iteration
+    for i in range(loop_iterations):
+        t = start_iteration + i
+        next_iteration = t + 1
+        weight = 2 / (t + 2)
+
+        if not (is_hero_fixed and is_villain_fixed):
+            if method == "exponential_weights":
+                row_payoffs = row_payoffs_against(col_avg)
+                col_payoffs = col_payoffs_against(row_avg)
+                if not is_hero_fixed:
+                    row_avg = row_avg * (1 - weight) + _softmax(row_payoffs, learning_rate) * weight
+                if not is_villain_fixed:
+                    col_avg = col_avg * (1 - weight) + _softmax(col_payoffs, learning_rate) * weight
+            else:
+                # Alternating regret matching+: Hero updates first, Villain reacts to Hero's new strategy
+                row_current = row_avg if is_hero_fixed else regret_matching(row_regrets)
+                col_current = col_avg if is_villain_fixed else regret_matching(col_regrets)
+                if not is_hero_fixed:
+                    row_payoffs = row_payoffs_against(col_current)
+                    row_regrets = np.maximum(row_regrets + row_payoffs - row_current @ row_payoffs, 0)
+                    row_current = regret_matching(row_regrets)
+                    row_avg = row_avg * (1 - weight) + row_current * weight
+                if not is_villain_fixed:
+                    col_payoffs = col_payoffs_against(row_current)
+                    col_regrets = np.maximum(col_regrets + col_payoffs - col_payoffs @ col_current, 0)
+                    col_avg = col_avg * (1 - weight) + regret_matching(col_regrets) * weight
+
+        if i % check_every and i != loop_iterations - 1:
+            continue
+        converged = record(t, *exploitability(hero_matrix, villain_matrix, row_avg, col_avg, chunk_rows))
+
+        # Only the players that are not fixed need to converge
+        if converged and not (is_hero_fixed and is_villain_fixed):
+            converged_at_iteration = t
+            break
+
+    hero_utility, villain_utility, _, _ = exploitability(hero_matrix, villain_matrix, row_avg, col_avg, chunk_rows)
+    result = {
+        "row_strategy": row_avg,
+        "col_strategy": col_avg,
+        "hero_utility": hero_utility,
+        "villain_utility": villain_utility,
+        "convergence_history": {key: np.array(values) for key, values in history.items()},
+        "converged_at_iteration": converged_at_iteration,
+        "next_iteration": next_iteration,
+    }
+    if method == "rm+":
+        result["row_regrets"] = row_regrets
+        result["col_regrets"] = col_regrets
+    return result
+
+
+def _batched_matvec(matrices, vectors):
+    # (batch, rows, cols) @ (batch, cols) -> (batch, rows)
+    return np.matmul(matrices, vectors[..., None])[..., 0]
+
+
+def _batched_vecmat(vectors, matrices):
+    # (batch, rows) @ (batch, rows, cols) -> (batch, cols)
+    return np.matmul(vectors[:, None, :], matrices)[:, 0, :]
+
+
+def batched_exploitability(hero_matrices, villain_matrices, row_strategies, col_strategies):
+    """
+    Batched version of exploitability(): every returned value is an array of shape (batch,).
+    """
+    row_payoffs = _batched_matvec(hero_matrices, col_strategies)
+    col_payoffs = _batched_vecmat(row_strategies, villain_matrices)
+    hero_utility = np.einsum('br,br->b', row_strategies, row_payoffs)
+    villain_utility = np.einsum('bc,bc->b', col_payoffs, col_strategies)
+    return hero_utility, villain_utility, row_payoffs.max(axis=-1) - hero_utility, col_payoffs.max(axis=-1) - villain_utility
+
+
+def solve_games_batch(hero_matrices, villain_matrices, iterations=10000, learning_rate=0.005,
+                      convergence_threshold=0.001, method="exponential_weights", warm_start=None, check_every=1,
+                      warm_start_iteration=None):
+    """
+    Solves a stack of same-shape bimatrix games at once, with the same updates as solve_game.
+
+    Every game has its own convergence check: once both of its exploitabilities are below
+    the threshold, its strategies are frozen and it is dropped from the arrays that are
+    iterated on, so finished games stop costing work.
+
+    Args:
+        hero_matrices, villain_matrices: Payoffs of shape (batch, rows, cols).
+        iterations: Maximum number of iterations.
+        learning_rate: Softmax temperature of the exponential-weights method.
+        convergence_threshold: Per-game exploitability threshold.
+        method: "exponential_weights" or "rm+".
+        warm_start: Either a (row_strategies, col_strategies) pair of shapes (batch, rows)
+                    and (batch, cols) to start from (games already within the threshold are
+                    returned as they are), or the result of a previous solve_games_batch call
+                    on the same (or slightly changed) games, which resumes every game's
+                    averaging schedule and regrets.
+        check_every: Check convergence every this many iterations.
+        warm_start_iteration: Iteration at which the averaging schedule starts for a
+                              (row_strategies, col_strategies) warm start, as a number or one
+                              per game (default WARM_START_ITERATION, see solve_game).
+
+    Returns:
+        A dict of per-game arrays: "row_strategy" (batch, rows), "col_strategy" (batch, cols),
+        "hero_utility", "villain_utility", "hero_exploitability", "villain_exploitability",
+        "converged_at_iteration" (-1 for games that did not converge) and "next_iteration"
+        (where a warm-started solve resumes the schedule); with "rm+" also "row_regrets"
+        (batch, rows) and "col_regrets" (batch, cols).
+    """
+    if method not in ("exponential_weights", "rm+"):
+        raise ValueError(f"Unknown method {method!r}, expected 'exponential_weights' or 'rm+'")
+
+    hero_matrices = np.asarray(hero_matrices, dtype=float)
+    villain_matrices = np.asarray(villain_matrices, dtype=float)
+    if hero_matrices.ndim != 3 or hero_matrices.shape != villain_matrices.shape:
+        raise ValueError("Expected hero and villain matrices of the same shape (batch, rows, cols)")
+    batch, rows, cols = hero_matrices.shape
+
+    start_iterations = np.zeros(batch, dtype=int)
+    row_regrets, col_regrets = np.zeros((batch, rows)), np.zeros((batch, cols))
+    if warm_start is None:
+        row_strategies = np.full((batch, rows), 1.0 / rows)
+        col_strategies = np.full((batch, cols), 1.0 / cols)
+    else:
+        if isinstance(warm_start, dict):
+            row_strategies = np.array(warm_start["row_strategy"], dtype=float).reshape(batch, rows)
+            col_strategies = np.array(warm_start["col_strategy"], dtype=float).reshape(batch, cols)
+            start_iterations = np.broadcast_to(warm_start.get("next_iteration", 0), batch).astype(int)
+            if "row_regrets" in warm_start:
+                row_regrets = np.array(warm_start["row_regrets"], dtype=float).reshape(batch, rows)
+                col_regrets = np.array(warm_start["col_regrets"], dtype=float).reshape(batch, cols)
+        else:
+            row_strategies = np.array(warm_start[0], dtype=float).reshape(batch, rows)
+            col_strategies = np.array(warm_start[1], dtype=float).reshape(batch, cols)
+            # Start the averaging schedule late, so the first iterations refine the warm start instead of replacing it
+            offset = WARM_START_ITERATION if warm_start_iteration is None else warm_start_iteration
+            start_iterations = np.broadcast_to(offset, batch).astype(int)
+        row_strategies /= row_strategies.sum(axis=-1, keepdims=True)
+        col_strategies /= col_strategies.sum(axis=-1, keepdims=True)
+    if method == "rm+" and warm_start is not None and not row_regrets.any() and not col_regrets.any():
+        # Seed the regrets so that regret matching starts out playing the warm-start strategies
+        scale = np.maximum(np.ptp(hero_matrices, axis=(1, 2)), np.ptp(villain_matrices, axis=(1, 2)))[:, None]
+        row_regrets, col_regrets = row_strategies * scale, col_strategies * scale
+    converged_at_iteration = np.full(batch, -1)
+    next_iteration = start_iterations.copy()
+
+    # Working copies of the games that have not converged yet; `active` maps them back to the batch
+    active = np.arange(batch)
+    H, V, starts = hero_matrices, villain_matrices, start_iterations
+    row_avg, col_avg = row_strategies.copy(), col_strategies.copy()
+    row_current_regrets, col_current_regrets = row_regrets.copy(), col_regrets.copy()
+    if warm_start is not None and not isinstance(warm_start, dict):
+        # Strategy pairs that already are equilibria are returned without iterating
+        _, _, hero_exploitability, villain_exploitability = batched_exploitability(H, V, row_avg, col_avg)
+        done = (hero_exploitability < convergence_threshold) & (villain_exploitability < convergence_threshold)
+        converged_at_iteration[done] = starts[done]
+        keep = ~done
+        active, H, V, starts = active[keep], H[keep], V[keep], starts[keep]
+        row_avg, col_avg = row_avg[keep], col_avg[keep]
+        row_current_regrets, col_current_regrets = row_current_regrets[keep], col_current_regrets[keep]
+
+    for i in range(iterations if len(active) else 0):
+        weight = (2 / (starts + i + 2))[:, None]
+
+        if method == "exponential_weights":
+            row_payoffs = _batched_matvec(H, col_avg)
+            col_payoffs = _batched_vecmat(row_avg, V)
+            row_avg = row_avg * (1 - weight) + _softmax(row_payoffs, learning_rate) * weight
+            col_avg = col_avg * (1 - weight) + _softmax(col_payoffs, learning_rate) * weight
+        else:
+            row_current = regret_matching(row_current_regrets)
+            col_current = regret_matching(col_current_regrets)
+            row_payoffs = _batched_matvec(H, col_current)
+            row_current_regrets = np.maximum(
+                row_current_regrets + row_payoffs - np.einsum('br,br->b', row_current, row_payoffs)[:, None], 0)
+            row_current = regret_matching(row_current_regrets)
+            row_avg = row_avg * (1 - weight) + row_current * weight
+            col_payoffs = _batched_vecmat(row_current, V)
+            col_current_regrets = np.maximum(
+                col_current_regrets + col_payoffs - np.einsum('bc,bc->b', col_payoffs, col_current)[:, None], 0)
+            col_avg = col_avg * (1 - weight) + regret_matching(col_current_regrets) * weight
+
+        if i % check_every and i != iterations - 1:
+            continue
+        _, _, hero_exploitability, villain_exploitability = batched_exploitability(H, V, row_avg, col_avg)
+        done = (hero_exploitability < convergence_threshold) & (villain_exploitability < convergence_threshold)
+        if i == iterations - 1:
+            row_strategies[active], col_strategies[active] = row_avg, col_avg
+            row_regrets[active], col_regrets[active] = row_current_regrets, col_current_regrets
+            next_iteration[active] = starts + i + 1
+        if not done.any():
+            continue
+
+        # Freeze the converged games and compact the working arrays
+        finished = active[done]
+        row_strategies[finished], col_strategies[finished] = row_avg[done], col_avg[done]
+        row_regrets[finished], col_regrets[finished] = row_current_regrets[done], col_current_regrets[done]
+        converged_at_iteration[finished] = starts[done] + i
+        next_iteration[finished] = starts[done] + i + 1
+        keep = ~done
+        active = active[keep]
+        if not len(active):
+            break
+        H, V, starts = H[keep], V[keep], starts[keep]
+        row_avg, col_avg = row_avg[keep], col_avg[keep]
+        row_current_regrets, col_current_regrets = row_current_regrets[keep], col_current_regrets[keep]
+
+    hero_utility, villain_utility, hero_exploitability, villain_exploitability = \
+        batched_exploitability(hero_matrices, villain_matrices, row_strategies, col_strategies)
+    result = {
+        "row_strategy": row_strategies,
+        "col_strategy": col_strategies,
+        "hero_utility": hero_utility,
+        "villain_utility": villain_utility,
+        "hero_exploitability": hero_exploitability,
+        "villain_exploitability": villain_exploitability,
+        "converged_at_iteration": converged_at_iteration,
+        "next_iteration": next_iteration,
+    }
+    if method == "rm+":
+        result["row_regrets"] = row_regrets
+        result["col_regrets"] = col_regrets
+    return result
+
+
+def solve_game_lp(hero_matrix, villain_matrix=None, tolerance=1e-9):
+    """
+    Solves the game with nashpy's linear program, for cross-checking the iterative
+    solvers. Only valid for constant-sum games (villain_matrix == -hero_matrix, up to a
+    constant), like the shifted matrix in initial_game.py; villain_matrix=None means
+    -hero_matrix.
+
+    Raises:
+        ValueError: If hero_matrix + villain_matrix varies by more than `tolerance` times
+                    the largest absolute payoff.
+    """
+    import nashpy as nash  # optional dependency, only needed for this path
+
+    hero_matrix = np.asarray(hero_matrix, dtype=float)
+    villain_matrix = -hero_matrix if villain_matrix is None else np.asarray(villain_matrix, dtype=float)
+    total = hero_matrix + villain_matrix
+    scale = max(np.abs(hero_matrix).max(initial=0), np.abs(villain_matrix).max(initial=0), 1.0)
+    if total.size and np.ptp(total) > tolerance * scale:
+        raise ValueError(f"The LP solver needs a constant-sum game, hero_matrix + villain_matrix varies by {np.ptp(total):.3g}")
+    row_strategy, col_strategy = nash.Game(hero_matrix, -hero_matrix).linear_program()
+    hero_utility, villain_utility, hero_exploitability, villain_exploitability = \
+        exploitability(hero_matrix, villain_matrix, row_strategy, col_strategy)
+    return {
+        "row_strategy": row_strategy,
+        "col_strategy": col_strategy,
+        "hero_utility": hero_utility,
+        "villain_utility": villain_utility,
+        "convergence_history": {
+            "iteration": np.array([0]),
+            "hero_utility": np.array([hero_utility]),
+            "villain_utility": np.array([villain_utility]),
+            "hero_exploitability": np.array([hero_exploitability]),
+            "villain_exploitability": np.array([villain_exploitability]),
+        },
+        "converged_at_iteration": 0,
+        "next_iteration": 0,
+    }
+
+
+if __name__ == "__main__":
+    import time
+
+    from game_matrix import build_payoff_matrices
+
+    game = build_payoff_matrices(
+        pot=10, hero_bet=0.5, hero_raise=0.5, hero_3bet=0.5, villain_bet=0.5, villain_raise=0.5,
+        hero_ranges=[1, 1, 1], villain_ranges=[1, 1, 1],
+        equities=[[0.5, 0.3, 0.2], [0.7, 0.5, 0.3], [0.8, 0.7, 0.5]], max_actions=4,
+    )
+    hero_matrix, villain_matrix = game["hero_matrix"], game["villain_matrix"]
+    print(f"Matrix shape: {hero_matrix.shape}")
+
+    for method in ("exponential_weights", "rm+"):
+        start = time.perf_counter()
+        result = solve_game(hero_matrix, villain_matrix, iterations=5000, method=method, convergence_threshold=0.01)
+        elapsed = time.perf_counter() - start
+        print(f"{method:20s} value {result['hero_utility']:.4f}, converged at {result['converged_at_iteration']}, {elapsed:.2f} s")
+
+    # Warm start: change the pot slightly and resume from the previous equilibrium
+    changed = build_payoff_matrices(
+        pot=11, hero_bet=0.5, hero_raise=0.5, hero_3bet=0.5, villain_bet=0.5, villain_raise=0.5,
+        hero_ranges=[1, 1, 1], villain_ranges=[1, 1, 1],
+        equities=[[0.5, 0.3, 0.2], [0.7, 0.5, 0.3], [0.8, 0.7, 0.5]], max_actions=4,
+    )
+    cold = solve_game(changed["hero_matrix"], changed["villain_matrix"], iterations=5000, method="rm+", convergence_threshold=0.01)
+    warm = solve_game(changed["hero_matrix"], changed["villain_matrix"], iterations=5000, method="rm+", convergence_threshold=0.01, warm_start=result)
+    print(f"Re-solve after pot change: cold start {cold['converged_at_iteration']} iterations, "
+          f"warm start {warm['converged_at_iteration'] - result['next_iteration'] + 1} iterations")
+
+    # A strategy pair warm start: from the equilibrium of the same game, a re-solve converges at the first
+    # check; after the pot change it resumes from the pair, for either method
+    for method in ("exponential_weights", "rm+"):
+        solved = solve_game(hero_matrix, villain_matrix, iterations=5000, method=method, convergence_threshold=0.01)
+        pair = (solved["row_strategy"], solved["col_strategy"])
+        same = solve_game(hero_matrix, villain_matrix, iterations=5000, method=method, convergence_threshold=0.01, warm_start=pair)
+        assert same["converged_at_iteration"] == same["convergence_history"]["iteration"][0], "warm start was not kept"
+        cold = solve_game(changed["hero_matrix"], changed["villain_matrix"], iterations=5000, method=method, convergence_threshold=0.01)
+        warm = solve_game(changed["hero_matrix"], changed["villain_matrix"], iterations=5000, method=method,
+                          convergence_threshold=0.01, warm_start=pair)
+        print(f"{method:20s} from the equilibrium: converged at the first check; after the pot change: "
+              f"cold {cold['converged_at_iteration']}, warm {warm['converged_at_iteration'] - WARM_START_ITERATION} iterations")
+
+    lp = solve_game_lp(hero_matrix - 5, villain_matrix - 5)
+    print(f"LP value {lp['hero_utility'] + 5:.4f}")
+
+    # Many small spots at once: one 6x12 game per pot size / equity
+    pots = np.linspace(2, 20, 25)
+    pwins = np.linspace(0.05, 0.95, 40)
+    games = [build_payoff_matrices(pot=pot, hero_bet=0.5, hero_raise=1, hero_3bet=1, villain_bet=0.5, villain_raise=1,
+                                   hero_ranges=[1], villain_ranges=[1], equities=[[pwin]], max_actions=4)
+             for pot in pots for pwin in pwins]
+    hero_matrices = np.stack([game["hero_matrix"] for game in games])
+    villain_matrices = np.stack([game["villain_matrix"] for game in games])
+
+    start = time.perf_counter()
+    batch_result = solve_games_batch(hero_matrices, villain_matrices, iterations=10000, method="rm+")
+    elapsed = time.perf_counter() - start
+    print(f"Batch of {len(games)} games: {elapsed:.2f} s, "
+          f"{np.sum(batch_result['converged_at_iteration'] >= 0)} converged, "
+          f"max exploitability {batch_result['hero_exploitability'].max():.2e}")
+
+    # Resume the batch after a small pot change, from the strategy pairs and from the previous result
+    shifted = [build_payoff_matrices(pot=pot + 0.5, hero_bet=0.5, hero_raise=1, hero_3bet=1, villain_bet=0.5,
+                                     villain_raise=1, hero_ranges=[1], villain_ranges=[1], equities=[[pwin]],
+                                     max_actions=4)
+               for pot in pots for pwin in pwins]
+    shifted_hero = np.stack([game["hero_matrix"] for game in shifted])
+    shifted_villain = np.stack([game["villain_matrix"] for game in shifted])
+    cold = solve_games_batch(shifted_hero, shifted_villain, iterations=10000, method="rm+")
+    pair = solve_games_batch(shifted_hero, shifted_villain, iterations=10000, method="rm+",
+                             warm_start=(batch_result["row_strategy"], batch_result["col_strategy"]))
+    resumed = solve_games_batch(shifted_hero, shifted_villain, iterations=10000, method="rm+", warm_start=batch_result)
+    print(f"Batch re-solve after pot change: mean iterations cold {cold['next_iteration'].mean():.0f}, "
+          f"from the pairs {(pair['next_iteration'] - WARM_START_ITERATION).mean():.0f}, "
+          f"resumed {(resumed['next_iteration'] - batch_result['next_iteration']).mean():.0f}")
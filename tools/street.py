@@ -2,53 +2,113 @@ import numpy as np
 import matplotlib.pyplot as plt
 import pandas as pd
 
+from bayes import posterior, posterior_backward
+from pot_model import pot_model_gradient
+from profiling import count, profiled, profiled_callable, stage
+from results import to_records
+
 # we consider 4 various bet sizes: 0, 1/2 pot, 1 pot, jam
 # for each scenario:
 # 1. estimate villain bet size
 # 2. update priors after each villain action (call/check or raise)
 # 3. compute EV of fold, call, raise in case of villain raise, pick the max
 # 4. pick the action with the highest EV
+#
+# f_batch(..., gradient=True) also returns the exact gradient of the overall EV with respect to
+# every input, by a reverse pass over the same intermediates (three pot model gradient calls and
+# no extra posterior updates), for gradient-based fitting of likelihoods and sizing. The max in
+# step 2 contributes the gradient of the action it picks (a subgradient at ties); with a
+# `temperature` it is replaced by the smooth maximum temperature * logsumexp(EVs / temperature),
+# whose gradient weighs the three responses by their softmax.
+
+GRADIENT_KEYS = ("pot", "size_hero_bet", "size_villain_raise", "size_hero_reraise", "priors",
+                 "likelihood_fold_to_hero_bet", "likelihood_call_to_hero_bet", "likelihood_raise_to_hero_bet",
+                 "likelihood_villain_calls_hero_reraise")
+
+
+@profiled("street.f_batch")
+def f_batch(pot_model, pot, size_hero_bet, size_villain_raise, size_hero_reraise, priors, likelihood_fold, likelihood_call, likelihood_raise, likelihood_reraise_call, out=None,
+            gradient=False, temperature=None):
+    """
+    Vectorized version of `f` that evaluates a whole grid of spots in one NumPy pass.
+
+    Scalars (pot and the three sizes) may be arrays of any shape, and the prior and
+    likelihood vectors may carry leading batch dimensions in front of the hand-class
+    axis (the last axis). Everything is broadcast to a common batch shape, e.g.
+    `size_hero_bet=np.array([0, 0.5, 1.0])[:, None] * pot` against a stack of
+    likelihood vectors of shape (n_profiles, n_hands) yields results of shape
+    (3, n_profiles).
+
+    `pot_model(pot, distribution)` is called three times in total (not per spot), with
+    `pot` of the batch shape and `distribution` of the batch shape + (n_hands,), so it
+    must reduce over the last axis only (e.g. `np.sum(..., axis=-1)`).
+
+    With `gradient`, the result gets a 'gradient' section: the derivative of
+    `overall_ev_hero_action` with respect to each input (keyed like 'inputs', see GRADIENT_KEYS),
+    of the batch shape for scalars and of the batch shape + (n_hands,) for vectors. The pot
+    model then needs a gradient (see pot_model.pot_model_gradient). A `temperature` smooths the
+    max over Hero's responses in step 2 (in the EVs as well as in the gradient).
+
+    Returns:
+        The same nested dict as `f`, with every value an array of the batch shape
+        (posteriors carry the extra hand-class axis, optimal actions are 'f'/'c'/'r').
+        If `out` is given (a structured array from `results.empty_records` of the batch
+        shape), every value is written into its column instead and `out` is returned.
+    """
+    if gradient and out is not None:
+        raise ValueError("Records have no gradient columns, pass either out or gradient")
+    pot, size_hero_bet, size_villain_raise, size_hero_reraise = (
+        np.asarray(x, dtype=float) for x in (pot, size_hero_bet, size_villain_raise, size_hero_reraise)
+    )
+    priors, likelihood_fold, likelihood_call, likelihood_raise, likelihood_reraise_call = (
+        np.asarray(x, dtype=float) for x in (priors, likelihood_fold, likelihood_call, likelihood_raise, likelihood_reraise_call)
+    )
+    vectors = (priors, likelihood_fold, likelihood_call, likelihood_raise, likelihood_reraise_call)
+    batch_shape = np.broadcast_shapes(
+        pot.shape, size_hero_bet.shape, size_villain_raise.shape, size_hero_reraise.shape,
+        *(v.shape[:-1] for v in vectors)
+    )
+    vector_shape = batch_shape + (priors.shape[-1],)
+    pot, size_hero_bet, size_villain_raise, size_hero_reraise = (
+        np.broadcast_to(x, batch_shape) for x in (pot, size_hero_bet, size_villain_raise, size_hero_reraise)
+    )
+    priors_b, likelihood_fold_b, likelihood_call_b, likelihood_raise_b, likelihood_reraise_call_b = (
+        np.broadcast_to(v, vector_shape) for v in vectors
+    )
+    count("street.spots", int(np.prod(batch_shape)))
+    if gradient:
+        pot_model_grad = profiled_callable(pot_model_gradient(pot_model, priors.shape[-1]), "pot_model.gradient")
+    pot_model = profiled_callable(pot_model, "pot_model")
 
-def f(pot_model, pot, size_hero_bet, size_villain_raise, size_hero_reraise, priors, likelihood_fold, likelihood_call, likelihood_raise, likelihood_reraise_call):
     results = {}
-
-    # Store inputs
     results['inputs'] = {
         "pot": pot,
         "size_hero_bet": size_hero_bet,
-        "size_villain_raise": size_villain_raise, # Villain's raise amount over Hero's bet, or V's bet size if H checked
-        "size_hero_reraise": size_hero_reraise, # Hero's additional reraise amount
+        "size_villain_raise": size_villain_raise,
+        "size_hero_reraise": size_hero_reraise,
         "priors": priors,
-        "likelihood_fold_to_hero_bet": likelihood_fold,     # P(V Folds | V Hand, H action)
-        "likelihood_call_to_hero_bet": likelihood_call,     # P(V Calls | V Hand, H action)
-        "likelihood_raise_to_hero_bet": likelihood_raise,   # P(V Raises | V Hand, H action)
-        "likelihood_villain_calls_hero_reraise": likelihood_reraise_call # P(V calls H's RR | V Hand, V raised, H RR'd)
+        "likelihood_fold_to_hero_bet": likelihood_fold,
+        "likelihood_call_to_hero_bet": likelihood_call,
+        "likelihood_raise_to_hero_bet": likelihood_raise,
+        "likelihood_villain_calls_hero_reraise": likelihood_reraise_call
     }
 
     # Compute posteriors
-    # P(Villain hand | Villain calls Hero's initial action)
-    posteriors_villain_calls_hero_bet = priors * likelihood_call
-    if posteriors_villain_calls_hero_bet.sum() > 0:
-        posteriors_villain_calls_hero_bet /= posteriors_villain_calls_hero_bet.sum()
-    else:
-        posteriors_villain_calls_hero_bet = np.zeros_like(priors)
-
+    # One batched Bayes update for Villain's fold / call / raise, the probabilities of the responses come along
+    # P(Villain hand | Villain folds / calls / raises Hero's initial action)
+    with stage("posteriors"):
+        response_posteriors, response_probs = posterior(
+            priors_b, np.stack([likelihood_fold_b, likelihood_call_b, likelihood_raise_b])
+        )
+        posteriors_villain_calls_hero_bet = response_posteriors[1]
+        posteriors_villain_raises_hero_bet = response_posteriors[2]
+
+        # P(Villain hand | Villain calls Hero's reraise, GIVEN Villain had raised Hero's initial action)
+        # This posterior is based on Villain's range that would raise Hero's bet/check.
+        posteriors_villain_calls_hero_reraise_after_villain_raise, prob_villain_calls_hero_reraise = posterior(
+            posteriors_villain_raises_hero_bet, likelihood_reraise_call_b
+        )
 
-    # P(Villain hand | Villain raises Hero's initial action)
-    posteriors_villain_raises_hero_bet = priors * likelihood_raise
-    if posteriors_villain_raises_hero_bet.sum() > 0:
-        posteriors_villain_raises_hero_bet /= posteriors_villain_raises_hero_bet.sum()
-    else:
-        posteriors_villain_raises_hero_bet = np.zeros_like(priors)
-
-    # P(Villain hand | Villain calls Hero's reraise, GIVEN Villain had raised Hero's initial action)
-    # This posterior is based on Villain's range that would raise Hero's bet/check.
-    posteriors_villain_calls_hero_reraise_after_villain_raise = posteriors_villain_raises_hero_bet * likelihood_reraise_call
-    if posteriors_villain_calls_hero_reraise_after_villain_raise.sum() > 0:
-        posteriors_villain_calls_hero_reraise_after_villain_raise /= posteriors_villain_calls_hero_reraise_after_villain_raise.sum()
-    else:
-        posteriors_villain_calls_hero_reraise_after_villain_raise = np.zeros_like(priors)
-        
     results['posteriors'] = {
         "villain_hand_if_villain_calls_hero_action": posteriors_villain_calls_hero_bet,
         "villain_hand_if_villain_raises_hero_action": posteriors_villain_raises_hero_bet,
@@ -61,28 +121,24 @@ def f(pot_model, pot, size_hero_bet, size_villain_raise, size_hero_reraise, prio
     # EV if Hero folds to Villain's bet/raise: Hero loses their initial bet if any.
     # This EV is relative to the decision point *after* Villain has bet/raised.
     # If Hero folds, the outcome for this branch of decision is 0 additional gain/loss.
-    ev_hero_folds_to_villain_raise = 0
+    ev_hero_folds_to_villain_raise = np.zeros(batch_shape)
 
     # EV if Hero calls Villain's bet/raise
     # Pot at showdown: initial_pot + 2*size_hero_bet (if any from H's bet and V's call of it) + 2*size_villain_raise (V's raise + H's call of it)
     # Cost for Hero to call at this point: size_villain_raise
-    # Correction 1: Use posteriors_villain_raises_hero_bet
     pot_if_hero_calls_villain_raise = pot + 2 * size_hero_bet + 2 * size_villain_raise
     ev_hero_calls_villain_raise = pot_model(pot_if_hero_calls_villain_raise, posteriors_villain_raises_hero_bet) - size_villain_raise
 
     # EV if Hero reraises Villain's bet/raise
-    # P(Villain calls Hero's reraise | Villain raised Hero's action, Hero reraises)
-    # This probability is against Villain's range that raised Hero's action.
-    prob_villain_calls_hero_reraise = np.sum(posteriors_villain_raises_hero_bet * likelihood_reraise_call)
-    
+    # P(Villain calls Hero's reraise | Villain raised Hero's action, Hero reraises) is prob_villain_calls_hero_reraise,
+    # computed above against Villain's range that raised Hero's action.
+
     # Gross pot won if Villain folds to Hero's reraise:
     # Pot before Hero's reraise = initial_pot + size_hero_bet (H) + size_hero_bet (V call H's bet) + size_villain_raise (V raise)
-    # Correction 2: This is the gross pot won.
     ev_villain_folds_to_hero_reraise = pot + 2 * size_hero_bet + size_villain_raise
-    
+
     # Gross EV if Villain calls Hero's reraise (showdown):
     # Pot at showdown: initial_pot + 2*size_hero_bet + 2*(size_villain_raise + size_hero_reraise)
-    # Correction 3: Use posteriors_villain_calls_hero_reraise_after_villain_raise
     pot_if_villain_calls_hero_reraise = pot + 2 * size_hero_bet + 2 * (size_villain_raise + size_hero_reraise)
     ev_showdown_if_villain_calls_hero_reraise = pot_model(pot_if_villain_calls_hero_reraise, posteriors_villain_calls_hero_reraise_after_villain_raise)
 
@@ -94,61 +150,161 @@ def f(pot_model, pot, size_hero_bet, size_villain_raise, size_hero_reraise, prio
         prob_villain_calls_hero_reraise * ev_showdown_if_villain_calls_hero_reraise - \
         cost_hero_reraise_action
 
-    step2_evs = [ev_hero_folds_to_villain_raise, ev_hero_calls_villain_raise, ev_hero_reraises_villain_raise]
-    hero_action_vs_villain_raise = ['f', 'c', 'r'][np.argmax(step2_evs)]
+    step2_evs = np.stack(np.broadcast_arrays(ev_hero_folds_to_villain_raise, ev_hero_calls_villain_raise, ev_hero_reraises_villain_raise))
     # ev_hero_responds_to_villain_raise is the net EV from this decision point forward if Villain has bet/raised.
-    ev_hero_responds_to_villain_raise = np.max(step2_evs)
+    optimal_action_index = np.argmax(step2_evs, axis=0)
+    if temperature is None:
+        ev_hero_responds_to_villain_raise = np.take_along_axis(step2_evs, optimal_action_index[None], axis=0)[0]
+    else:
+        # Smooth maximum, shifted by the max for stability; its gradient is the softmax
+        best = np.take_along_axis(step2_evs, optimal_action_index[None], axis=0)[0]
+        exponentials = np.exp((step2_evs - best) / temperature)
+        ev_hero_responds_to_villain_raise = best + temperature * np.log(exponentials.sum(axis=0))
 
     results['step2_hero_faces_villain_bet_or_raise'] = {
         "ev_fold": ev_hero_folds_to_villain_raise,
-        "ev_call": ev_hero_calls_villain_raise,
-        "ev_reraise": ev_hero_reraises_villain_raise,
+        "ev_call": step2_evs[1],
+        "ev_reraise": step2_evs[2],
         "prob_villain_calls_hero_reraise": prob_villain_calls_hero_reraise,
-        "optimal_action": hero_action_vs_villain_raise,
+        "optimal_action": np.array(['f', 'c', 'r'])[optimal_action_index],
         "ev_optimal_action_if_villain_raises": ev_hero_responds_to_villain_raise
     }
 
     # Step 1: Hero's initial action (bet size_hero_bet, or check if size_hero_bet=0)
-    
+
     # Gross EV if Villain folds to Hero's initial action: Hero wins current pot
     ev_villain_folds_to_hero_action = pot
 
     # Gross EV if Villain calls Hero's initial action:
     # Pot at showdown: initial_pot + 2*size_hero_bet
-    # Correction 4: Use posteriors_villain_calls_hero_bet
     pot_if_villain_calls_hero_action = pot + 2 * size_hero_bet
     ev_villain_calls_hero_action = pot_model(pot_if_villain_calls_hero_action, posteriors_villain_calls_hero_bet)
 
     # Probabilities of Villain's responses to Hero's initial action (based on priors)
-    prob_villain_folds_vs_hero_action = np.sum(priors * likelihood_fold)
-    prob_villain_calls_vs_hero_action = np.sum(priors * likelihood_call)
-    prob_villain_raises_vs_hero_action = np.sum(priors * likelihood_raise)
-    
+    prob_villain_folds_vs_hero_action, prob_villain_calls_vs_hero_action, prob_villain_raises_vs_hero_action = response_probs
+
     # Net EV of Hero's initial action:
-    # Sum of [P(V_response) * GrossOutcome_if_V_response] - Cost_of_Hero_Initial_Action
-    # GrossOutcome_if_V_folds = pot
-    # GrossOutcome_if_V_calls = ev_villain_calls_hero_action (this is already a gross EV from showdown)
-    # GrossOutcome_if_V_raises = ev_hero_responds_to_villain_raise (this is already a net EV from that sub-branch,
-    #                                                              relative to the point after V raised)
-    
+    # Sum of [P(V_response) * GrossOutcome_if_V_response] - Cost_of_Hero_Initial_Action (the bet itself, if any)
     ev_hero_initial_action = \
         (prob_villain_folds_vs_hero_action * ev_villain_folds_to_hero_action) + \
         (prob_villain_calls_vs_hero_action * ev_villain_calls_hero_action) + \
-        (prob_villain_raises_vs_hero_action * ev_hero_responds_to_villain_raise)
-    
-    # Subtract the cost of Hero's initial action (the bet itself)
-    if size_hero_bet > 0:
-        ev_hero_initial_action -= size_hero_bet
-    
+        (prob_villain_raises_vs_hero_action * ev_hero_responds_to_villain_raise) - \
+        np.where(size_hero_bet > 0, size_hero_bet, 0)
+
     results['step1_hero_initial_action'] = {
         "prob_villain_folds_to_hero_action": prob_villain_folds_vs_hero_action,
         "prob_villain_calls_hero_action": prob_villain_calls_vs_hero_action,
         "prob_villain_raises_to_hero_action": prob_villain_raises_vs_hero_action,
-        "ev_if_villain_folds_to_hero_action": ev_villain_folds_to_hero_action, # Gross EV before subtracting initial bet cost
-        "ev_if_villain_calls_hero_action": ev_villain_calls_hero_action,     # Gross EV before subtracting initial bet cost
-        "ev_if_villain_raises_hero_responds_optimally": ev_hero_responds_to_villain_raise, # Net EV from this branch point
-        "overall_ev_hero_action": ev_hero_initial_action # Net EV of making the bet/check
+        "ev_if_villain_folds_to_hero_action": ev_villain_folds_to_hero_action,
+        "ev_if_villain_calls_hero_action": ev_villain_calls_hero_action,
+        "ev_if_villain_raises_hero_responds_optimally": ev_hero_responds_to_villain_raise,
+        "overall_ev_hero_action": ev_hero_initial_action
     }
+
+    if gradient:
+        with stage("gradient"):
+            # Reverse pass: d_x is d overall_ev_hero_action / d x
+            # Step 1: EV = P(fold) * pot + P(call) * EV(call) + P(raise) * EV(step 2) - bet
+            d_pot = prob_villain_folds_vs_hero_action.copy()
+            d_size_hero_bet = -(size_hero_bet > 0).astype(float)
+            d_size_villain_raise = np.zeros(batch_shape)
+            d_size_hero_reraise = np.zeros(batch_shape)
+            d_response_probs = np.stack(np.broadcast_arrays(
+                ev_villain_folds_to_hero_action, ev_villain_calls_hero_action, ev_hero_responds_to_villain_raise))
+
+            d_showdown_pot, d_posteriors_villain_calls_hero_bet = pot_model_grad(
+                pot_if_villain_calls_hero_action, posteriors_villain_calls_hero_bet)
+            d_showdown_pot = prob_villain_calls_vs_hero_action * d_showdown_pot
+            d_posteriors_villain_calls_hero_bet = prob_villain_calls_vs_hero_action[..., None] * d_posteriors_villain_calls_hero_bet
+            d_pot += d_showdown_pot
+            d_size_hero_bet += 2 * d_showdown_pot
+
+            # Step 2: the max (or smooth max) passes its gradient to the responses by their weights
+            if temperature is None:
+                weights = (np.arange(3).reshape((3,) + (1,) * len(batch_shape)) == optimal_action_index).astype(float)
+            else:
+                weights = exponentials / exponentials.sum(axis=0)
+            d_ev_call, d_ev_reraise = prob_villain_raises_vs_hero_action * weights[1:]
+
+            # Call: pot_model(pot + 2 * bet + 2 * raise, raise posterior) - raise
+            d_showdown_pot, d_posteriors_villain_raises_hero_bet = pot_model_grad(
+                pot_if_hero_calls_villain_raise, posteriors_villain_raises_hero_bet)
+            d_showdown_pot = d_ev_call * d_showdown_pot
+            d_posteriors_villain_raises_hero_bet = d_ev_call[..., None] * d_posteriors_villain_raises_hero_bet
+            d_pot += d_showdown_pot
+            d_size_hero_bet += 2 * d_showdown_pot
+            d_size_villain_raise += 2 * d_showdown_pot - d_ev_call
+
+            # Reraise: (1 - P(call)) * (pot + 2 * bet + raise) + P(call) * pot_model(showdown pot, call posterior)
+            # - raise - reraise
+            d_fold_pot = d_ev_reraise * (1 - prob_villain_calls_hero_reraise)
+            d_pot += d_fold_pot
+            d_size_hero_bet += 2 * d_fold_pot
+            d_size_villain_raise += d_fold_pot - d_ev_reraise
+            d_size_hero_reraise -= d_ev_reraise
+            d_showdown_pot, d_posteriors_villain_calls_hero_reraise = pot_model_grad(
+                pot_if_villain_calls_hero_reraise, posteriors_villain_calls_hero_reraise_after_villain_raise)
+            d_showdown_pot = d_ev_reraise * prob_villain_calls_hero_reraise * d_showdown_pot
+            d_posteriors_villain_calls_hero_reraise = \
+                (d_ev_reraise * prob_villain_calls_hero_reraise)[..., None] * d_posteriors_villain_calls_hero_reraise
+            d_pot += d_showdown_pot
+            d_size_hero_bet += 2 * d_showdown_pot
+            d_size_villain_raise += 2 * d_showdown_pot
+            d_size_hero_reraise += 2 * d_showdown_pot
+            d_prob_villain_calls_hero_reraise = d_ev_reraise * (ev_showdown_if_villain_calls_hero_reraise - ev_villain_folds_to_hero_reraise)
+
+            # Posteriors: the reraise update is chained on the raise posterior, then the three responses
+            d_joint = posterior_backward(posteriors_villain_calls_hero_reraise_after_villain_raise,
+                                         prob_villain_calls_hero_reraise, d_posteriors_villain_calls_hero_reraise,
+                                         d_prob_villain_calls_hero_reraise)
+            d_likelihood_reraise_call = d_joint * posteriors_villain_raises_hero_bet
+            d_posteriors_villain_raises_hero_bet += d_joint * likelihood_reraise_call_b
+
+            d_response_posteriors = np.zeros(response_posteriors.shape)
+            d_response_posteriors[1] = d_posteriors_villain_calls_hero_bet
+            d_response_posteriors[2] = d_posteriors_villain_raises_hero_bet
+            d_joint = posterior_backward(response_posteriors, response_probs, d_response_posteriors, d_response_probs)
+            response_likelihoods = (likelihood_fold_b, likelihood_call_b, likelihood_raise_b)
+            d_priors = sum(d_joint[k] * likelihood for k, likelihood in enumerate(response_likelihoods))
+            d_likelihood_fold, d_likelihood_call, d_likelihood_raise = d_joint * priors_b
+
+        results['gradient'] = dict(zip(GRADIENT_KEYS, (
+            d_pot, d_size_hero_bet, d_size_villain_raise, d_size_hero_reraise, d_priors,
+            d_likelihood_fold, d_likelihood_call, d_likelihood_raise, d_likelihood_reraise_call
+        )))
+
+    if out is not None:
+        with stage("records"):
+            return to_records(results, out)
+    return results
+
+
+@profiled("street.f")
+def f(pot_model, pot, size_hero_bet, size_villain_raise, size_hero_reraise, priors, likelihood_fold, likelihood_call, likelihood_raise, likelihood_reraise_call,
+      gradient=False, temperature=None):
+    """
+    Evaluates a single spot. Thin wrapper around `f_batch` with scalar sizes and
+    1-d prior/likelihood vectors; see `f_batch` for the model itself and for `gradient`.
+    """
+    batch = f_batch(pot_model, pot, size_hero_bet, size_villain_raise, size_hero_reraise, priors, likelihood_fold, likelihood_call, likelihood_raise, likelihood_reraise_call,
+                    gradient=gradient, temperature=temperature)
+
+    # Unwrap the 0-d arrays into scalars, keeping the original inputs as passed
+    results = {"inputs": {
+        "pot": pot,
+        "size_hero_bet": size_hero_bet,
+        "size_villain_raise": size_villain_raise, # Villain's raise amount over Hero's bet, or V's bet size if H checked
+        "size_hero_reraise": size_hero_reraise, # Hero's additional reraise amount
+        "priors": priors,
+        "likelihood_fold_to_hero_bet": likelihood_fold,     # P(V Folds | V Hand, H action)
+        "likelihood_call_to_hero_bet": likelihood_call,     # P(V Calls | V Hand, H action)
+        "likelihood_raise_to_hero_bet": likelihood_raise,   # P(V Raises | V Hand, H action)
+        "likelihood_villain_calls_hero_reraise": likelihood_reraise_call # P(V calls H's RR | V Hand, V raised, H RR'd)
+    }}
+    for section, values in batch.items():
+        if section != 'inputs':
+            results[section] = {key: np.asarray(value)[()] for key, value in values.items()}
+    results['step2_hero_faces_villain_bet_or_raise']['optimal_action'] = str(results['step2_hero_faces_villain_bet_or_raise']['optimal_action'])
     return results
 
 
@@ -198,7 +354,7 @@ if __name__ == '__main__':
         ])
         expected_hero_eq_vs_villain_type = prob_board_favors_hero * hero_eqs_vs_villain_types[0,:] + \
                                            (1 - prob_board_favors_hero) * hero_eqs_vs_villain_types[1,:]
-        hero_overall_equity_share = np.sum(opponent_hand_distribution * expected_hero_eq_vs_villain_type)
+        hero_overall_equity_share = np.sum(opponent_hand_distribution * expected_hero_eq_vs_villain_type, axis=-1)
         return current_pot_at_showdown * hero_overall_equity_share
 
     print("--- Analysis for Hero Checking (size_hero_bet = 0) ---")
@@ -291,3 +447,48 @@ if __name__ == '__main__':
     )
     
     print_results(results_bet_scenario, "Hero Bets 150;")
+
+    # --- Sizing sweep: 0 / 1/2 pot / pot / jam in one vectorized pass ---
+    # Every size shares the bet-scenario likelihoods here; in practice they would be stacked per size.
+    # pot_model_func is linear in the posterior, so it is reduced to a single equity vector.
+    from pot_model import memoize_pot_model
+    sweep_pot_model = memoize_pot_model(pot_model_func, num_types=len(priors))
+    stack = 1500
+    hero_bet_sizes = np.array([0, pot / 2, pot, stack])
+    results_sweep = f_batch(
+        sweep_pot_model, pot,
+        hero_bet_sizes,
+        villain_raise_over_hero_bet,
+        hero_reraise_amount_val,
+        priors,
+        lh_V_folds_to_H_bet,
+        lh_V_calls_H_bet,
+        lh_V_raises_H_bet,
+        lh_V_calls_H_bet_reraise
+    )
+    print("\n\n--- Sizing sweep ---")
+    for size, ev, action in zip(hero_bet_sizes,
+                                results_sweep['step1_hero_initial_action']['overall_ev_hero_action'],
+                                results_sweep['step2_hero_faces_villain_bet_or_raise']['optimal_action']):
+        print(f"Hero bets {size:7.1f}: Net EV {ev:8.3f}, response to raise: {action}")
+
+    # --- Exact gradient of the EV vs central differences, for the bet scenario ---
+    # One gradient=True evaluation gives every derivative; the check costs two evaluations per input component.
+    spot = dict(pot=pot, size_hero_bet=hero_bet_halfpot_scenario, size_villain_raise=villain_raise_over_hero_bet,
+                size_hero_reraise=hero_reraise_amount_val, priors=priors, likelihood_fold=lh_V_folds_to_H_bet,
+                likelihood_call=lh_V_calls_H_bet, likelihood_raise=lh_V_raises_H_bet,
+                likelihood_reraise_call=lh_V_calls_H_bet_reraise)
+    for temperature in (None, 50.0):
+        gradient = f(sweep_pot_model, **spot, gradient=True, temperature=temperature)['gradient']
+        print(f"\n--- Gradient check ({'max' if temperature is None else f'smooth max, temperature {temperature}'}) ---")
+        for name, key in zip(spot, GRADIENT_KEYS):
+            value = np.asarray(spot[name], dtype=float)
+            differences = np.empty(value.shape)
+            for k in np.ndindex(value.shape):
+                step = np.zeros(value.shape)
+                step[k] = 1e-6
+                up, down = (f(sweep_pot_model, **{**spot, name: value + sign * step}, temperature=temperature)
+                            ['step1_hero_initial_action']['overall_ev_hero_action'] for sign in (1, -1))
+                differences[k] = (up - down) / 2e-6
+            print(f"d EV / d {key:40} {np.array2string(np.asarray(gradient[key]), formatter={'float_kind': '{:9.4f}'.format})}"
+                  f"  (max deviation from differences {np.max(np.abs(differences - gradient[key])):.1e})")
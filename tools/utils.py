@@ -1,6 +1,14 @@
+import heapq
 import itertools
+import mmap
+import os
 import re
-from collections import defaultdict
+from collections import Counter, defaultdict
+from typing import NamedTuple
+
+import numpy as np
+
+from profiling import count, profiled
 
 # implement the following util:
 # this should work for max actions 2, 3, 4
@@ -83,7 +91,8 @@ from collections import defaultdict
 # 0.001,"V1:be-ca/ra-ca,V2:be-ca/fo"
 # 0.001,"V1:be-fo/ra-ca,V2:be-ca/fo"
 
-def generate_villain_strategies(input_ranges_data):
+@profiled("utils.generate_villain_strategies")
+def generate_villain_strategies(input_ranges_data, top_k=None, min_prob=None):
     """
     Generates combined pure strategies for Villain based on mixed strategy inputs.
 
@@ -93,171 +102,659 @@ def generate_villain_strategies(input_ranges_data):
                            keys. These keys map to dictionaries of
                            {action_string: probability} for Villain's conditional
                            mixed strategy.
+        top_k: If given, only the top_k most likely strategies are returned.
+        min_prob: If given, strategies less likely than this are dropped.
+                  With either cut-off the strategies are produced by
+                  stream_villain_strategies and the full product is never built.
 
     Returns:
         A list of strings, where each string is formatted as:
         "probability,\"V1:action_ch/action_be,V2:action_ch/action_be,...\""
     """
-    all_ranges_component_choices = []
-
-    for i, range_data in enumerate(input_ranges_data):
-        ch_options = list(range_data["ch"].items())  # List of (action_str, prob)
-        be_options = list(range_data["be"].items())  # List of (action_str, prob)
-
-        current_range_component_choices = []
-        # Each component choice for a single range Vi is a pair of items:
-        # ( (ch_action_str, ch_action_prob), (be_action_str, be_action_prob) )
-        # This represents one pure strategy for this specific range Vi.
-        for ch_item in ch_options:
-            for be_item in be_options:
-                current_range_component_choices.append((ch_item, be_item))
-        
-        all_ranges_component_choices.append(current_range_component_choices)
-
-    output_lines = []
-    # itertools.product generates all combinations by picking one pure strategy component
-    # from each range's list of choices.
-    for combined_pure_strategy_tuple in itertools.product(*all_ranges_component_choices):
-        # combined_pure_strategy_tuple is like:
-        # ( V1_pure_strat_component, V2_pure_strat_component, ... )
-        # where V1_pure_strat_component = ( ('ch_A_str', p_ch_A), ('be_A_str', p_be_A) )
-
-        current_overall_prob = 1.0
-        strategy_parts_str_list = []  # To build "V1:A/B", "V2:C/D", ...
-
-        for i, range_pure_strategy_component in enumerate(combined_pure_strategy_tuple):
-            ch_item, be_item = range_pure_strategy_component
-            
-            ch_action_str, ch_action_prob = ch_item
-            be_action_str, be_action_prob = be_item
-
-            # The probability of this part of the combined pure strategy
-            # (i.e., for this specific range Vi choosing this specific ch_action and be_action)
-            # is ch_action_prob * be_action_prob.
-            # The overall probability is the product of these across all ranges.
-            current_overall_prob *= (ch_action_prob * be_action_prob)
-            
-            range_label = f"V{i+1}"
-            strategy_parts_str_list.append(f"{range_label}:{ch_action_str}/{be_action_str}")
-        
-        final_strategy_string_for_line = ",".join(strategy_parts_str_list)
-        
-        # Format: probability,"StrategyString"
-        # Round probability to 3 decimal places
-        output_lines.append(f'{current_overall_prob:.3f},"{final_strategy_string_for_line}"')
-
-    # Sort by probability (descending)
-    # The probability is the first part of the string, before the comma.
-    output_lines.sort(key=lambda x: float(x.split(',')[0]), reverse=True)
-
-    return output_lines
-
-def parse_strategies_to_input_format(strategy_lines: list[str]) -> list[dict]:
+    if top_k is not None or min_prob is not None:
+        count("utils.strategies_streamed")
+        return [
+            format_villain_strategy(prob, per_range_actions)
+            for prob, per_range_actions in stream_villain_strategies(
+                input_ranges_data, top_k=top_k, min_prob=min_prob or 0.0
+            )
+        ]
+
+    # Build the table of all combined pure strategies in one vectorized pass,
+    # sort on the unrounded probabilities and only format strings at the very end.
+    table = sort_strategy_table(villain_strategy_table(input_ranges_data))
+    return strategy_table_to_lines(table)
+
+def stream_villain_strategies(input_ranges_data, top_k=None, min_prob=0.0, stats=None):
+    """
+    Lazily yields combined pure strategies for Villain in descending probability order.
+
+    Unlike generate_villain_strategies, the full product over ranges is never built.
+    Each range's pure strategies are sorted by probability, and the combinations are
+    explored best-first with a heap over index tuples. A tuple's only parent is the tuple
+    with its last non-zero index decremented, so every combination is pushed at most
+    once and no visited set is needed. Because a child is never more likely than its
+    parent, a combination below `min_prob` prunes its whole subtree without allocating it.
+
+    Args:
+        input_ranges_data: Same format as for generate_villain_strategies.
+        top_k: Stop after this many strategies (None for no limit).
+        min_prob: Skip strategies with a probability below this threshold.
+        stats: Optional dict that is kept up to date with "emitted" (count),
+               "emitted_mass" and "tail_mass" (probability mass not yet yielded,
+               including everything pruned by top_k / min_prob).
+
+    Yields:
+        Tuples (probability, ((ch_action_str, be_action_str), ...)) with one
+        (ch, be) pair per range.
+    """
+    sorted_choices = []
+    total_mass = 1.0
+    for range_data in input_ranges_data:
+        choices = [
+            (ch_prob * be_prob, (ch_action_str, be_action_str))
+            for ch_action_str, ch_prob in range_data["ch"].items()
+            for be_action_str, be_prob in range_data["be"].items()
+        ]
+        choices.sort(key=lambda item: item[0], reverse=True)
+        sorted_choices.append(choices)
+        total_mass *= sum(prob for prob, _ in choices)
+
+    if stats is None:
+        stats = {}
+    stats.update(emitted=0, emitted_mass=0.0, tail_mass=total_mass)
+
+    num_ranges = len(sorted_choices)
+    if num_ranges == 0 or any(not choices for choices in sorted_choices) or top_k == 0:
+        return
+
+    def prob_of(indices):
+        prob = 1.0
+        for range_idx, choice_idx in enumerate(indices):
+            prob *= sorted_choices[range_idx][choice_idx][0]
+        return prob
+
+    root = (0,) * num_ranges
+    root_prob = prob_of(root)
+    if root_prob < min_prob:
+        return
+
+    # Heap entries: (-prob, indices, first range index that may still be incremented)
+    heap = [(-root_prob, root, 0)]
+    while heap:
+        neg_prob, indices, first_free = heapq.heappop(heap)
+        prob = -neg_prob
+        stats["emitted"] += 1
+        stats["emitted_mass"] += prob
+        stats["tail_mass"] = max(total_mass - stats["emitted_mass"], 0.0)
+        yield prob, tuple(sorted_choices[range_idx][choice_idx][1] for range_idx, choice_idx in enumerate(indices))
+
+        if top_k is not None and stats["emitted"] >= top_k:
+            return
+
+        for range_idx in range(first_free, num_ranges):
+            choice_idx = indices[range_idx] + 1
+            if choice_idx == len(sorted_choices[range_idx]):
+                continue
+            # Recompute the product rather than dividing, so zero probabilities stay exact
+            child = indices[:range_idx] + (choice_idx,) + indices[range_idx + 1:]
+            child_prob = prob_of(child)
+            if child_prob < min_prob:
+                continue
+            heapq.heappush(heap, (-child_prob, child, range_idx))
+
+def format_villain_strategy(prob, per_range_actions):
+    """
+    Formats one combined pure strategy as 'probability,"V1:ch/be,V2:ch/be,..."',
+    with the probability rounded to 3 decimal places.
+    """
+    strategy_str = ",".join(
+        f"V{i+1}:{ch_action_str}/{be_action_str}"
+        for i, (ch_action_str, be_action_str) in enumerate(per_range_actions)
+    )
+    return f'{prob:.3f},"{strategy_str}"'
+
+@profiled("utils.parse_strategies_to_input_format")
+def parse_strategies_to_input_format(strategy_lines: list[str], decimals=3, diagnostics=None) -> list[dict]:
     """
     Converts a list of combined pure strategy strings back into the
     nested dictionary format used as input for generate_villain_strategies.
 
+    Well-formed input goes through strategy_lines_to_table and strategy_table_to_input_format
+    (vectorized parsing, one weighted bincount per marginal). If any line is malformed, the
+    lines go through parse_strategy_stream instead, which skips malformed lines and counts
+    them in `diagnostics` rather than printing them.
+
     Args:
         strategy_lines: A list of strings, where each string is formatted as:
                         "probability,\"V1:action_ch1/action_be1,V2:action_ch2/action_be2,...\""
+        decimals: Round the probabilities to this many decimals (None keeps full precision).
+        diagnostics: Optional collections.Counter to collect malformed-line counts in.
 
     Returns:
         A list of dictionaries, where each dictionary represents a Villain range
         (V1, V2, ...) and contains "ch" and "be" keys. These keys map to
         dictionaries of {action_string: probability}.
     """
-    if not strategy_lines:
-        return []
+    try:
+        table = strategy_lines_to_table(strategy_lines)
+    except ValueError:
+        per_range_strategies, _ = parse_strategy_stream(strategy_lines, decimals=decimals, diagnostics=diagnostics)
+        return per_range_strategies
+    if diagnostics is not None:
+        diagnostics["lines"] += len(strategy_lines)
+    return strategy_table_to_input_format(table, decimals)
+
+
+class StrategyTable(NamedTuple):
+    """
+    Array-backed table of Villain's combined pure strategies.
+
+    Attributes:
+        codes: Integer array of shape (n_strategies, n_ranges, 2). codes[s, i, 0] and
+               codes[s, i, 1] index into `vocab` and give range V{i+1}'s action after
+               Hero checks ("ch" branch) and after Hero bets ("be" branch).
+        probs: float64 array of shape (n_strategies,) with the full-precision
+               probability of each combined pure strategy.
+        vocab: Tuple of action strings shared by both branches, e.g. ("ch", "be-fo", ...).
+    """
+    codes: np.ndarray
+    probs: np.ndarray
+    vocab: tuple
+
+
+def _action_vocab(per_range_action_lists):
+    # Ordered by first appearance so codes are stable for a given input
+    return tuple(dict.fromkeys(action for actions in per_range_action_lists for action in actions))
+
+
+@profiled("utils.villain_strategy_table")
+def villain_strategy_table(input_ranges_data):
+    """
+    Builds the StrategyTable of all combined pure strategies, enumerated like
+    itertools.product over the ranges (the last range varies fastest, and within a
+    range the "ch" actions are the outer loop and the "be" actions the inner one).
+
+    Args:
+        input_ranges_data: Same format as for generate_villain_strategies.
+
+    Returns:
+        A StrategyTable with unsorted, unrounded probabilities.
+    """
+    vocab = _action_vocab(
+        list(range_data["ch"]) + list(range_data["be"]) for range_data in input_ranges_data
+    )
+    code_of = {action: code for code, action in enumerate(vocab)}
+    code_dtype = np.min_scalar_type(max(len(vocab) - 1, 0))
+
+    per_range_codes = []  # (n_choices, 2) codes of each range's pure strategies
+    per_range_probs = []  # (n_choices,) probabilities of each range's pure strategies
+    for range_data in input_ranges_data:
+        ch_codes = np.array([code_of[a] for a in range_data["ch"]], dtype=code_dtype)
+        be_codes = np.array([code_of[a] for a in range_data["be"]], dtype=code_dtype)
+        ch_probs = np.fromiter(range_data["ch"].values(), dtype=np.float64, count=len(ch_codes))
+        be_probs = np.fromiter(range_data["be"].values(), dtype=np.float64, count=len(be_codes))
+        # ch outer, be inner, matching the nested loops of generate_villain_strategies
+        per_range_codes.append(np.stack([np.repeat(ch_codes, len(be_codes)), np.tile(be_codes, len(ch_codes))], axis=1))
+        per_range_probs.append(np.outer(ch_probs, be_probs).ravel())
+
+    num_ranges = len(per_range_codes)
+    if num_ranges == 0:
+        return StrategyTable(np.zeros((0, 0, 2), dtype=code_dtype), np.zeros(0), vocab)
+
+    # Row-major indices over the per-range choices: the last range varies fastest
+    choice_idx = np.indices([len(c) for c in per_range_codes]).reshape(num_ranges, -1)
+    num_strategies = choice_idx.shape[1]
+    codes = np.empty((num_strategies, num_ranges, 2), dtype=code_dtype)
+    probs = np.ones(num_strategies)
+    for i in range(num_ranges):
+        codes[:, i, :] = per_range_codes[i][choice_idx[i]]
+        probs *= per_range_probs[i][choice_idx[i]]
+    return StrategyTable(codes, probs, vocab)
+
+
+@profiled("utils.sort_strategy_table")
+def sort_strategy_table(table):
+    """Returns the table sorted by descending probability (stable for ties)."""
+    order = np.argsort(-table.probs, kind="stable")
+    return StrategyTable(table.codes[order], table.probs[order], table.vocab)
+
+
+@profiled("utils.strategy_table_to_lines")
+def strategy_table_to_lines(table, decimals=3):
+    """
+    Renders a StrategyTable as 'probability,"V1:ch/be,V2:ch/be,..."' strings,
+    in the table's row order.
+    """
+    count("utils.lines_formatted", len(table.probs))
+    vocab = np.array(table.vocab, dtype=object)
+    num_ranges = table.codes.shape[1]
+    # One vectorized concatenation per range instead of formatting every strategy separately
+    strategy_strs = np.full(len(table.probs), "", dtype=object)
+    for i in range(num_ranges):
+        separator = "," if i else ""
+        strategy_strs = strategy_strs + f"{separator}V{i+1}:" + vocab[table.codes[:, i, 0]] + "/" + vocab[table.codes[:, i, 1]]
+    return [f'{prob:.{decimals}f},"{strategy_str}"' for prob, strategy_str in zip(table.probs.tolist(), strategy_strs)]
+
+
+@profiled("utils.strategy_lines_to_table")
+def strategy_lines_to_table(strategy_lines):
+    """
+    Parses 'probability,"V1:ch/be,..."' strings into a StrategyTable.
+
+    The lines are laid out as a fixed-width byte matrix, the comma positions give every
+    range's field, and each range's fields are deduplicated with np.unique, so only the
+    distinct "V1:ch/be" strings of each range (a handful) are parsed in Python.
+
+    Raises:
+        ValueError: If a line is malformed or the number of ranges is inconsistent.
+    """
+    count("utils.lines_parsed", len(strategy_lines))
+    if not len(strategy_lines):
+        return StrategyTable(np.zeros((0, 0, 2), dtype=np.uint8), np.zeros(0), ())
+    try:
+        lines = np.asarray(strategy_lines, dtype=bytes)
+    except UnicodeEncodeError:
+        raise ValueError("Strategy lines must be ASCII") from None
+    width = lines.dtype.itemsize
+    chars = lines.view(np.uint8).reshape(len(lines), width)
+    lengths = np.char.str_len(lines)
+
+    is_comma = chars == _COMMA
+    num_commas = is_comma.sum(axis=1)
+    if num_commas[0] == 0:
+        raise ValueError("Line 1 has no probability field")
+    inconsistent = np.flatnonzero(num_commas != num_commas[0])
+    if len(inconsistent):
+        line_idx = inconsistent[0]
+        raise ValueError(f"Line {line_idx+1} has inconsistent number of ranges ({num_commas[line_idx]} vs expected {num_commas[0]})")
+    num_ranges = int(num_commas[0])
+    # Field k of a line spans [bounds[k] + 1, bounds[k + 1]), with the line start and end as outer bounds
+    bounds = np.empty((len(lines), num_ranges + 2), dtype=np.int64)
+    bounds[:, 0] = -1
+    bounds[:, 1:-1] = np.nonzero(is_comma)[1].reshape(len(lines), num_ranges)
+    bounds[:, -1] = lengths
+
+    flat_chars = chars.ravel()
+    line_offsets = np.arange(len(lines)) * width
+
+    def field(k, strip_quotes=False):
+        starts, ends = line_offsets + bounds[:, k] + 1, line_offsets + bounds[:, k + 1]
+        if strip_quotes:
+            starts = starts + ((flat_chars[np.minimum(starts, len(flat_chars) - 1)] == _QUOTE) & (starts < ends))
+            ends = ends - ((flat_chars[np.maximum(ends - 1, 0)] == _QUOTE) & (ends > starts))
+        field_lengths = ends - starts
+        field_width = max(int(field_lengths.max()), 1)
+        offsets = np.arange(field_width)
+        values = flat_chars.take(np.minimum(starts[:, None] + offsets, len(flat_chars) - 1))
+        values *= offsets < field_lengths[:, None]
+        return values.view(f"S{field_width}")[:, 0]
+
+    try:
+        probs = field(0).astype(np.float64)
+    except ValueError as error:
+        raise ValueError(f"Malformed probability: {error}") from None
+
+    # Only the distinct fields of each range are parsed, in order of first appearance for a stable vocab
+    per_range = []
+    first_seen = {}
+    for i in range(num_ranges):
+        unique_fields, first_idx, inverse = np.unique(field(i + 1, strip_quotes=True), return_index=True, return_inverse=True)
+        actions = []
+        for unique_field, line_idx in zip(unique_fields, first_idx):
+            range_label, sep, actions_full_str = unique_field.decode().partition(':')
+            ch_action, sep_actions, be_action = actions_full_str.partition('/')
+            if not sep or not sep_actions or not range_label:
+                raise ValueError(f"Malformed range strategy string part: '{unique_field.decode()}' (line {line_idx+1})")
+            actions.append((ch_action, be_action))
+            for branch_idx, action in enumerate((ch_action, be_action)):
+                first_seen[action] = min(first_seen.get(action, (np.inf,)), (line_idx, i, branch_idx))
+        per_range.append((actions, inverse.reshape(-1)))
+    count("utils.strategy_parse_cache.hits", len(lines) * num_ranges - sum(len(actions) for actions, _ in per_range))
+    count("utils.strategy_parse_cache.misses", sum(len(actions) for actions, _ in per_range))
+
+    vocab = tuple(sorted(first_seen, key=first_seen.__getitem__))
+    code_of = {action: code for code, action in enumerate(vocab)}
+    codes = np.empty((len(lines), num_ranges, 2), dtype=np.min_scalar_type(max(len(vocab) - 1, 0)))
+    for i, (actions, inverse) in enumerate(per_range):
+        codes[:, i, :] = np.array([(code_of[ch], code_of[be]) for ch, be in actions], dtype=codes.dtype)[inverse]
+    return StrategyTable(codes, probs, vocab)
+
+
+@profiled("utils.strategy_table_to_input_format")
+def strategy_table_to_input_format(table, decimals=None):
+    """
+    Marginalizes a StrategyTable back to per-range mixed strategies, the inverse of
+    villain_strategy_table. Each marginal is a single weighted bincount.
+
+    Args:
+        table: A StrategyTable.
+        decimals: Round the probabilities to this many decimals (None keeps full precision).
+
+    Returns:
+        A list of {"ch": {...}, "be": {...}} dictionaries, as taken by
+        generate_villain_strategies. Only actions that occur in the table are listed.
+    """
+    num_actions = len(table.vocab)
+    output_list = []
+    for i in range(table.codes.shape[1]):
+        range_data = {}
+        for branch_idx, branch in enumerate(("ch", "be")):
+            branch_codes = table.codes[:, i, branch_idx]
+            marginal = np.bincount(branch_codes, weights=table.probs, minlength=num_actions)
+            if decimals is not None:
+                marginal = np.round(marginal, decimals)
+            # Keep first-appearance order, like the dict-based parser does
+            _, first_rows = np.unique(branch_codes, return_index=True)
+            present = branch_codes[np.sort(first_rows)]
+            range_data[branch] = {table.vocab[code]: float(marginal[code]) for code in present}
+        output_list.append(range_data)
+    return output_list
+
 
-    num_ranges = 0
-    # Determine number of ranges from the first valid line
-    for line_idx, line_content in enumerate(strategy_lines):
+# Bulk parsing of large strategy-line files.
+# Lines are never turned into Python objects one by one: each chunk is scanned with NumPy
+# for newlines and first commas, plain decimal probabilities are parsed in bulk, and the
+# strategy part of every line is reduced to a 64-bit hash computed 8 bytes at a time.
+# Only the distinct strategies (a few hundred to a few thousand) are parsed as strings.
+# Every line is then compared byte for byte (again 8 bytes at a time) with the first line of
+# its strategy, so a hash collision is counted in the diagnostics and the colliding strategy
+# gets an id of its own, instead of two strategies being merged.
+
+_HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+_NEWLINE, _CARRIAGE_RETURN, _COMMA, _DOT, _ZERO, _QUOTE = (ord(c) for c in "\n\r,.0\"")
+_MAX_FAST_DIGITS = 15  # mantissas below 10**15 < 2**53 convert exactly
+_POWERS_OF_TEN = 10 ** np.arange(_MAX_FAST_DIGITS + 1, dtype=np.int64)
+
+
+def _sliding_words(padded):
+    # Little-endian 8-byte word starting at every byte offset (a zero-copy strided view)
+    return np.ndarray(shape=(len(padded) - 7,), dtype="<u8", buffer=padded, strides=(1,))
+
+
+@profiled("utils.hash_fields")
+def _hash_fields(words, starts, ends):
+    """Hashes the [start, end) byte fields, reading each one as a sequence of 8-byte words."""
+    lengths = ends - starts
+    hashes = lengths.astype(np.uint64)
+    with np.errstate(over="ignore"):
+        for offset in range(0, int(lengths.max(initial=0)), 8):
+            remaining = lengths - offset
+            active = remaining > 0
+            word = words[np.where(active, starts + offset, 0)]
+            # Zero out the bytes past the end of the field in the last word
+            shift = (8 * np.clip(8 - remaining, 0, 8)).astype(np.uint64)
+            word = np.where(remaining >= 8, word, np.where(active, (word << shift) >> shift, 0))
+            hashes = np.where(active, (hashes ^ word) * _HASH_MULTIPLIER, hashes)
+        hashes ^= hashes >> np.uint64(29)
+        hashes *= _HASH_MULTIPLIER
+    return hashes
+
+
+@profiled("utils.fields_equal")
+def _fields_equal(words, starts, other_words, other_starts, lengths):
+    """Whether the [start, start + length) fields of two buffers (as sliding words) are equal."""
+    equal = np.ones(len(starts), dtype=bool)
+    for offset in range(0, int(lengths.max(initial=0)), 8):
+        remaining = lengths - offset
+        active = remaining > 0
+        word = words[np.where(active, starts + offset, 0)]
+        other_word = other_words[np.where(active, other_starts + offset, 0)]
+        shift = (8 * np.clip(8 - remaining, 0, 8)).astype(np.uint64)
+        differs = ((word ^ other_word) << shift) != 0
+        equal &= ~(active & np.where(remaining >= 8, word != other_word, differs))
+    return equal
+
+
+@profiled("utils.parse_probabilities")
+def _parse_probabilities(buf, starts, ends):
+    """
+    Parses the [start, end) byte fields of `buf` as floats. Plain decimals ("0.123",
+    "1", ".5") go through a vectorized exact path, anything else through float().
+    Returns the values and a mask of fields that could not be parsed.
+    """
+    lengths = ends - starts
+    width = int(min(lengths.max(initial=0), _MAX_FAST_DIGITS + 1))
+    mantissa = np.zeros(len(starts), dtype=np.int64)
+    num_digits = np.zeros(len(starts), dtype=np.int64)
+    num_dots = np.zeros(len(starts), dtype=np.int64)
+    num_fraction_digits = np.zeros(len(starts), dtype=np.int64)
+    # One column of characters at a time, so every operation runs on a contiguous vector
+    for column in range(width):
+        in_field = column < lengths
+        chars = buf[np.where(in_field, starts + column, 0)]
+        digit = chars - np.uint8(_ZERO)
+        is_digit = (digit < 10) & in_field
+        is_dot = (chars == _DOT) & in_field
+        mantissa = np.where(is_digit, mantissa * 10 + digit, mantissa)
+        num_fraction_digits += is_digit & (num_dots > 0)
+        num_digits += is_digit
+        num_dots += is_dot
+    fast = (
+        (lengths > 0) & (lengths <= width) & (num_digits + num_dots == lengths)
+        & (num_dots <= 1) & (num_digits >= 1) & (num_digits <= _MAX_FAST_DIGITS)
+    )
+    # Both operands are exact doubles, so the single division is correctly rounded
+    values = mantissa / _POWERS_OF_TEN[np.minimum(num_fraction_digits, _MAX_FAST_DIGITS)].astype(np.float64)
+
+    bad = np.zeros(len(starts), dtype=bool)
+    for line_idx in np.flatnonzero(~fast):
         try:
-            _first_line_prob_str, first_line_combined_strat_part = line_content.split(',', 1)
-            first_line_combined_strat_str = first_line_combined_strat_part.strip('"')
-            if not first_line_combined_strat_str: # Empty strategy string part
-                if line_idx == len(strategy_lines) -1: # If it's the last line and still no num_ranges
-                    print("Warning: Could not determine number of ranges from any strategy line.")
-                    return []
-                continue # Try next line
-            num_ranges = len(first_line_combined_strat_str.split(','))
-            if num_ranges > 0:
-                break # Found num_ranges
-        except Exception:
-            if line_idx == len(strategy_lines) -1:
-                print("Warning: Could not determine number of ranges from any strategy line (parsing error).")
-                return []
-            continue # Try next line
-    
-    if num_ranges == 0: # If loop finished without finding num_ranges
-        print("Warning: No valid strategy lines found to determine number of ranges.")
-        return []
+            values[line_idx] = float(bytes(buf[starts[line_idx]:ends[line_idx]]))
+        except ValueError:
+            bad[line_idx] = True
+    return values, bad
+
 
+def _parse_strategy_part(strategy_bytes):
+    """Parses b'"V1:ch/be,V2:..."' into a tuple of (ch_action, be_action) pairs."""
+    actions = []
+    for range_strat_str in strategy_bytes.decode().strip().strip('"').split(','):
+        range_label, sep, actions_full_str = range_strat_str.partition(':')
+        ch_action, sep_actions, be_action = actions_full_str.partition('/')
+        if not sep or not sep_actions or not range_label:
+            raise ValueError("malformed range strategy")
+        actions.append((ch_action, be_action))
+    return tuple(actions)
 
-    # Step 1: Initialize data structure to store sum of probabilities for each pure strategy of each range
-    # range_pure_strategy_probs[i] maps (ch_action, be_action) to P_i(ch_action/be_action)
-    range_pure_strategy_probs = [defaultdict(float) for _ in range(num_ranges)]
 
-    # Step 2: Process all input lines to populate range_pure_strategy_probs
-    for line_idx, line in enumerate(strategy_lines):
+class _StrategyLineAggregator:
+    """Accumulates strategy-line weights over chunks in memory bounded by the number of distinct strategies."""
+
+    def __init__(self, diagnostics):
+        self.diagnostics = diagnostics
+        self.known_hashes = np.zeros(0, dtype=np.uint64)  # sorted
+        self.known_ids = np.zeros(0, dtype=np.int64)      # strategy id of each sorted hash
+        self.parsed = []                                  # strategy id -> tuple of (ch, be) pairs, or error kind
+        self.weights = np.zeros(0)                        # strategy id -> summed probability
+        self.line_counts = np.zeros(0, dtype=np.int64)    # strategy id -> number of lines
+        self.strategy_bytes = np.zeros(8, dtype=np.uint8) # first line's strategy bytes of every id, + 8 zero bytes
+        self.strategy_starts = np.zeros(0, dtype=np.int64)
+        self.strategy_lengths = np.zeros(0, dtype=np.int64)
+        self.collided = {}                                # strategy bytes -> id, for strategies whose hash collided
+        self.num_ranges = 0
+        self.num_lines = 0
+        self.padded = np.zeros(0, dtype=np.uint8)
+
+    def add_chunk(self, chunk):
+        """Processes a uint8 array that holds complete lines only."""
+        if len(chunk) == 0:
+            return
+        # Copy into a reused buffer with zero padding, so 8-byte words can be read past any line end
+        if len(self.padded) < len(chunk) + 8:
+            self.padded = np.zeros(len(chunk) + len(chunk) // 4 + 8, dtype=np.uint8)
+        buf = self.padded[:len(chunk)]
+        buf[:] = chunk
+        self.padded[len(chunk):len(chunk) + 8] = 0
+
+        line_ends = np.flatnonzero(buf == _NEWLINE)
+        if buf[-1] != _NEWLINE:
+            line_ends = np.append(line_ends, len(buf))
+        line_starts = np.concatenate(([0], line_ends[:-1] + 1))
+        non_empty = line_ends > line_starts
+        line_ends[non_empty] -= (buf[line_ends[non_empty] - 1] == _CARRIAGE_RETURN).astype(line_ends.dtype)
+        non_empty = line_ends > line_starts
+        line_starts, line_ends = line_starts[non_empty], line_ends[non_empty]
+        self.num_lines += len(line_starts)
+        count("utils.lines_parsed", len(line_starts))
+
+        commas = np.flatnonzero(buf == _COMMA)
+        first_comma_idx = np.searchsorted(commas, line_starts)
+        has_comma = first_comma_idx < len(commas)
+        first_comma = line_ends.copy()
+        first_comma[has_comma] = commas[first_comma_idx[has_comma]]
+        has_comma &= first_comma < line_ends
+        if not has_comma.all():
+            self.diagnostics["missing comma"] += int((~has_comma).sum())
+            line_starts, line_ends, first_comma = line_starts[has_comma], line_ends[has_comma], first_comma[has_comma]
+
+        probs, bad_prob = _parse_probabilities(buf, line_starts, first_comma)
+        if bad_prob.any():
+            self.diagnostics["bad probability"] += int(bad_prob.sum())
+            keep = ~bad_prob
+            line_ends, first_comma, probs = line_ends[keep], first_comma[keep], probs[keep]
+        if len(probs) == 0:
+            return
+
+        field_starts = first_comma + 1
+        hashes = _hash_fields(_sliding_words(self.padded[:len(chunk) + 8]), field_starts, line_ends)
+
+        # Lines whose strategy was seen in an earlier chunk only need a lookup
+        line_ids = np.full(len(hashes), -1, dtype=np.int64)
+        if len(self.known_hashes):
+            positions = np.minimum(np.searchsorted(self.known_hashes, hashes), len(self.known_hashes) - 1)
+            found = self.known_hashes[positions] == hashes
+            line_ids[found] = self.known_ids[positions[found]]
+
+        unseen = np.flatnonzero(line_ids < 0)
+        if len(unseen):
+            unique_hashes, first_idx, inverse = np.unique(hashes[unseen], return_index=True, return_inverse=True)
+        # Only the first line of every distinct strategy is parsed as a string, the rest are hash lookups
+        count("utils.strategy_parse_cache.hits", len(hashes) - (len(unique_hashes) if len(unseen) else 0))
+        count("utils.strategy_parse_cache.misses", len(unique_hashes) if len(unseen) else 0)
+        if len(unseen):
+            new_ids = np.arange(len(self.parsed), len(self.parsed) + len(unique_hashes))
+            # Parse the new strategies in file order, so the first valid line fixes the number of ranges
+            order = np.argsort(first_idx, kind="stable")
+            new_ids[order] = new_ids.copy()
+            self._add_strategies([bytes(buf[field_starts[unseen[first_idx[u]]]:line_ends[unseen[first_idx[u]]]]) for u in order])
+            line_ids[unseen] = new_ids[inverse]
+
+            self.known_hashes = np.concatenate((self.known_hashes, unique_hashes))
+            self.known_ids = np.concatenate((self.known_ids, new_ids))
+            sort_order = np.argsort(self.known_hashes, kind="stable")
+            self.known_hashes, self.known_ids = self.known_hashes[sort_order], self.known_ids[sort_order]
+
+        # Hash collisions: lines whose bytes differ from the first line of the strategy they were mapped to
+        field_lengths = line_ends - field_starts
+        same = (field_lengths == self.strategy_lengths[line_ids]) & _fields_equal(
+            _sliding_words(self.padded[:len(chunk) + 8]), field_starts,
+            _sliding_words(self.strategy_bytes), self.strategy_starts[line_ids], field_lengths)
+        for line_idx in np.flatnonzero(~same):
+            strategy_bytes = bytes(buf[field_starts[line_idx]:line_ends[line_idx]])
+            if strategy_bytes not in self.collided:
+                self.diagnostics["hash collision"] += 1
+                self.collided[strategy_bytes] = len(self.parsed)
+                self._add_strategies([strategy_bytes])
+            line_ids[line_idx] = self.collided[strategy_bytes]
+
+        self.weights += np.bincount(line_ids, weights=probs, minlength=len(self.weights))
+        self.line_counts += np.bincount(line_ids, minlength=len(self.line_counts))
+
+    def _add_strategies(self, strategies):
+        # New ids for the given strategy byte strings, in order
+        self.parsed.extend(self._parse(strategy_bytes) for strategy_bytes in strategies)
+        lengths = np.array([len(strategy_bytes) for strategy_bytes in strategies], dtype=np.int64)
+        end = len(self.strategy_bytes) - 8
+        self.strategy_starts = np.concatenate((self.strategy_starts, end + np.cumsum(lengths) - lengths))
+        self.strategy_lengths = np.concatenate((self.strategy_lengths, lengths))
+        self.strategy_bytes = np.concatenate((self.strategy_bytes[:end], np.frombuffer(b"".join(strategies), dtype=np.uint8),
+                                              np.zeros(8, dtype=np.uint8)))
+        self.weights = np.concatenate((self.weights, np.zeros(len(strategies))))
+        self.line_counts = np.concatenate((self.line_counts, np.zeros(len(strategies), dtype=np.int64)))
+
+    def _parse(self, strategy_bytes):
         try:
-            prob_str, combined_strat_part = line.split(',', 1)
-            line_prob = float(prob_str)
-            combined_strat_str = combined_strat_part.strip('"')
-            
-            per_range_strat_strs = combined_strat_str.split(',')
-            if len(per_range_strat_strs) != num_ranges:
-                print(f"Warning: Line {line_idx+1} ('{line}') has inconsistent number of ranges ({len(per_range_strat_strs)} vs expected {num_ranges}). Skipping.")
+            actions = _parse_strategy_part(strategy_bytes)
+        except (ValueError, UnicodeDecodeError):
+            return "malformed strategy"
+        if not self.num_ranges:
+            self.num_ranges = len(actions)
+        if len(actions) != self.num_ranges:
+            return "inconsistent number of ranges"
+        return actions
+
+    def result(self, decimals):
+        marginals = [{"ch": defaultdict(float), "be": defaultdict(float)} for _ in range(self.num_ranges)]
+        for actions, weight, line_count in zip(self.parsed, self.weights.tolist(), self.line_counts.tolist()):
+            if isinstance(actions, str):
+                self.diagnostics[actions] += line_count
                 continue
+            for range_marginals, (ch_action, be_action) in zip(marginals, actions):
+                range_marginals["ch"][ch_action] += weight
+                range_marginals["be"][be_action] += weight
+        self.diagnostics["lines"] += self.num_lines
+        return [
+            {branch: {k: (round(v, decimals) if decimals is not None else v) for k, v in range_marginals[branch].items()}
+             for branch in ("ch", "be")}
+            for range_marginals in marginals
+        ]
 
-            current_line_parsed_strats = [] # Stores (ch_action, be_action) for each range for this line
-            for i in range(num_ranges):
-                # Example: "V1:be-ca/ra-ca"
-                parts = per_range_strat_strs[i].split(':', 1)
-                if len(parts) != 2:
-                    raise ValueError(f"Malformed range strategy string part: '{per_range_strat_strs[i]}'")
-                # range_label = parts[0] # e.g., "V1" - not strictly needed if order is fixed
-                actions_full_str = parts[1] # e.g., "be-ca/ra-ca"
-                
-                ch_be_actions = actions_full_str.split('/', 1)
-                if len(ch_be_actions) != 2:
-                    raise ValueError(f"Malformed actions part '{actions_full_str}', missing '/' or one side is empty")
-                
-                ch_action = ch_be_actions[0]
-                be_action = ch_be_actions[1]
-                current_line_parsed_strats.append((ch_action, be_action))
-            
-            # Add line_prob to the sum for the specific pure strategy chosen by each range
-            for i in range(num_ranges):
-                chosen_pure_strat_for_range_i = current_line_parsed_strats[i] # (ch_action, be_action)
-                range_pure_strategy_probs[i][chosen_pure_strat_for_range_i] += line_prob
-        
-        except ValueError as e:
-            print(f"Warning: Malformed line {line_idx+1} ('{line}'). Error: {e}. Skipping.")
-            continue
-        except Exception as e: # Catch any other unexpected errors during line processing
-            print(f"Warning: Unexpected error processing line {line_idx+1} ('{line}'). Error: {e}. Skipping.")
-            continue
-
-    # Step 3 & 4: Construct the final output list
-    output_list_defaultdict = [
-        {"ch": defaultdict(float), "be": defaultdict(float)} for _ in range(num_ranges)
-    ]
 
-    for i in range(num_ranges):
-        for (ch_action, be_action), prob_pure_strat_sum in range_pure_strategy_probs[i].items():
-            # prob_pure_strat_sum is P_i(ch_action/be_action)
-            output_list_defaultdict[i]["ch"][ch_action] += prob_pure_strat_sum
-            output_list_defaultdict[i]["be"][be_action] += prob_pure_strat_sum
-            
-    # Step 5: Convert defaultdicts to dicts and round probabilities
-    final_output_list = []
-    for range_data_defaultdict in output_list_defaultdict:
-        ch_dict = {k: round(v, 3) for k, v in range_data_defaultdict["ch"].items()}
-        be_dict = {k: round(v, 3) for k, v in range_data_defaultdict["be"].items()}
-        final_output_list.append({"ch": ch_dict, "be": be_dict})
+@profiled("utils.parse_strategy_file")
+def parse_strategy_file(path, chunk_bytes=1 << 22, decimals=None, diagnostics=None):
+    """
+    Streaming counterpart of parse_strategies_to_input_format for large files.
+
+    The file is memory-mapped and processed in chunks of roughly `chunk_bytes`, cut at
+    line boundaries, so memory use does not depend on the file size. Malformed lines are
+    counted rather than printed.
+
+    Args:
+        path: Path of a text file with one 'probability,"V1:ch/be,V2:..."' line per strategy.
+        chunk_bytes: Approximate number of bytes processed per chunk.
+        decimals: Round the marginals to this many decimals (None keeps full precision).
+        diagnostics: Optional collections.Counter to collect malformed-line counts in.
+
+    Returns:
+        A tuple (per_range_strategies, diagnostics) where per_range_strategies has the
+        format returned by parse_strategies_to_input_format, and diagnostics is a Counter
+        of problem kinds ("missing comma", "bad probability", "malformed strategy",
+        "inconsistent number of ranges") plus "lines", the number of non-empty lines.
+    """
+    aggregator = _StrategyLineAggregator(Counter() if diagnostics is None else diagnostics)
+    with open(path, "rb") as fh:
+        if os.fstat(fh.fileno()).st_size == 0:
+            return [], aggregator.diagnostics
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            data = np.frombuffer(mm, dtype=np.uint8)
+            chunk_start = 0
+            while chunk_start < len(data):
+                chunk_end = min(chunk_start + chunk_bytes, len(data))
+                if chunk_end < len(data):
+                    newline = mm.find(b"\n", chunk_end)
+                    chunk_end = len(data) if newline == -1 else newline + 1
+                aggregator.add_chunk(data[chunk_start:chunk_end])
+                chunk_start = chunk_end
+            del data  # release the buffer export before the mmap is closed
+    return aggregator.result(decimals), aggregator.diagnostics
 
-    return final_output_list
+
+@profiled("utils.parse_strategy_stream")
+def parse_strategy_stream(strategy_lines, chunk_lines=1 << 16, decimals=None, diagnostics=None):
+    """
+    Like parse_strategy_file, but for any iterable of str or bytes lines (e.g. an open
+    file or a generator), consumed `chunk_lines` lines at a time.
+    """
+    aggregator = _StrategyLineAggregator(Counter() if diagnostics is None else diagnostics)
+    iterator = iter(strategy_lines)
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_lines))
+        if not chunk:
+            break
+        encoded = [line.encode() if isinstance(line, str) else line for line in chunk]
+        aggregator.add_chunk(np.frombuffer(b"\n".join(line.rstrip(b"\n") for line in encoded), dtype=np.uint8))
+    return aggregator.result(decimals), aggregator.diagnostics
 
 
 # Example usage:
@@ -342,4 +839,21 @@ if __name__ == "__main__":
 
     reconstructed_input_max_2_3 = parse_strategies_to_input_format(results_max_2_3)
     print("\nReconstructed input for max_actions = 2-3 example:")
-    print(json.dumps(reconstructed_input_max_2_3, indent=4))
\ No newline at end of file
+    print(json.dumps(reconstructed_input_max_2_3, indent=4))
+
+    # Streaming mode: only the most likely strategies, without building the full product
+    stream_stats = {}
+    print("\nTop 5 strategies for max_actions = 4 example (streamed):")
+    for prob, per_range_actions in stream_villain_strategies(inputs_max_4, top_k=5, stats=stream_stats):
+        print(format_villain_strategy(prob, per_range_actions))
+    print(f"Tail mass not emitted: {stream_stats['tail_mass']:.3f}")
+
+    # Bulk parsing of a strategy-line file, in chunks and without printing per-line warnings
+    import tempfile
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as tmp_file:
+        tmp_file.write("\n".join(results_max_4 + ["not a strategy line"]))
+    reconstructed_from_file, file_diagnostics = parse_strategy_file(tmp_file.name, decimals=3)
+    os.remove(tmp_file.name)
+    print("\nReconstructed input for max_actions = 4 example, parsed from file:")
+    print(json.dumps(reconstructed_from_file[0], indent=4))
+    print(f"Diagnostics: {dict(file_diagnostics)}")